@@ -1,14 +1,345 @@
-import pygame
-from pygame import gfxdraw
-from roku_remote import RokuRemote
-import argparse 
+import sys
+
+# pygame.pkgdata only uses pkg_resources to find pygame's bundled files and
+# falls back to the package directory without it. importing it takes longer
+# than the rest of start-up put together, so it is hidden while pygame loads.
+_hide_pkg_resources = "pkg_resources" not in sys.modules
+if _hide_pkg_resources:
+    sys.modules["pkg_resources"] = None
+try:
+    import pygame
+    from pygame import gfxdraw
+finally:
+    if _hide_pkg_resources:
+        del sys.modules["pkg_resources"]
+from roku_dispatch import BackpressurePolicy, CommandDispatcher, KeyHolder, SENT
+import roku_keys
 import logging
+import time
+import collections
+import io
+import json
+import math
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# posted by the dispatcher thread when a queued command finishes
+COMMAND_DONE = pygame.USEREVENT + 1
+# posted by the state poller when a query endpoint's answer changes
+STATE_CHANGED = pygame.USEREVENT + 2
+# posted by the launcher's loader thread when the channel list or an icon arrives
+APPS_LOADED = pygame.USEREVENT + 3
+# posted when the TV's circuit breaker opens or closes (see roku_health)
+HEALTH_CHANGED = pygame.USEREVENT + 4
+# posted by the discovery thread when the device switcher's search finishes
+DEVICES_FOUND = pygame.USEREVENT + 5
+
+# default button layout. each button is either a "rect" [x, y, w, h] or a
+# "circle" with center and radius, drawn with an icon or a text label. pressing
+# it either sends "command" (an ECP key) to the TV or calls the app method
+# named by "action". "shortcut" is a pygame key name. alternate layouts use the
+# same format, loaded with --layout from a JSON file of
+# {"size": [w, h], "buttons": [...]}.
+DEFAULT_LAYOUT = {
+    "size": [300, 600],
+    "buttons": [
+        {"name": "power", "circle": [260, 50], "radius": 20, "color": "RED", "icon": "power", "action": "toggle_power", "shortcut": "p"},
+        {"name": "cycle_input", "rect": [170, 80, 60, 40], "label": "Input", "action": "cycle_input", "shortcut": "tab"},
+        {"name": "apps", "rect": [240, 80, 50, 40], "label": "Apps", "action": "toggle_launcher", "shortcut": "a"},
+        {"name": "devices", "rect": [8, 80, 44, 40], "label": "TV", "action": "toggle_devices", "shortcut": "d"},
+        {"name": "home", "rect": [120, 80, 40, 40], "icon": "house", "command": "Home", "shortcut": "h"},
+        {"name": "back", "rect": [60, 80, 40, 40], "icon": "arrow_left", "command": "Back", "shortcut": "escape"},
+        {"name": "dpad_up", "rect": [110, 140, 60, 40], "color": "PURPLE", "icon": "arrow_up", "command": "Up", "shortcut": "up"},
+        {"name": "dpad_left", "rect": [70, 180, 40, 60], "color": "PURPLE", "icon": "arrow_left", "command": "Left", "shortcut": "left"},
+        {"name": "dpad_right", "rect": [170, 180, 40, 60], "color": "PURPLE", "icon": "arrow_right", "command": "Right", "shortcut": "right"},
+        {"name": "dpad_down", "rect": [110, 240, 60, 40], "color": "PURPLE", "icon": "arrow_down", "command": "Down", "shortcut": "down"},
+        {"name": "dpad_center", "circle": [140, 210], "radius": 30, "color": "PURPLE", "label": "OK", "font_size": 20, "command": "Select", "shortcut": "return"},
+        {"name": "play_pause", "rect": [120, 350, 40, 40], "icon": "play_pause", "command": "Play", "shortcut": "space"},
+        {"name": "rewind", "rect": [60, 350, 40, 40], "icon": "rewind", "command": "Rev", "shortcut": "r"},
+        {"name": "fast_forward", "rect": [180, 350, 40, 40], "icon": "fast_forward", "command": "Fwd", "shortcut": "f"},
+        {"name": "vol_up", "rect": [50, 450, 40, 40], "label": "Vol+", "command": "VolumeUp", "shortcut": "="},
+        {"name": "vol_down", "rect": [50, 500, 40, 40], "label": "Vol-", "command": "VolumeDown", "shortcut": "-"},
+        {"name": "type_input", "rect": [130, 500, 40, 40], "label": "Type", "action": "start_typing", "shortcut": "t"},
+        {"name": "volume_mute", "rect": [50, 550, 40, 40], "label": "Mute", "command": "VolumeMute", "shortcut": "m"},
+        {"name": "ch_up", "rect": [210, 450, 40, 40], "label": "CH+", "command": "ChannelUp", "shortcut": "page up"},
+        {"name": "ch_down", "rect": [210, 500, 40, 40], "label": "CH-", "command": "ChannelDown", "shortcut": "page down"},
+        {"name": "instant_replay", "rect": [120, 400, 40, 40], "label": "IR", "command": "InstantReplay"},
+        {"name": "info", "rect": [120, 550, 40, 40], "label": "Info", "command": "Info", "shortcut": "i"},
+        {"name": "backspace", "rect": [60, 400, 40, 40], "label": "Back", "command": "Backspace", "shortcut": "backspace"},
+        {"name": "search", "rect": [180, 400, 40, 40], "label": "Search", "command": "Search", "shortcut": "s"},
+        {"name": "enter", "rect": [120, 450, 40, 40], "label": "Enter", "command": "Enter"},
+        {"name": "find_remote", "rect": [210, 550, 40, 40], "label": "Find", "command": "FindRemote"},
+    ],
+}
+
+# app methods a layout may bind a button to
+BUTTON_ACTIONS = {"toggle_power", "cycle_input", "start_typing", "toggle_launcher", "toggle_devices"}
+
+
+class Button:
+    def __init__(self, name, shape, rect, color="DARK_GRAY", icon=None, label=None, font_size=15,
+                 command=None, action=None, shortcut=None, center=None, radius=None):
+        self.name = name
+        self.shape = shape
+        self.rect = rect  # bounding box; for circles, the area the circle covers
+        self.center = center
+        self.radius = radius
+        self.color = color
+        self.icon = icon
+        self.label = label
+        self.font_size = font_size
+        self.command = command
+        self.action = action
+        self.shortcut = shortcut
+
+    @classmethod
+    def from_spec(cls, spec):
+        spec = dict(spec)
+        name = spec.pop("name")
+        if (spec.get("command") is None) == (spec.get("action") is None):
+            raise ValueError(f"Button '{name}' needs exactly one of 'command' or 'action'")
+        if spec.get("action") is not None and spec["action"] not in BUTTON_ACTIONS:
+            raise ValueError(f"Button '{name}' has unknown action '{spec['action']}'")
+        if spec.get("command") is not None:
+            # checked once here, so a typo in a layout fails at start-up, not on press
+            try:
+                spec["command"] = roku_keys.canonical(spec["command"])
+            except roku_keys.UnknownKey as e:
+                raise ValueError(f"Button '{name}': {e}") from None
+        if "circle" in spec:
+            x, y = spec.pop("circle")
+            radius = spec.pop("radius")
+            rect = pygame.Rect(x - radius - 1, y - radius - 1, 2 * radius + 3, 2 * radius + 3)
+            return cls(name, "circle", rect, center=(x, y), radius=radius, **spec)
+        return cls(name, "rect", pygame.Rect(spec.pop("rect")), **spec)
+
+    def contains(self, pos):
+        if self.shape == "circle":
+            return (pos[0] - self.center[0]) ** 2 + (pos[1] - self.center[1]) ** 2 <= self.radius ** 2
+        return self.rect.collidepoint(pos)
+
+
+class HitMap:
+    # one byte per window pixel holding the index of the button under it, so a
+    # click resolves with a single lookup no matter how many buttons there are
+    def __init__(self, width, height, buttons):
+        if len(buttons) > 255:
+            raise ValueError("HitMap supports at most 255 buttons")
+        self.width = width
+        self.height = height
+        self.names = [None] + [button.name for button in buttons]
+        self.cells = bytearray(width * height)
+        # paint back to front so the first button listed wins where buttons overlap
+        for index in range(len(buttons), 0, -1):
+            self._paint(buttons[index - 1], index)
+
+    def _paint(self, button, index):
+        for y in range(max(0, button.rect.top), min(self.height, button.rect.bottom)):
+            if button.shape == "circle":
+                dy = y - button.center[1]
+                if abs(dy) > button.radius:
+                    continue
+                dx = math.isqrt(button.radius ** 2 - dy ** 2)
+                left, right = button.center[0] - dx, button.center[0] + dx + 1
+            else:
+                left, right = button.rect.left, button.rect.right
+            left, right = max(0, left), min(self.width, right)
+            if left < right:
+                row = y * self.width
+                self.cells[row + left:row + right] = bytes((index,)) * (right - left)
+
+    def lookup(self, pos):
+        x, y = pos
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.names[self.cells[y * self.width + x]]
+        return None
+
+
+def load_layout(path):
+    with open(path) as f:
+        layout = json.load(f)
+    if isinstance(layout, list):
+        layout = {"buttons": layout}
+    layout.setdefault("size", DEFAULT_LAYOUT["size"])
+    return layout
+
+
+class TextCache:
+    # fonts are cached per size for the life of the app; rendered text surfaces
+    # are LRU-bounded so whatever gets typed into the Type box can't grow it forever
+    def __init__(self, max_surfaces=128):
+        self.max_surfaces = max_surfaces
+        self.fonts = {}
+        self.surfaces = collections.OrderedDict()
+        self.font_hits = self.font_misses = 0
+        self.text_hits = self.text_misses = 0
+
+    def font(self, size):
+        font = self.fonts.get(size)
+        if font is None:
+            self.font_misses += 1
+            font = self.fonts[size] = pygame.font.Font(None, size)
+        else:
+            self.font_hits += 1
+        return font
+
+    def render(self, text, size, color):
+        key = (text, size, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.text_hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        self.text_misses += 1
+        surface = self.surfaces[key] = self.font(size).render(text, True, color)
+        if len(self.surfaces) > self.max_surfaces:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def stats(self):
+        return {
+            "font_hits": self.font_hits,
+            "font_misses": self.font_misses,
+            "text_hits": self.text_hits,
+            "text_misses": self.text_misses,
+            "cached_surfaces": len(self.surfaces),
+        }
+
+
+class Launcher:
+    # the channel panel: a scrolling grid of tiles drawn over the remote. icons
+    # come from a roku_icons.IconCache and are decoded into surfaces only when
+    # their tile is on screen; decoded surfaces are LRU-bounded like TextCache's
+    def __init__(self, rect, icon_cache, tile_height=80, max_surfaces=48):
+        self.rect = rect
+        self.icon_cache = icon_cache
+        self.columns = max(1, rect.width // 100)
+        self.tile_width = rect.width // self.columns
+        self.tile_height = tile_height
+        self.header = pygame.Rect(rect.left, rect.top, rect.width, 30)
+        self.rows_visible = max(1, (rect.bottom - self.header.bottom) // tile_height)
+        self.max_surfaces = max_surfaces
+        self.surfaces = collections.OrderedDict()  # icon key -> scaled surface, None if undecodable
+        self.apps = []  # (app, icon key)
+        self.scroll_row = 0
+        self.open = False
+        self.loading = False
+        self.error = None
+        self.decoded = 0
+
+    def set_apps(self, apps):
+        from roku_icons import icon_key
+        self.apps = [(app, icon_key(app)) for app in apps]
+        self.scroll(0)
+
+    def scroll(self, rows):
+        # returns whether the visible tiles changed
+        total_rows = -(-len(self.apps) // self.columns)
+        row = max(0, min(self.scroll_row + rows, total_rows - self.rows_visible))
+        changed = row != self.scroll_row
+        self.scroll_row = row
+        return changed
+
+    def visible(self):
+        # (app, icon key, tile rect) for every tile on screen
+        first = self.scroll_row * self.columns
+        for offset, (app, key) in enumerate(self.apps[first:first + self.rows_visible * self.columns]):
+            row, column = divmod(offset, self.columns)
+            yield app, key, pygame.Rect(self.rect.left + column * self.tile_width,
+                                   self.header.bottom + row * self.tile_height,
+                                   self.tile_width, self.tile_height)
+
+    def lookup(self, pos):
+        for app, _, rect in self.visible():
+            if rect.collidepoint(pos):
+                return app
+        return None
+
+    def icon(self, app, key):
+        # the tile's icon scaled to fit, or None while it isn't cached yet
+        if key in self.surfaces:
+            self.surfaces.move_to_end(key)
+            return self.surfaces[key]
+        data = self.icon_cache.get(key)
+        if data is None:
+            return None
+        try:
+            image = pygame.image.load(io.BytesIO(data)).convert_alpha()
+            width, height = image.get_size()
+            scale = min((self.tile_width - 12) / width, (self.tile_height - 28) / height)
+            surface = pygame.transform.smoothscale(image, (max(1, int(width * scale)), max(1, int(height * scale))))
+        except pygame.error as e:
+            logger.warning(f"Can't decode the icon for '{app['name']}'. Exception: {e}")
+            surface = None
+        self.decoded += 1
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_surfaces:
+            self.surfaces.popitem(last=False)
+        return surface
+
+
+class DevicePanel:
+    # the device switcher: one row per known TV ("ip:port"), from the discovery
+    # cache and a fresh search each time it opens. the first nine rows on
+    # screen also switch with their number key
+    def __init__(self, rect, row_height=44):
+        self.rect = rect
+        self.header = pygame.Rect(rect.left, rect.top, rect.width, 30)
+        self.row_height = row_height
+        self.rows_visible = max(1, (rect.bottom - self.header.bottom) // row_height)
+        self.names = []
+        self.scroll_row = 0
+        self.open = False
+        self.searching = False
+
+    def add(self, names):
+        # returns whether any were new
+        added = [name for name in names if name not in self.names]
+        self.names.extend(added)
+        return bool(added)
+
+    def scroll(self, rows):
+        # returns whether the visible rows changed
+        row = max(0, min(self.scroll_row + rows, len(self.names) - self.rows_visible))
+        changed = row != self.scroll_row
+        self.scroll_row = row
+        return changed
+
+    def visible(self):
+        # (name, row rect) for every row on screen
+        for offset, name in enumerate(self.names[self.scroll_row:self.scroll_row + self.rows_visible]):
+            yield name, pygame.Rect(self.rect.left, self.header.bottom + offset * self.row_height,
+                                    self.rect.width, self.row_height)
+
+    def lookup(self, pos):
+        for name, rect in self.visible():
+            if rect.collidepoint(pos):
+                return name
+        return None
+
+    def numbered(self, number):
+        # the name on the number-th visible row, 1-based
+        names = self.names[self.scroll_row:self.scroll_row + min(9, self.rows_visible)]
+        return names[number - 1] if 0 < number <= len(names) else None
+
 
 class RokuRemoteApp:
-    def __init__(self, ip_address, port=8060):
-        pygame.init()
+    def __init__(self, ip_address, port=8060, max_pending=32, backlog_threshold=4, type_pacing=0.0,
+                 fps=30, render_mode="cached", show_stats=False, layout=None,
+                 hold_mode="keydown", repeat_delay=0.4, max_repeat_rate=8.0, metrics=None, remote=None,
+                 recorder=None, headless=False, profiler=None, remote_factory=None, max_sessions=4):
+        # headless draws into SDL's dummy video driver instead of opening a window
+        if headless:
+            os.environ["SDL_VIDEODRIVER"] = "dummy"
+        # only the modules the remote uses; pygame.init() would also start audio,
+        # joysticks and the rest before the window could appear
+        pygame.display.init()
+        pygame.font.init()
 
-        self.WIDTH, self.HEIGHT = 300, 600
+        self.layout = layout or DEFAULT_LAYOUT
+        self.WIDTH, self.HEIGHT = self.layout["size"]
         self.screen = pygame.display.set_mode((self.WIDTH, self.HEIGHT))
         pygame.display.set_caption("Roku Remote Interface")
 
@@ -18,53 +349,149 @@ class RokuRemoteApp:
         self.PURPLE = (128, 0, 128)
         self.DARK_GRAY = (50, 50, 50)
         self.RED = (200, 0, 0)
+        self.GREEN = (0, 170, 0)
+        self.AMBER = (220, 150, 0)
+
+        # rendering: "cached" draws the remote body once and only repaints dirty
+        # regions, "full" redraws everything every frame
+        self.fps = fps
+        self.render_mode = render_mode
+        self.clock = pygame.time.Clock()
+        self.background = None
+        self.dirty = []
+        self.highlights = {}  # button name -> time the press highlight ends
+        self.highlight_duration = 0.15
+        # the clock highlights fade by; roku_gui_bench steps a simulated one
+        self.now = time.monotonic
+        self.STATUS_RECT = pygame.Rect(0, 12, 235, 26)
+        self.APP_RECT = pygame.Rect(0, 40, 235, 22)
+        self.TYPING_RECT = pygame.Rect(0, 298, self.WIDTH, 44)
+        self.LAUNCHER_RECT = pygame.Rect(0, 70, self.WIDTH, self.HEIGHT - 70)
+        self.text_cache = TextCache()
+
+        # frame and cpu stats, printed every stats_interval seconds when enabled
+        self.show_stats = show_stats
+        self.stats_interval = 5.0
+        self.frames = 0
+        self.stats_wall = time.perf_counter()
+        self.stats_cpu = time.process_time()
+
+        # render profiling hooks, e.g. roku_gui_bench.FrameProfiler: told about
+        # every event, frame and button drawn and every command handed to the
+        # dispatcher. None costs one check per call site.
+        self.profiler = profiler
+
+        # button positions and sizes
+        self.create_buttons()
 
-        self.remote = RokuRemote(ip_address, port)
+        # paint the remote before importing and starting the networking side
+        self.render_static()
+        self.screen.blit(self.background, (0, 0))
+        pygame.display.flip()
+        from roku_remote import RokuRemote
+        from roku_sessions import SessionPool
+
+        # a roku_record.SessionRecorder gets the buttons pressed and released as
+        # well as the commands the remote sent, so a recording shows both
+        self.recorder = recorder
+
+        # (ip, port) -> the remote for that TV. any object with RokuRemote's
+        # interface works, e.g. roku_client.DaemonRemote to share a running
+        # daemon's connections; remote, if given, is used for the first TV
+        self.remote_factory = remote_factory or (lambda ip, port: RokuRemote(
+            ip, port, type_pacing=type_pacing, metrics=metrics, recorder=recorder))
+        self.initial_remote = remote
+
+        # network calls run on a worker so a slow or sleeping TV never stalls the window
+        self.dispatcher = CommandDispatcher(
+            max_pending=max_pending,
+            policy=BackpressurePolicy(threshold=backlog_threshold),
+            on_complete=self.post_completion,
+        )
+        self.status_text = ""
+
+        # buttons held down with the mouse or a shortcut key: source -> button name.
+        # the holder turns them into clicks, keydown/keyup or client-side repeats
+        self.holder = KeyHolder(self.dispatcher, hold_mode, repeat_delay, max_repeat_rate)
+        self.pressed = {}
+
+        # one warm session per TV the switcher has visited: its remote and
+        # connections, the state cache its poller keeps fresh (the frame loop
+        # only ever reads it), its health and its input and power state. the
+        # dispatcher and holder key their queues by session name, so each TV
+        # keeps its own pending commands too. at most max_sessions stay open.
+        #
+        # liveness of the TV: the dot left of the status line is green while it
+        # answers, red while its breaker is open and commands fail fast, amber
+        # while a probe checks whether it's back. remotes without health (the
+        # daemon's) show no dot.
+        self.sessions = SessionPool(self.create_session, max_sessions, on_evict=self.evict_session)
+        self.session = self.sessions.get(f"{ip_address}:{port}")
 
         # input fsm
-        self.inputs = [
-            "InputTuner", "InputHDMI1", "InputHDMI2", 
-            "InputHDMI3", "InputHDMI4", "InputAV1"
-        ]
-        self.current_input_index = 0
+        self.inputs = roku_keys.INPUTS
 
         # text input state
         self.typing = False
         self.input_text = ""
 
-        # power state
-        self.power_on = False
+        # device switcher, set up the first time it's opened
+        self.device_panel = None
 
-        # button positions and sizes
-        self.create_buttons()
+        # channel launcher, set up the first time it's opened
+        self.launcher = None
+
+    @property
+    def remote(self):
+        return self.session.remote
+
+    @property
+    def state(self):
+        return self.session.state
+
+    def create_session(self, name):
+        from roku_sessions import DeviceSession
+        if self.initial_remote is not None:
+            remote, self.initial_remote = self.initial_remote, None
+        else:
+            ip, _, port = name.rpartition(":")
+            remote = self.remote_factory(ip, int(port))
+        return DeviceSession(name, remote, on_state_change=self.post_state_change,
+                             on_health_change=self.post_health_change)
+
+    def evict_session(self, session):
+        # its held keys were released when the window switched away from it.
+        # the remote is closed on the TV's dispatch worker once the commands
+        # still queued for it are sent, never while one is using it
+        self.dispatcher.remove(session.name, on_drained=lambda: session.close(timeout=0))
 
     def create_buttons(self):
-        self.buttons = {
-            "power": (260, 50, 20, self.toggle_power),
-            "cycle_input": pygame.Rect(170, 80, 60, 40),
-            "home": pygame.Rect(120, 80, 40, 40),
-            "back": pygame.Rect(60, 80, 40, 40),
-            "dpad_up": pygame.Rect(110, 140, 60, 40),
-            "dpad_left": pygame.Rect(70, 180, 40, 60),
-            "dpad_right": pygame.Rect(170, 180, 40, 60),
-            "dpad_down": pygame.Rect(110, 240, 60, 40),
-            "dpad_center": (140, 210, 30, self.remote.select),
-            "play_pause": pygame.Rect(120, 350, 40, 40),
-            "rewind": pygame.Rect(60, 350, 40, 40),
-            "fast_forward": pygame.Rect(180, 350, 40, 40),
-            "vol_up": pygame.Rect(50, 450, 40, 40),
-            "vol_down": pygame.Rect(50, 500, 40, 40),
-            "type_input": pygame.Rect(130, 500, 40, 40),
-            "volume_mute": pygame.Rect(50, 550, 40, 40),
-            "ch_up": pygame.Rect(210, 450, 40, 40),
-            "ch_down": pygame.Rect(210, 500, 40, 40),
-            "instant_replay": pygame.Rect(120, 400, 40, 40),
-            "info": pygame.Rect(120, 550, 40, 40),
-            "backspace": pygame.Rect(120, 600, 40, 40),
-            "search": pygame.Rect(120, 650, 40, 40),
-            "enter": pygame.Rect(120, 700, 40, 40),
-            "find_remote": pygame.Rect(120, 750, 40, 40),
+        self.buttons = {}
+        for spec in self.layout["buttons"]:
+            button = Button.from_spec(spec)
+            if not self.screen.get_rect().contains(button.rect):
+                logger.warning(f"Button '{button.name}' at {tuple(button.rect)} is outside the window")
+            self.buttons[button.name] = button
+        self.hit_map = HitMap(self.WIDTH, self.HEIGHT, list(self.buttons.values()))
+        self.shortcuts = {
+            pygame.key.key_code(button.shortcut): button.name
+            for button in self.buttons.values() if button.shortcut
+        }
+        # icon name -> renderer taking (surface, button)
+        self.icons = {
+            "power": lambda surface, button: self.draw_power_symbol(surface, button.center),
+            "house": lambda surface, button: self.draw_house(surface, button.rect),
+            "arrow_left": lambda surface, button: self.draw_arrow(surface, button.rect, "left"),
+            "arrow_right": lambda surface, button: self.draw_arrow(surface, button.rect, "right"),
+            "arrow_up": lambda surface, button: self.draw_arrow(surface, button.rect, "up"),
+            "arrow_down": lambda surface, button: self.draw_arrow(surface, button.rect, "down"),
+            "play_pause": lambda surface, button: self.draw_play_pause_symbol(surface, button.rect),
+            "rewind": lambda surface, button: self.draw_rewind_symbol(surface, button.rect),
+            "fast_forward": lambda surface, button: self.draw_fast_forward_symbol(surface, button.rect),
         }
+        for button in self.buttons.values():
+            if button.icon is not None and button.icon not in self.icons:
+                raise ValueError(f"Button '{button.name}' has unknown icon '{button.icon}'")
 
     def draw_circle_button(self, surface, color, position, radius, border_color, border_width=2):
         pygame.gfxdraw.filled_circle(surface, *position, radius, color)
@@ -78,8 +505,7 @@ class RokuRemoteApp:
     def draw_text(self, surface, text, position, font_size=20, color=None):
         if color is None:
             color = self.WHITE
-        font = pygame.font.Font(None, font_size)
-        text_surf = font.render(text, True, color)
+        text_surf = self.text_cache.render(text, font_size, color)
         text_rect = text_surf.get_rect(center=position)
         surface.blit(text_surf, text_rect)
 
@@ -143,178 +569,622 @@ class RokuRemoteApp:
             (x + w // 2, y + 3 * h // 4)
         ])
 
-    def handle_click(self, pos):
-        for name, rect in self.buttons.items():
-            if name == "power":
-                if (pos[0] - rect[0]) ** 2 + (pos[1] - rect[1]) ** 2 <= rect[2] ** 2:
-                    rect[3]()
-                    return
-            elif name == "dpad_center":
-                if (pos[0] - rect[0]) ** 2 + (pos[1] - rect[1]) ** 2 <= rect[2] ** 2:
-                    rect[3]()
-                    return
-            elif name == "cycle_input":
-                if rect.collidepoint(pos):
-                    self.cycle_input()
-                    return
-            elif name == "type_input":
-                if rect.collidepoint(pos):
-                    self.typing = True
-                    return
+    def handle_click(self, pos, source=None):
+        # returns the name of the button that was hit, if any
+        name = self.hit_map.lookup(pos)
+        if name is not None:
+            self.press(name, source)
+        return name
+
+    def press(self, name, source=None):
+        if self.recorder is not None:
+            self.recorder.record(self.session.name, "ui-press", name, time.time())
+        button = self.buttons[name]
+        if button.command is not None:
+            queued = self.holder.press(self.session.name, self.remote, button.command)
+            if queued and self.profiler is not None:
+                self.profiler.queued(button.command)
+            if source is not None:
+                self.pressed[source] = name
+                self.highlights[name] = math.inf
+                self.mark_dirty(button.rect)
+        else:
+            getattr(self, button.action)()
+
+    def release(self, source):
+        name = self.pressed.pop(source, None)
+        if name is None:
+            return
+        if self.recorder is not None:
+            self.recorder.record(self.session.name, "ui-release", name, time.time())
+        queued = self.holder.release(self.session.name, self.buttons[name].command)
+        if queued and self.profiler is not None:
+            self.profiler.queued(self.buttons[name].command)
+        self.highlight(name)
+
+    def release_all(self):
+        # focus loss, quit and errors all end every hold; nothing may stay down on the TV
+        for source in list(self.pressed):
+            self.release(source)
+        self.holder.release_all()
+
+    def start_typing(self):
+        self.typing = True
+        self.mark_dirty(self.TYPING_RECT)
+
+    def dispatch(self, key, action, *args):
+        self.dispatcher.submit(self.session.name, key, action, *args)
+        if self.profiler is not None:
+            self.profiler.queued(key)
+
+    def post_completion(self, command, status, error):
+        # called on the dispatcher thread; pygame.event.post is thread safe
+        pygame.event.post(pygame.event.Event(COMMAND_DONE, device=command.device, key=command.key, status=status))
+        # the TV state is most likely to change right after a command; only a
+        # power key can change device-info, which otherwise waits out its TTL
+        session = self.sessions.peek(command.device)
+        if session is not None:
+            if command.key in roku_keys.POWER_KEYS:
+                session.poller.poke(("active-app", "device-info"))
             else:
-                if rect.collidepoint(pos):
-                    if name == "home":
-                        self.remote.home()
-                    elif name == "back":
-                        self.remote.back()
-                    elif name == "dpad_up":
-                        self.remote.up()
-                    elif name == "dpad_left":
-                        self.remote.left()
-                    elif name == "dpad_right":
-                        self.remote.right()
-                    elif name == "dpad_down":
-                        self.remote.down()
-                    elif name == "play_pause":
-                        self.remote.play()
-                    elif name == "rewind":
-                        self.remote.rewind()
-                    elif name == "fast_forward":
-                        self.remote.fast_forward()
-                    elif name == "vol_up":
-                        self.remote.volume_up()
-                    elif name == "vol_down":
-                        self.remote.volume_down()
-                    elif name == "volume_mute":
-                        self.remote.volume_mute()
-                    elif name == "ch_up":
-                        self.remote.channel_up()
-                    elif name == "ch_down":
-                        self.remote.channel_down()
-                    elif name == "instant_replay":
-                        self.remote.instant_replay()
-                    elif name == "info":
-                        self.remote.info()
-                    elif name == "backspace":
-                        self.remote.backspace()
-                    elif name == "search":
-                        self.remote.search()
-                    elif name == "enter":
-                        self.remote.enter()
-                    elif name == "find_remote":
-                        self.remote.find_remote()
-                    return
+                session.poller.poke()
+
+    def post_state_change(self, session, endpoint, data):
+        # called on a session's poller thread
+        pygame.event.post(pygame.event.Event(STATE_CHANGED, device=session.name, endpoint=endpoint))
+
+    def post_health_change(self, session, health):
+        # called on whichever thread saw the change
+        pygame.event.post(pygame.event.Event(HEALTH_CHANGED, device=session.name, state=health.state))
+
+    def apply_command_done(self, device, key, status):
+        # only the TV on screen reports into the status line
+        if device == self.session.name:
+            self.status_text = key if status == SENT else f"{key} {status}"
+            self.mark_dirty(self.STATUS_RECT)
+
+    def apply_health_change(self, device, state):
+        session = self.sessions.peek(device)
+        if session is None:
+            return
+        current = session is self.session
+        if current and state == "closed" and session.health_state != "closed":
+            self.status_text = "TV reconnected"
+        session.health_state = state
+        if current:
+            self.mark_dirty(self.STATUS_RECT)
+        elif self.device_panel is not None and self.device_panel.open:
+            self.mark_dirty(self.LAUNCHER_RECT)
+
+    def apply_state_change(self, device, endpoint):
+        # background sessions keep their own text and input current too, so
+        # switching to one draws it straight from its cache
+        session = self.sessions.peek(device)
+        if session is None:
+            return
+        if endpoint == "active-app":
+            app = session.state.get("active-app") or {}
+            session.app_text = app.get("app", "")
+            # follow input changes made with the real remote
+            active_input = session.state.active_input()
+            if active_input in self.inputs:
+                session.current_input_index = self.inputs.index(active_input)
+            if session is self.session:
+                self.mark_dirty(self.APP_RECT)
+        elif endpoint == "device-info":
+            # the TV's own name replaces its address once it has answered
+            if session is self.session and self.status_text == session.name:
+                self.status_text = session.label
+                self.mark_dirty(self.STATUS_RECT)
+            if self.device_panel is not None and self.device_panel.open:
+                self.mark_dirty(self.LAUNCHER_RECT)
 
     def cycle_input(self):
-        self.current_input_index = (self.current_input_index + 1) % len(self.inputs)
-        current_input = self.inputs[self.current_input_index]
-        self.remote.send_command(current_input)
+        session = self.session
+        session.current_input_index = (session.current_input_index + 1) % len(self.inputs)
+        current_input = self.inputs[session.current_input_index]
+        self.dispatch(current_input, self.remote.send_command, current_input)
 
     def type_input(self):
-        for char in self.input_text:
-            self.remote.send_command(f"Lit_{char}")
+        # queued as one command so a long string can't fill the dispatch queue
+        self.dispatch("Lit", self.send_literals, self.remote, self.input_text)
         self.input_text = ""
         self.typing = False
+        self.mark_dirty(self.TYPING_RECT)
+
+    def send_literals(self, remote, text):
+        return remote.type_text(text) == len(text)
 
     def toggle_power(self):
-        if self.power_on:
-            self.remote.power_off()
+        session = self.session
+        power_mode = session.state.power_mode()
+        if power_mode is not None:
+            session.power_on = power_mode == "PowerOn"
+        if session.power_on:
+            self.dispatch("PowerOff", self.remote.power_off)
         else:
-            self.remote.power_on()
-        self.power_on = not self.power_on
-
-    def draw_buttons(self):
-        for name, rect in self.buttons.items():
-            if name == "power":
-                self.draw_circle_button(self.screen, self.RED, rect[:2], rect[2], self.WHITE)
-                self.draw_power_symbol(self.screen, rect[:2])
-            elif name == "dpad_center":
-                self.draw_circle_button(self.screen, self.PURPLE, rect[:2], rect[2], self.WHITE)
-                self.draw_text(self.screen, "OK", rect[:2])
-            elif name == "cycle_input":
-                pygame.draw.rect(self.screen, self.DARK_GRAY, rect, border_radius=10)
-                pygame.draw.rect(self.screen, self.WHITE, rect, 2, border_radius=10)
-                self.draw_text(self.screen, "Input", rect.center, font_size=15)
-            elif name == "type_input":
-                pygame.draw.rect(self.screen, self.DARK_GRAY, rect, border_radius=10)
-                pygame.draw.rect(self.screen, self.WHITE, rect, 2, border_radius=10)
-                self.draw_text(self.screen, "Type", rect.center, font_size=15)
-            else:
-                color = self.PURPLE if "dpad" in name else self.DARK_GRAY
-                pygame.draw.rect(self.screen, color, rect, border_radius=10)
-                pygame.draw.rect(self.screen, self.WHITE, rect, 2, border_radius=10)
-                if name == "home":
-                    self.draw_house(self.screen, rect)
-                elif name == "back":
-                    self.draw_arrow(self.screen, rect, "left")
-                elif name == "dpad_up":
-                    self.draw_arrow(self.screen, rect, "up")
-                elif name == "dpad_left":
-                    self.draw_arrow(self.screen, rect, "left")
-                elif name == "dpad_right":
-                    self.draw_arrow(self.screen, rect, "right")
-                elif name == "dpad_down":
-                    self.draw_arrow(self.screen, rect, "down")
-                elif name == "play_pause":
-                    self.draw_play_pause_symbol(self.screen, rect)
-                elif name == "rewind":
-                    self.draw_rewind_symbol(self.screen, rect)
-                elif name == "fast_forward":
-                    self.draw_fast_forward_symbol(self.screen, rect)
-                elif name == "vol_up":
-                    self.draw_text(self.screen, "Vol+", rect.center, font_size=15)
-                elif name == "vol_down":
-                    self.draw_text(self.screen, "Vol-", rect.center, font_size=15)
-                elif name == "volume_mute":
-                    self.draw_text(self.screen, "Mute", rect.center, font_size=15)
-                elif name == "ch_up":
-                    self.draw_text(self.screen, "CH+", rect.center, font_size=15)
-                elif name == "ch_down":
-                    self.draw_text(self.screen, "CH-", rect.center, font_size=15)
-                elif name == "instant_replay":
-                    self.draw_text(self.screen, "IR", rect.center, font_size=15)
-                elif name == "info":
-                    self.draw_text(self.screen, "Info", rect.center, font_size=15)
-                elif name == "backspace":
-                    self.draw_text(self.screen, "Back", rect.center, font_size=15)
-                elif name == "search":
-                    self.draw_text(self.screen, "Search", rect.center, font_size=15)
-                elif name == "enter":
-                    self.draw_text(self.screen, "Enter", rect.center, font_size=15)
-                elif name == "find_remote":
-                    self.draw_text(self.screen, "Find", rect.center, font_size=15)
+            self.dispatch("PowerOn", self.remote.power_on)
+        session.power_on = not session.power_on
+
+    def toggle_launcher(self):
+        if self.launcher is None:
+            from roku_icons import IconCache
+            self.launcher = Launcher(self.LAUNCHER_RECT, IconCache())
+        launcher = self.launcher
+        launcher.open = not launcher.open
+        if launcher.open and self.device_panel is not None and self.device_panel.open:
+            self.device_panel.open = False
+        # the last list shows straight away while a fresh one loads
+        session = self.session
+        if launcher.open and not session.apps_loading:
+            session.apps_loading = launcher.loading = True
+            threading.Thread(target=self.load_apps, args=(session,), name="roku-apps", daemon=True).start()
+        self.mark_dirty(self.LAUNCHER_RECT)
+
+    def load_apps(self, session):
+        # runs on its own thread: one /query/apps, then only the icons that
+        # aren't already on disk, fetched concurrently
+        from roku_icons import fetch_icons
+        launcher = self.launcher
+        try:
+            apps = session.remote.query_apps()
+        except Exception as e:
+            logger.warning(f"Failed to load the channel list. Exception: {e}")
+            error = "Can't load channels"
+            apps = None
+        else:
+            error = None
+        pygame.event.post(pygame.event.Event(APPS_LOADED, device=session.name, apps=apps, error=error))
+        if apps:
+            fetch_icons(session.remote, apps, launcher.icon_cache,
+                        on_icon=lambda app: pygame.event.post(
+                            pygame.event.Event(APPS_LOADED, device=session.name, apps=None, error=None)))
+        session.apps_loading = False
+        pygame.event.post(pygame.event.Event(APPS_LOADED, device=session.name, apps=None, error=error))
+
+    def apply_apps_loaded(self, device, apps, error):
+        session = self.sessions.peek(device)
+        if session is None:
+            return
+        if apps is not None:
+            session.apps = apps
+        if session is not self.session:
+            return
+        launcher = self.launcher
+        launcher.loading = session.apps_loading
+        launcher.error = error
+        if apps is not None:
+            launcher.set_apps(apps)
+        if launcher.open:
+            self.mark_dirty(self.LAUNCHER_RECT)
+
+    def launch_app(self, app):
+        self.dispatch(app["name"], self.remote.launch, app["id"])
+        self.toggle_launcher()
+
+    def handle_launcher_key(self, key):
+        launcher = self.launcher
+        if key in (pygame.K_ESCAPE, pygame.K_a):
+            self.toggle_launcher()
+            return
+        rows = {pygame.K_UP: -1, pygame.K_DOWN: 1,
+                pygame.K_PAGEUP: -launcher.rows_visible, pygame.K_PAGEDOWN: launcher.rows_visible}.get(key)
+        if rows and launcher.scroll(rows):
+            self.mark_dirty(self.LAUNCHER_RECT)
+
+    def handle_launcher_click(self, pos):
+        if self.launcher.header.collidepoint(pos):
+            self.toggle_launcher()
+            return
+        app = self.launcher.lookup(pos)
+        if app is not None:
+            self.launch_app(app)
+
+    def toggle_devices(self):
+        if self.device_panel is None:
+            self.device_panel = DevicePanel(self.LAUNCHER_RECT)
+            self.device_panel.add([self.session.name])
+        panel = self.device_panel
+        panel.open = not panel.open
+        if panel.open and self.launcher is not None and self.launcher.open:
+            self.launcher.open = False
+        # the cached TVs show straight away while a fresh search runs
+        if panel.open and not panel.searching:
+            import roku_discovery
+            cache = roku_discovery.DeviceCache()
+            panel.add(f"{device.ip}:{device.port}" for device in cache.load())
+            panel.searching = True
+            roku_discovery.refresh_in_background(cache, on_update=self.post_devices_found)
+        self.mark_dirty(self.LAUNCHER_RECT)
+
+    def post_devices_found(self, devices):
+        # called on the discovery thread, which can outlive the window
+        try:
+            pygame.event.post(pygame.event.Event(
+                DEVICES_FOUND, devices=[f"{device.ip}:{device.port}" for device in devices]))
+        except pygame.error:
+            pass
+
+    def switch_device(self, name):
+        # a pointer swap to the TV's warm session; nothing here touches the
+        # network, so the next frame shows the new TV from its cache. a TV
+        # without a session gets one, and its poller fills it in as it answers.
+        if self.device_panel is not None:
+            self.device_panel.open = False
+        if self.launcher is not None:
+            self.launcher.open = False
+        if name != self.session.name:
+            # holds belong to the TV they were pressed on
+            self.release_all()
+            previous = self.session.name
+            self.session = self.sessions.get(name)
+            self.status_text = self.session.label
+            if self.recorder is not None:
+                self.recorder.record(name, "ui-switch", previous, time.time())
+            if self.launcher is not None:
+                self.launcher.set_apps(self.session.apps or [])
+                self.launcher.loading = self.session.apps_loading
+                self.launcher.error = None
+        self.mark_dirty(self.screen.get_rect())
+
+    def handle_devices_key(self, key):
+        panel = self.device_panel
+        if key in (pygame.K_ESCAPE, pygame.K_d):
+            self.toggle_devices()
+            return
+        if pygame.K_1 <= key <= pygame.K_9:
+            name = panel.numbered(key - pygame.K_0)
+            if name is not None:
+                self.switch_device(name)
+            return
+        rows = {pygame.K_UP: -1, pygame.K_DOWN: 1,
+                pygame.K_PAGEUP: -panel.rows_visible, pygame.K_PAGEDOWN: panel.rows_visible}.get(key)
+        if rows and panel.scroll(rows):
+            self.mark_dirty(self.LAUNCHER_RECT)
+
+    def handle_devices_click(self, pos):
+        if self.device_panel.header.collidepoint(pos):
+            self.toggle_devices()
+            return
+        name = self.device_panel.lookup(pos)
+        if name is not None:
+            self.switch_device(name)
+
+    def lighten(self, color, amount=60):
+        return tuple(min(255, c + amount) for c in color)
+
+    def button_bounds(self, name):
+        return self.buttons[name].rect
+
+    def draw_button(self, surface, name, highlighted=False):
+        profiler = self.profiler
+        if profiler is not None:
+            start = time.perf_counter()
+        button = self.buttons[name]
+        color = getattr(self, button.color)
+        if highlighted:
+            color = self.lighten(color)
+        if button.shape == "circle":
+            self.draw_circle_button(surface, color, button.center, button.radius, self.WHITE)
+        else:
+            pygame.draw.rect(surface, color, button.rect, border_radius=10)
+            pygame.draw.rect(surface, self.WHITE, button.rect, 2, border_radius=10)
+        if button.icon is not None:
+            self.icons[button.icon](surface, button)
+        if button.label is not None:
+            self.draw_text(surface, button.label, button.center or button.rect.center, font_size=button.font_size)
+        if profiler is not None:
+            profiler.button(name, time.perf_counter() - start)
+
+    def draw_buttons(self, surface=None):
+        surface = surface or self.screen
+        for name in self.buttons:
+            self.draw_button(surface, name, highlighted=name in self.highlights)
+
+    def health_color(self, health_state):
+        return {"closed": self.GREEN, "open": self.RED}.get(health_state, self.AMBER)
+
+    def draw_overlay(self, surface, rects=None):
+        # the status line, app name and Type box. with rects, only the ones
+        # overlapping them are drawn, so nothing is drawn over itself
+        session = self.session
+        if rects is None or self.STATUS_RECT.collidelist(rects) != -1:
+            if session.health_state is not None:
+                pygame.draw.circle(surface, self.health_color(session.health_state), (10, self.STATUS_RECT.centery), 4)
+            # while the TV is down that matters more than the last command's status
+            status_text = {"open": "TV not responding", "half-open": "Checking TV..."}.get(session.health_state, self.status_text)
+            if status_text:
+                surface.set_clip(self.STATUS_RECT)
+                self.draw_text(surface, status_text, self.STATUS_RECT.center, font_size=15)
+                surface.set_clip(None)
+        if session.app_text and (rects is None or self.APP_RECT.collidelist(rects) != -1):
+            surface.set_clip(self.APP_RECT)
+            self.draw_text(surface, session.app_text, self.APP_RECT.center, font_size=15, color=self.lighten(self.PURPLE, 90))
+            surface.set_clip(None)
 
         # Draw the text input box if typing
-        if self.typing:
-            pygame.draw.rect(self.screen, self.WHITE, (50, 300, 200, 40), 2)
-            self.draw_text(self.screen, self.input_text, (150, 320), font_size=20, color=self.WHITE)
+        if self.typing and (rects is None or self.TYPING_RECT.collidelist(rects) != -1):
+            pygame.draw.rect(surface, self.WHITE, (50, 300, 200, 40), 2)
+            self.draw_text(surface, self.input_text, (150, 320), font_size=20, color=self.WHITE)
+
+    def draw_launcher(self, surface):
+        launcher = self.launcher
+        surface.fill(self.BLACK, launcher.rect)
+        pygame.draw.line(surface, self.WHITE, launcher.header.bottomleft, launcher.header.bottomright)
+        self.draw_text(surface, "Channels - Esc closes", launcher.header.center, font_size=18)
+        if not launcher.apps:
+            message = launcher.error or ("Loading..." if launcher.loading else "No channels")
+            self.draw_text(surface, message, launcher.rect.center, font_size=18)
+            return
+        for app, key, rect in launcher.visible():
+            icon = launcher.icon(app, key)
+            icon_area = pygame.Rect(rect.left + 6, rect.top + 4, rect.width - 12, rect.height - 28)
+            if icon is None:
+                pygame.draw.rect(surface, self.DARK_GRAY, icon_area, border_radius=6)
+            else:
+                surface.blit(icon, icon.get_rect(center=icon_area.center))
+            name = app["name"] if len(app["name"]) <= 14 else app["name"][:13] + ".."
+            self.draw_text(surface, name, (rect.centerx, rect.bottom - 12), font_size=15)
+
+    def draw_devices(self, surface):
+        # the current TV is highlighted; TVs with a warm session show their
+        # health dot and the name they report, the rest their address
+        panel = self.device_panel
+        surface.fill(self.BLACK, panel.rect)
+        pygame.draw.line(surface, self.WHITE, panel.header.bottomleft, panel.header.bottomright)
+        title = "TVs - searching..." if panel.searching else "TVs - Esc closes"
+        self.draw_text(surface, title, panel.header.center, font_size=18)
+        for number, (name, rect) in enumerate(panel.visible(), 1):
+            session = self.sessions.peek(name)
+            row = rect.inflate(-12, -6)
+            if session is self.session:
+                pygame.draw.rect(surface, self.PURPLE, row, border_radius=8)
+            elif session is not None:
+                pygame.draw.rect(surface, self.DARK_GRAY, row, border_radius=8)
+            else:
+                pygame.draw.rect(surface, self.DARK_GRAY, row, 1, border_radius=8)
+            if session is not None and session.health_state is not None:
+                pygame.draw.circle(surface, self.health_color(session.health_state), (row.left + 12, row.centery), 4)
+            label = session.label if session is not None else name
+            if len(label) > 28:
+                label = label[:27] + ".."
+            if number <= 9:
+                label = f"{number}  {label}"
+            self.draw_text(surface, label, row.center, font_size=18)
+
+    def render_static(self):
+        # the remote body never changes, so it is drawn once and blitted from here
+        self.background = pygame.Surface((self.WIDTH, self.HEIGHT)).convert()
+        self.background.fill(self.BLACK)
+        for name in self.buttons:
+            self.draw_button(self.background, name)
+
+    def mark_dirty(self, rect):
+        self.dirty.append(pygame.Rect(rect))
+
+    def highlight(self, name):
+        self.highlights[name] = self.now() + self.highlight_duration
+        self.mark_dirty(self.button_bounds(name))
+
+    def expire_highlights(self):
+        now = self.now()
+        for name, until in list(self.highlights.items()):
+            if until <= now:
+                del self.highlights[name]
+                self.mark_dirty(self.button_bounds(name))
+
+    def render_full(self):
+        self.screen.fill(self.BLACK)
+        self.draw_buttons()
+        self.draw_overlay(self.screen)
+        if self.launcher is not None and self.launcher.open:
+            self.draw_launcher(self.screen)
+        if self.device_panel is not None and self.device_panel.open:
+            self.draw_devices(self.screen)
+        pygame.display.flip()
+        self.dirty = []
+        self.frames += 1
+        return True
+
+    def render_dirty(self):
+        if not self.dirty:
+            return False
+        rects = self.dirty
+        self.dirty = []
+        # anything drawn over the background is redrawn whole once any part
+        # of it is dirty, onto background blitted over all of it first;
+        # drawing it again onto its own anti-aliased pixels would smear them
+        highlighted = [self.button_bounds(name) for name in self.highlights]
+        for rect in (self.STATUS_RECT, self.APP_RECT, self.TYPING_RECT, *highlighted):
+            if rect.collidelist(rects) != -1 and not any(dirty.contains(rect) for dirty in rects):
+                rects.append(rect)
+        for rect in rects:
+            self.screen.blit(self.background, rect, rect)
+        for name in self.highlights:
+            if self.button_bounds(name).collidelist(rects) != -1:
+                self.draw_button(self.screen, name, highlighted=True)
+        self.draw_overlay(self.screen, rects)
+        if self.LAUNCHER_RECT.collidelist(rects) != -1:
+            if self.launcher is not None and self.launcher.open:
+                self.draw_launcher(self.screen)
+            if self.device_panel is not None and self.device_panel.open:
+                self.draw_devices(self.screen)
+        pygame.display.update(rects)
+        self.frames += 1
+        return True
+
+    def draw_frame(self):
+        # returns whether anything was drawn
+        self.expire_highlights()
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.frame_start()
+        drawn = self.render_full() if self.render_mode == "full" else self.render_dirty()
+        if profiler is not None:
+            profiler.frame_end(drawn)
+        return drawn
+
+    def wait_events(self):
+        # sleeps until something happens; only wakes on a timer while a press
+        # highlight is waiting to fade or stats are due
+        if self.render_mode == "full":
+            return pygame.event.get()
+        deadlines = [until for until in self.highlights.values() if until != math.inf]
+        if self.show_stats:
+            deadlines.append(self.now() + self.stats_interval)
+        if deadlines:
+            timeout = max(1, int((min(deadlines) - self.now()) * 1000))
+            first = pygame.event.wait(timeout)
+        else:
+            first = pygame.event.wait()
+        events = [] if first.type == pygame.NOEVENT else [first]
+        return events + pygame.event.get()
+
+    def report_stats(self):
+        wall = time.perf_counter()
+        elapsed = wall - self.stats_wall
+        if elapsed < self.stats_interval:
+            return
+        cpu = time.process_time()
+        text = self.text_cache.stats()
+        print(f"fps: {self.frames / elapsed:.1f}, cpu: {100 * (cpu - self.stats_cpu) / elapsed:.1f}%, "
+              f"text cache: {text['text_hits']} hits / {text['text_misses']} misses, "
+              f"fonts: {text['font_hits']} hits / {text['font_misses']} misses")
+        self.frames = 0
+        self.stats_wall = wall
+        self.stats_cpu = cpu
 
     def run(self):
-        running = True
-        while running:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    running = False
-                elif event.type == pygame.MOUSEBUTTONDOWN:
-                    self.handle_click(event.pos)
-                elif event.type == pygame.KEYDOWN and self.typing:
-                    if event.key == pygame.K_RETURN:
-                        self.type_input()
-                    elif event.key == pygame.K_BACKSPACE:
-                        self.input_text = self.input_text[:-1]
-                    else:
-                        self.input_text += event.unicode
-
-            self.screen.fill(self.BLACK)
-            self.draw_buttons()
-            pygame.display.flip()
+        # mouse motion is never used; dropping it keeps the idle loop asleep
+        pygame.event.set_blocked(pygame.MOUSEMOTION)
+        self.mark_dirty(self.screen.get_rect())
+        self.sessions.start()
+
+        try:
+            self.event_loop()
+        finally:
+            self.close()
 
+    def close(self):
+        self.release_all()
+        self.holder.stop()
+        self.dispatcher.stop(timeout=self.remote.timeout)
+        self.sessions.close(timeout=self.remote.timeout)
+        if self.launcher is not None:
+            self.launcher.icon_cache.save()
+        if self.recorder is not None:
+            self.recorder.close()
         pygame.quit()
 
+    def event_loop(self):
+        self.running = True
+        while self.running:
+            for event in self.wait_events():
+                self.handle_event(event)
+            self.draw_frame()
+            if self.show_stats:
+                self.report_stats()
+            self.clock.tick(self.fps)
+
+    def handle_event(self, event):
+        if self.profiler is not None:
+            self.profiler.event(event)
+        if event.type == pygame.QUIT:
+            self.running = False
+        elif event.type == pygame.WINDOWEXPOSED:
+            self.mark_dirty(self.screen.get_rect())
+        elif event.type == pygame.WINDOWFOCUSLOST:
+            self.release_all()
+        elif event.type == COMMAND_DONE:
+            self.apply_command_done(event.device, event.key, event.status)
+        elif event.type == STATE_CHANGED:
+            self.apply_state_change(event.device, event.endpoint)
+        elif event.type == HEALTH_CHANGED:
+            self.apply_health_change(event.device, event.state)
+        elif event.type == APPS_LOADED:
+            self.apply_apps_loaded(event.device, event.apps, event.error)
+        elif event.type == DEVICES_FOUND:
+            panel = self.device_panel
+            panel.searching = False
+            panel.add(event.devices)
+            if panel.open:
+                self.mark_dirty(self.LAUNCHER_RECT)
+        elif self.device_panel is not None and self.device_panel.open and event.type in (
+                pygame.MOUSEBUTTONDOWN, pygame.MOUSEWHEEL, pygame.KEYDOWN):
+            # like the launcher, the switcher takes input until it's closed
+            if event.type == pygame.KEYDOWN:
+                self.handle_devices_key(event.key)
+            elif event.type == pygame.MOUSEWHEEL:
+                if self.device_panel.scroll(-event.y):
+                    self.mark_dirty(self.LAUNCHER_RECT)
+            elif event.button == 1 and self.device_panel.rect.collidepoint(event.pos):
+                self.handle_devices_click(event.pos)
+            elif not self.device_panel.rect.collidepoint(event.pos):
+                name = self.handle_click(event.pos, ("mouse", event.button))
+                if name and ("mouse", event.button) not in self.pressed:
+                    self.highlight(name)
+        elif self.launcher is not None and self.launcher.open and event.type in (
+                pygame.MOUSEBUTTONDOWN, pygame.MOUSEWHEEL, pygame.KEYDOWN):
+            # the panel takes clicks, the wheel and keys until it's closed
+            if event.type == pygame.KEYDOWN:
+                self.handle_launcher_key(event.key)
+            elif event.type == pygame.MOUSEWHEEL:
+                if self.launcher.scroll(-event.y):
+                    self.mark_dirty(self.LAUNCHER_RECT)
+            elif event.button == 1 and self.launcher.rect.collidepoint(event.pos):
+                self.handle_launcher_click(event.pos)
+            elif not self.launcher.rect.collidepoint(event.pos):
+                name = self.handle_click(event.pos, ("mouse", event.button))
+                if name and ("mouse", event.button) not in self.pressed:
+                    self.highlight(name)
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            name = self.handle_click(event.pos, ("mouse", event.button))
+            if name and ("mouse", event.button) not in self.pressed:
+                self.highlight(name)
+        elif event.type == pygame.MOUSEBUTTONUP:
+            self.release(("mouse", event.button))
+        elif event.type == pygame.KEYDOWN and not self.typing:
+            name = self.shortcuts.get(event.key)
+            if name:
+                self.press(name, ("key", event.key))
+                if ("key", event.key) not in self.pressed:
+                    self.highlight(name)
+        elif event.type == pygame.KEYUP:
+            self.release(("key", event.key))
+        elif event.type == pygame.KEYDOWN and self.typing:
+            if event.key == pygame.K_RETURN:
+                self.type_input()
+            elif event.key == pygame.K_BACKSPACE:
+                self.input_text = self.input_text[:-1]
+            else:
+                self.input_text += event.unicode
+            self.mark_dirty(self.TYPING_RECT)
+
+
 if __name__ == "__main__":
+    import argparse
+    import roku_discovery
+
     parser = argparse.ArgumentParser(description="Roku Remote GUI Application")
-    parser.add_argument("--ip", type=str, default="192.168.50.59", help="IP address of the Roku TV (default: 192.168.50.59")
+    parser.add_argument("--ip", type=str, help="IP address of the Roku TV (default: last discovered TV, else 192.168.50.59)")
     parser.add_argument("--port", type=int, default=8060, help="Port of the Roku TV (default: 8060)")
+    parser.add_argument("--max-pending", type=int, default=32, help="Max queued commands per TV before new ones are rejected (default: 32)")
+    parser.add_argument("--backlog-threshold", type=int, default=4, help="Queue depth at which repeats are coalesced and stale d-pad moves dropped (default: 4)")
+    parser.add_argument("--type-pacing", type=float, default=0.0, help="Seconds to wait between typed characters (default: 0)")
+    parser.add_argument("--fps", type=int, default=30, help="Max frames drawn per second (default: 30)")
+    parser.add_argument("--render", choices=["cached", "full"], default="cached", help="cached repaints only what changed; full redraws every frame (default: cached)")
+    parser.add_argument("--stats", action="store_true", help="Print frames per second and CPU use every few seconds")
+    parser.add_argument("--hold-mode", choices=["keydown", "repeat", "press"], default="keydown",
+                        help="keydown: hold keys on the TV with keydown/keyup; repeat: re-send presses while held; press: one press per click (default: keydown)")
+    parser.add_argument("--repeat-delay", type=float, default=0.4, help="Seconds before a held key is held on the TV (keydown mode) or starts repeating (repeat mode) (default: 0.4)")
+    parser.add_argument("--max-repeat-rate", type=float, default=8.0, help="Max repeated presses per second per TV in repeat mode (default: 8)")
+    parser.add_argument("--layout", type=str, help="JSON file with an alternate button layout")
+    parser.add_argument("--daemon", type=str, nargs="?", const="", metavar="SOCKET",
+                        help="Send commands through a running roku_remote.py --daemon (default socket if none given)")
+    parser.add_argument("--metrics-port", type=int, help="Time every command and serve the metrics on this local port (/metrics, /metrics.json)")
+    parser.add_argument("--record", type=str, metavar="PATH", help="Record every button and command to PATH (see roku_record.py)")
+    parser.add_argument("--record-literals", action="store_true", help="Also record the characters typed; by default they are redacted")
+    parser.add_argument("--max-sessions", type=int, default=4, help="TVs the switcher keeps connected and polled; the least recently used beyond this are closed (default: 4)")
     parser.add_argument("--enable_logging", action="store_true", help="Enable logging")
     args = parser.parse_args()
 
@@ -323,5 +1193,33 @@ if __name__ == "__main__":
     else:
         logging.basicConfig(level=logging.CRITICAL)
 
-    app = RokuRemoteApp(args.ip, args.port)
+    if args.ip is None:
+        # start on the cached TV right away; discovery refreshes the cache in the background
+        device = roku_discovery.pick_device()
+        if device:
+            args.ip, args.port = device.ip, device.port
+        else:
+            logger.warning("No Roku TV found, falling back to 192.168.50.59")
+            args.ip = "192.168.50.59"
+
+    metrics = None
+    if args.metrics_port is not None:
+        import roku_metrics
+        metrics = roku_metrics.CommandMetrics()
+        roku_metrics.serve_metrics(metrics, port=args.metrics_port)
+
+    recorder = None
+    if args.record:
+        from roku_record import SessionRecorder
+        recorder = SessionRecorder(args.record, literals=args.record_literals)
+
+    remote_factory = None
+    if args.daemon is not None:
+        from roku_client import DaemonRemote
+        remote_factory = lambda ip, port: DaemonRemote(ip, port, args.daemon or None)
+
+    app = RokuRemoteApp(args.ip, args.port, args.max_pending, args.backlog_threshold, args.type_pacing,
+                        args.fps, args.render, args.stats, load_layout(args.layout) if args.layout else None,
+                        args.hold_mode, args.repeat_delay, args.max_repeat_rate, metrics,
+                        recorder=recorder, remote_factory=remote_factory, max_sessions=args.max_sessions)
     app.run()
@@ -0,0 +1,500 @@
+import asyncio
+import collections
+import logging
+import time
+
+import roku_health
+import roku_http
+import roku_keys
+import roku_state
+
+logger = logging.getLogger(__name__)
+
+class HTTPError(Exception):
+    pass
+
+
+class _AsyncConnection:
+    # a single keep-alive HTTP/1.1 connection speaking just enough of the
+    # protocol for ECP: empty-body requests, Content-Length or chunked replies
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.last_used = time.monotonic()
+        self.reusable = True
+
+    @classmethod
+    async def open(cls, host, port):
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def request(self, method, host, path, raw=None):
+        await self.send(method, host, path, raw)
+        return await self.read_response()
+
+    async def send(self, method, host, path, raw=None):
+        self.write_request(method, host, path, raw)
+        await self.writer.drain()
+
+    def write_request(self, method, host, path, raw=None):
+        # buffered only; several requests can be written before one drain.
+        # raw is the request already encoded, from roku_keys.KeyRequests
+        self.writer.write(raw or roku_keys.request_bytes(method, host, path))
+
+    async def read_response(self):
+        try:
+            return await self._read_response()
+        except ValueError as e:
+            # a garbled status code, chunk size or Content-Length, reported
+            # like roku_http.read_response does
+            raise HTTPError(f"Malformed response: {e}") from e
+
+    async def _read_response(self):
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed before response")
+        parts = status_line.split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith(b"HTTP/"):
+            raise HTTPError(f"Malformed status line: {status_line!r}")
+        status = int(parts[1])
+
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            body = b""
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                body += await self.reader.readexactly(size)
+                await self.reader.readline()
+        elif "content-length" in headers:
+            body = await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await self.reader.read()
+            self.reusable = False
+
+        if headers.get("connection", "").lower() == "close" or parts[0] == b"HTTP/1.0":
+            self.reusable = False
+        self.last_used = time.monotonic()
+        return status, body
+
+    def close(self):
+        self.reusable = False
+        self.writer.close()
+
+
+class AsyncRokuRemote:
+    def __init__(self, ip_address=None, port=8060, timeout=2, pool_size=4, idle_timeout=30, metrics=None,
+                 failure_threshold=3, adaptive_timeout=True):
+        self.ip_address = ip_address
+        self.port = port
+        self.host = f"{ip_address}:{port}"
+        self.base_url = f"http://{self.host}" if ip_address else None
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.metrics = metrics  # a roku_metrics.CommandMetrics to time every key sent, or None
+        self.key_requests = roku_keys.KeyRequests(self.host) if ip_address else None
+        self._idle = collections.deque()
+        self._slots = None
+        # same liveness tracking as RokuRemote; the probe runs on a timer thread
+        self.health = roku_health.DeviceHealth(
+            self.host, timeout, failure_threshold, adaptive_timeout, probe=self._probe,
+        ) if ip_address else None
+        if ip_address:
+            logger.info(f"Initialized AsyncRokuRemote with IP: {ip_address} and port: {port}")
+        else:
+            logger.info("Initialized AsyncRokuRemote without IP address")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        while self._idle:
+            self._idle.popleft().close()
+        if self.health is not None:
+            self.health.close()
+
+    def _probe(self):
+        roku_http.request_once(self.ip_address, self.port, "GET", "/", self.timeout)
+
+    def _checkout(self):
+        now = time.monotonic()
+        while self._idle:
+            conn = self._idle.pop()
+            if now - conn.last_used <= self.idle_timeout and not conn.reader.at_eof():
+                return conn
+            conn.close()
+        return None
+
+    async def _connect(self, timeout):
+        try:
+            return await asyncio.wait_for(_AsyncConnection.open(self.ip_address, self.port), timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise roku_http.ConnectFailed(f"Can't connect to {self.host}: {e!r}") from e
+
+    async def _request(self, method, path, phases=None, timeout=None, raw=None):
+        # phases, if given, is a dict that gets the seconds spent connecting.
+        # timeout=None reads the reply with the adaptive timeout, as in
+        # RokuRemote._request
+        health = self.health
+        if not health.allow():
+            raise health.unavailable()
+        if self._slots is None:
+            # created lazily so the semaphore binds to the running loop
+            self._slots = asyncio.Semaphore(self.pool_size)
+        async with self._slots:
+            read_timeout = health.timeout() if timeout is None else timeout
+            start = time.perf_counter()
+            connect = 0.0
+            try:
+                conn = self._checkout()
+                if conn is not None:
+                    try:
+                        await asyncio.wait_for(conn.send(method, self.host, path, raw), read_timeout)
+                    except ConnectionError as e:
+                        # the TV closed this warm socket while it sat idle and the
+                        # request couldn't be written; only then is it safe to
+                        # go again, since a keypress that went out may have landed
+                        logger.debug("Stale pooled connection to %s (%s), reconnecting", self.host, e)
+                        conn.close()
+                        conn = None
+                    except BaseException:
+                        conn.close()
+                        raise
+                if conn is None:
+                    connect_start = time.perf_counter()
+                    conn = await self._connect(health.connect_timeout())
+                    connect = time.perf_counter() - connect_start
+                    if phases is not None:
+                        phases["connect"] = connect
+                    try:
+                        await asyncio.wait_for(conn.send(method, self.host, path, raw), read_timeout)
+                    except BaseException:
+                        conn.close()
+                        raise
+                try:
+                    result = await asyncio.wait_for(conn.read_response(), read_timeout)
+                except BaseException:
+                    conn.close()
+                    raise
+            except asyncio.TimeoutError as e:
+                health.record_failure(e, "timeout")
+                raise
+            except (OSError, asyncio.IncompleteReadError, HTTPError) as e:
+                health.record_failure(e)
+                raise
+            self._release(conn)
+        health.record_success(time.perf_counter() - start if timeout is None else None, connect)
+        return result
+
+    def _release(self, conn):
+        if conn.reusable:
+            self._idle.append(conn)
+        else:
+            conn.close()
+
+    async def _pipeline(self, requests):
+        # writes every request (from key_requests) before reading any
+        # response. returns (acknowledged, complete) like RokuRemote._pipeline:
+        # complete is False only when the TV closed the connection after
+        # acknowledging part of the batch, so the rest were never processed
+        # and can be resent. the timeout applies to each reply, as the socket
+        # timeout does in HTTPPool.pipeline, so a long batch isn't cut off
+        # part way by a deadline meant for one request.
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.pool_size)
+        health = self.health
+        if not health.allow():
+            return 0, False
+        async with self._slots:
+            read_timeout = health.timeout()
+            metrics = self.metrics
+            started = time.time()
+            start = time.perf_counter()
+            conn = self._checkout()
+            reused = conn is not None
+            if conn is None:
+                try:
+                    conn = await self._connect(health.connect_timeout())
+                except OSError as e:
+                    health.record_failure(e)
+                    raise
+            connect = time.perf_counter() - start if not reused else 0.0
+            acknowledged = 0
+            responses = 0
+            complete = True
+            try:
+                try:
+                    conn.writer.write(b"".join(raw for _, _, raw in requests))
+                    await asyncio.wait_for(conn.writer.drain(), read_timeout)
+                except ConnectionError as e:
+                    if reused:
+                        # stale pooled socket and the batch couldn't be written;
+                        # the TV got none of it, so start over fresh
+                        logger.debug("Stale pooled connection to %s (%s), reconnecting", self.host, e)
+                        return 0, False
+                    raise
+                for key, path, _ in requests:
+                    status, _ = await asyncio.wait_for(conn.read_response(), read_timeout)
+                    responses += 1
+                    if metrics is not None:
+                        # each reply is timed from the start of the batch
+                        metrics.record(self.host, "keypress", key, started, time.perf_counter() - start,
+                                       connect, status)
+                    if status not in (200, 204):
+                        logger.error("Failed to send '%s' to %s. Status code: %s", path, self.host, status)
+                        break
+                    acknowledged += 1
+                    if not conn.reusable:
+                        complete = acknowledged == len(requests)
+                        break
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, HTTPError) as e:
+                health.record_failure(e, "timeout" if isinstance(e, asyncio.TimeoutError) else None)
+                if metrics is not None:
+                    metrics.record(self.host, "keypress", requests[acknowledged][0], started,
+                                   time.perf_counter() - start, connect, error=e)
+                # the batch is out: any of it may have reached the TV, so
+                # nothing is resent and the caller gets the count it confirmed
+                logger.warning("Pipelined send to %s failed after %d requests. Exception: %r", self.host, acknowledged, e)
+                return acknowledged, True
+            finally:
+                # a connection with replies still in flight can't be handed out again
+                if conn.reusable and responses == len(requests):
+                    self._release(conn)
+                else:
+                    conn.close()
+        # one sample for the whole batch would skew the round-trip estimate
+        health.record_success(None, connect)
+        return acknowledged, complete
+
+    async def send_commands(self, commands, pipeline=True):
+        # sends keys in order and returns how many the TV acknowledged. with
+        # pipeline set they share one connection and one round trip.
+        if not self.base_url:
+            logger.error("No IP address set for AsyncRokuRemote")
+            return 0
+        # every key is checked (raising roku_keys.UnknownKey) before any is sent
+        requests = [self.key_requests.get("keypress", command) for command in commands]
+        acknowledged = 0
+        if pipeline and len(requests) > 1 and self.health.available:
+            try:
+                acknowledged, complete = await self._pipeline(requests)
+            except OSError as e:
+                # couldn't connect, so nothing was sent
+                logger.warning("Failed to send commands to %s. Exception: %r", self.host, e)
+                return 0
+            if complete:
+                return acknowledged
+        for key, _, _ in requests[acknowledged:]:
+            if not await self.send_command(key):
+                break
+            acknowledged += 1
+        return acknowledged
+
+    async def type_text(self, text, pipeline=True):
+        return await self.send_commands([roku_keys.literal(char) for char in text], pipeline)
+
+    async def query(self, endpoint):
+        # same flat dict as RokuRemote.query
+        if not self.base_url:
+            raise ValueError("No IP address set for AsyncRokuRemote")
+        path = roku_state.ENDPOINTS[endpoint][0]
+        status, body = await self._request("GET", path, timeout=self.timeout)
+        if status != 200:
+            raise HTTPError(f"Query {path} failed with status {status}")
+        return roku_state.parse_chunks([body])
+
+    async def send_command(self, command):
+        return await self._send_key("keypress", command)
+
+    async def send(self, action, key):
+        # any ECP command, e.g. send("launch", "12"). keys are checked as in
+        # send_command; an app id goes out as given, so it must already be
+        # percent-encoded
+        return await self._send_key(action, key)
+
+    async def key_down(self, key):
+        return await self._send_key("keydown", key)
+
+    async def key_up(self, key):
+        return await self._send_key("keyup", key)
+
+    async def _send_key(self, action, command):
+        # hot path: log arguments are only formatted when the level is enabled
+        if not self.base_url:
+            logger.error("No IP address set for AsyncRokuRemote")
+            return False
+        if action == "launch":
+            path, raw = f"/launch/{command}", None
+        else:
+            # an unknown key raises roku_keys.UnknownKey here, before anything is sent
+            command, path, raw = self.key_requests.get(action, command)
+        metrics = self.metrics
+        phases = None
+        if metrics is not None:
+            phases = {"connect": 0.0}
+            started = time.time()
+            start = time.perf_counter()
+        status = error = None
+        try:
+            status, _ = await self._request("POST", path, phases, raw=raw)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, HTTPError) as e:
+            error = e
+            logger.warning("Failed to send command '%s' (%s) to %s. Exception: %r", command, action, self.host, e)
+        if metrics is not None:
+            metrics.record(self.host, action, command, started, time.perf_counter() - start,
+                           phases["connect"], status, error)
+        if status in (200, 204):
+            logger.info("Command '%s' (%s) sent successfully to %s.", command, action, self.host)
+            return True
+        if status is not None:
+            logger.error("Failed to send command '%s' (%s) to %s. Status code: %s", command, action, self.host, status)
+        return False
+
+
+roku_keys.add_key_methods(AsyncRokuRemote, coroutine=True)
+
+
+class DeviceResult:
+    def __init__(self, ip_address, ok, elapsed, error=None):
+        self.ip_address = ip_address
+        self.ok = ok
+        self.elapsed = elapsed
+        self.error = error
+
+    def __repr__(self):
+        return f"DeviceResult({self.ip_address!r}, ok={self.ok}, elapsed={self.elapsed:.3f})"
+
+
+class FleetReport:
+    def __init__(self, command, results, elapsed):
+        self.command = command
+        self.results = results
+        self.elapsed = elapsed
+
+    @property
+    def succeeded(self):
+        return [r.ip_address for r in self.results if r.ok]
+
+    @property
+    def failed(self):
+        return [r.ip_address for r in self.results if not r.ok]
+
+    def summary(self):
+        return (f"'{self.command}': {len(self.succeeded)}/{len(self.results)} devices ok "
+                f"in {self.elapsed:.3f}s")
+
+
+class RokuFleet:
+    # broadcasts a command to many TVs at once; accepts the IP list returned by
+    # RokuRemote.discover_roku_tvs
+    def __init__(self, ip_addresses, port=8060, timeout=2, concurrency=16, **remote_kwargs):
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.remotes = {
+            ip: AsyncRokuRemote(ip, port, timeout=timeout, **remote_kwargs)
+            for ip in dict.fromkeys(ip_addresses)
+        }
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await asyncio.gather(*(remote.aclose() for remote in self.remotes.values()))
+
+    @property
+    def available(self):
+        # TVs currently answering; the rest fail fast until their probe succeeds
+        return [ip for ip, remote in self.remotes.items() if remote.health.available]
+
+    def health(self):
+        return {ip: remote.health.snapshot() for ip, remote in self.remotes.items()}
+
+    async def broadcast(self, command, timeout=None):
+        # an unknown key raises roku_keys.UnknownKey before any TV is contacted
+        command = roku_keys.canonical(command)
+        timeout = self.timeout if timeout is None else timeout
+        limit = asyncio.Semaphore(self.concurrency)
+
+        async def send(ip, remote):
+            if not remote.health.available:
+                # breaker open: don't wait on a TV that isn't answering
+                return DeviceResult(ip, False, 0.0, "unavailable")
+            async with limit:
+                start = time.perf_counter()
+                try:
+                    ok = await asyncio.wait_for(remote.send_command(command), timeout)
+                    error = None if ok else "command failed"
+                except asyncio.TimeoutError:
+                    ok, error = False, "timed out"
+                return DeviceResult(ip, ok, time.perf_counter() - start, error)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(send(ip, remote) for ip, remote in self.remotes.items()))
+        report = FleetReport(command, results, time.perf_counter() - start)
+        logger.info(report.summary())
+        return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    from roku_metrics import CommandMetrics
+    from roku_remote import RokuRemote
+
+    parser = argparse.ArgumentParser(description="Broadcast an ECP command to several Roku TVs at once.")
+    parser.add_argument("command", type=str, help="ECP key to send, e.g. PowerOff")
+    parser.add_argument("--ip", type=str, nargs="*", default=[], help="IP addresses of the Roku TVs")
+    parser.add_argument("--discover", action="store_true", help="Add Roku TVs found via SSDP discovery")
+    parser.add_argument("--port", type=int, default=8060, help="Port of the Roku TVs (default: 8060)")
+    parser.add_argument("--timeout", type=float, default=2, help="Per-device timeout (default: 2 seconds)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Max devices contacted at once (default: 16)")
+    parser.add_argument("--metrics", action="store_true", help="Print per-device command latency as JSON at the end")
+    parser.add_argument("--enable-logging", action="store_true", help="Enable logging")
+    args = parser.parse_args()
+
+    if args.enable_logging:
+        logging.basicConfig(level=logging.INFO)
+    else:
+        logging.basicConfig(level=logging.CRITICAL)
+
+    try:
+        args.command = roku_keys.canonical(args.command)
+    except roku_keys.UnknownKey as e:
+        parser.error(str(e))
+
+    ips = list(args.ip)
+    if args.discover:
+        ips += RokuRemote.discover_roku_tvs()
+
+    metrics = CommandMetrics() if args.metrics else None
+
+    async def main():
+        async with RokuFleet(ips, args.port, args.timeout, args.concurrency, metrics=metrics) as fleet:
+            return await fleet.broadcast(args.command)
+
+    if ips:
+        report = asyncio.run(main())
+        print(report.summary())
+        for result in report.results:
+            if not result.ok:
+                print(f"  {result.ip_address}: {result.error}")
+        if metrics is not None:
+            print(json.dumps(metrics.snapshot(), indent=2))
+    else:
+        logger.error("No Roku TVs given. Use --ip or --discover.")
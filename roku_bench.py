@@ -0,0 +1,269 @@
+import argparse
+import asyncio
+import importlib.util
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from roku_async import AsyncRokuRemote
+from roku_fake import FakeRokuServer, FakeSSDPResponder
+from roku_remote import RokuRemote
+from roku_stats import latency_summary, percentile
+
+logger = logging.getLogger(__name__)
+
+# benchmarks RokuRemote against a local fake TV (roku_fake) or a real one and
+# prints the results as JSON. --baseline compares against an earlier run and
+# exits with status 1 when a metric got worse by more than --tolerance.
+
+TYPE_TEXT = "the quick brown fox jumps over the lazy dog 0123456789"
+
+# metric -> True when higher is better; everything else in the report is context
+METRICS = {
+    "send_command.p50_ms": False,
+    "send_command.p99_ms": False,
+    "throughput.sequential_per_s": True,
+    "throughput.pipelined_per_s": True,
+    "type_text.sequential_chars_per_s": True,
+    "type_text.pipelined_chars_per_s": True,
+    "discovery.first_device_ms": False,
+    "startup.import_roku_remote_ms": False,
+    "startup.first_command_ms": False,
+    "startup.gui_first_frame_ms": False,
+    "render.cached_frame_p50_us": False,
+    "render.cached_frame_p99_us": False,
+    "render.full_frame_p50_us": False,
+    "render.full_frame_p99_us": False,
+    "render.cached_dispatch_p99_us": False,
+}
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# child process that exits as soon as the GUI has shown its first frame
+GUI_FIRST_FRAME = """
+import os, sys
+import remote_gui, pygame
+flip = pygame.display.flip
+def first_flip():
+    flip()
+    os._exit(0)
+pygame.display.flip = first_flip
+remote_gui.RokuRemoteApp(sys.argv[1], int(sys.argv[2]))
+os._exit(1)
+"""
+
+
+def bench_send_command(remote, samples=500, key="Up", roku=None):
+    # one keypress at a time over the warm keep-alive pool. with roku, the
+    # fake TV's state, the keys it received are counted: more than were sent
+    # means some went out twice. (fewer than were acknowledged would be a
+    # fake that lost them, and lost replies put it in between.)
+    remote.send_command(key)
+    received = roku.counts.get("keypress", 0) if roku is not None else None
+    times = []
+    failures = 0
+    for _ in range(samples):
+        start = time.perf_counter()
+        ok = remote.send_command(key)
+        elapsed = (time.perf_counter() - start) * 1000
+        if ok:
+            times.append(elapsed)
+        else:
+            failures += 1
+    result = latency_summary(times, failures)
+    if roku is not None:
+        result["received"] = roku.counts.get("keypress", 0) - received
+        result["duplicates"] = max(0, result["received"] - samples)
+    return result
+
+
+def bench_throughput(remote, duration=2.0, batch=50, key="Up"):
+    # sustained keypresses per second: back to back with send_command, and in
+    # pipelined batches with AsyncRokuRemote
+    sent = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        sent += bool(remote.send_command(key))
+    sequential = sent / (time.perf_counter() - start)
+
+    async def pipelined():
+        acknowledged = 0
+        async with AsyncRokuRemote(remote.ip_address, remote.port, remote.timeout, failure_threshold=0) as client:
+            begin = time.perf_counter()
+            while time.perf_counter() - begin < duration:
+                acknowledged += await client.send_commands([key] * batch, pipeline=True)
+            return acknowledged / (time.perf_counter() - begin)
+
+    return {
+        "duration_s": duration,
+        "batch": batch,
+        "sequential_per_s": sequential,
+        "pipelined_per_s": asyncio.run(pipelined()),
+    }
+
+
+def bench_type_text(remote, text=TYPE_TEXT, rounds=5):
+    # the GUI's Type box sends its text through type_text
+    results = {"characters": len(text) * rounds}
+    for name, pipeline in (("sequential", False), ("pipelined", True)):
+        typed = 0
+        start = time.perf_counter()
+        for _ in range(rounds):
+            typed += remote.type_text(text, pacing=0, pipeline=pipeline)
+        results[f"{name}_chars_per_s"] = typed / (time.perf_counter() - start)
+    return results
+
+
+def bench_discovery(trials=5, timeout=2.0, **kwargs):
+    # time until discover_roku_tvs returns the first device
+    times = []
+    for _ in range(trials):
+        start = time.perf_counter()
+        found = RokuRemote.discover_roku_tvs(timeout, cache=False, max_devices=1, **kwargs)
+        if found:
+            times.append((time.perf_counter() - start) * 1000)
+    result = {"trials": trials, "found": len(times)}
+    if times:
+        result["first_device_ms"] = percentile(times, 50)
+        result["max_ms"] = max(times)
+    return result
+
+
+def _child_ms(code, runs, *args, env=None):
+    # median wall time of a fresh interpreter running code, in ms
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code, *map(str, args)], cwd=HERE, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+    return percentile(times, 50)
+
+
+def bench_startup(ip, port, runs=5):
+    # cold start in fresh interpreters: the interpreter alone, importing
+    # roku_remote, sending one key per transport, and the GUI's first frame
+    send = "import sys, roku_remote; roku_remote.RokuRemote(sys.argv[1], int(sys.argv[2]), transport=sys.argv[3]).send_command('Up')"
+    results = {"runs": runs, "interpreter_ms": _child_ms("pass", runs)}
+    results["import_roku_remote_ms"] = _child_ms("import roku_remote", runs) - results["interpreter_ms"]
+    results["first_command_ms"] = _child_ms(send, runs, ip, port, "http")
+    if importlib.util.find_spec("requests") is not None:
+        results["first_command_requests_ms"] = _child_ms(send, runs, ip, port, "requests")
+    if importlib.util.find_spec("pygame") is not None:
+        env = {**os.environ, "SDL_VIDEODRIVER": os.environ.get("SDL_VIDEODRIVER", "dummy"),
+               "SDL_AUDIODRIVER": "dummy", "PYGAME_HIDE_SUPPORT_PROMPT": "1"}
+        results["gui_first_frame_ms"] = _child_ms(GUI_FIRST_FRAME, runs, ip, port, env=env)
+    return results
+
+
+def run_benchmarks(ip=None, port=8060, samples=500, duration=2.0, latency=0.0, jitter=0.0, drop_rate=0.0,
+                   close_after=0, timeout=2.0, startup_runs=5, render_events=300, reply_loss_rate=0.0):
+    # without an ip, a fake TV (and SSDP responder) is started on loopback
+    server = responder = None
+    if ip is None:
+        server = FakeRokuServer(latency=latency, jitter=jitter, drop_rate=drop_rate, close_after=close_after,
+                                reply_loss_rate=reply_loss_rate).start()
+        responder = FakeSSDPResponder([server]).start()
+        ip, port = server.address
+    # no breaker: with faults injected it would turn drops into instant failures
+    remote = RokuRemote(ip, port, timeout, type_pacing=0.0, failure_threshold=0)
+    report = {
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "target": "fake" if server else f"{ip}:{port}",
+        "config": {"samples": samples, "duration_s": duration, "latency_s": latency, "jitter_s": jitter,
+                   "drop_rate": drop_rate, "reply_loss_rate": reply_loss_rate, "close_after": close_after, "timeout_s": timeout,
+                   "startup_runs": startup_runs, "render_events": render_events},
+    }
+    try:
+        report["send_command"] = bench_send_command(remote, samples, roku=server.roku if server else None)
+        report["throughput"] = bench_throughput(remote, duration)
+        report["type_text"] = bench_type_text(remote)
+        if responder is not None:
+            report["discovery"] = bench_discovery(
+                timeout=timeout, interfaces=["127.0.0.1"], ssdp_address=responder.address)
+        else:
+            report["discovery"] = bench_discovery(timeout=timeout)
+        if startup_runs:
+            report["startup"] = bench_startup(ip, port, startup_runs)
+        if render_events and importlib.util.find_spec("pygame") is not None:
+            # headless GUI frame times; roku_gui_bench.py has the full report
+            import roku_gui_bench
+            report["render"] = roku_gui_bench.run_benchmark(render_events, allocations=False)["summary"]
+    finally:
+        remote.close()
+        if responder is not None:
+            responder.stop()
+        if server is not None:
+            server.stop()
+    return report
+
+
+def metric(report, name):
+    section, _, key = name.partition(".")
+    return report.get(section, {}).get(key)
+
+
+def compare(report, baseline, tolerance=0.2):
+    # returns a list of (metric, baseline value, new value) that regressed
+    regressions = []
+    for name, higher_is_better in METRICS.items():
+        old, new = metric(baseline, name), metric(report, name)
+        # sub-millisecond (or under one per second) differences are noise
+        if old is None or new is None or old == 0 or abs(new - old) < 1.0:
+            continue
+        change = (old - new) / old if higher_is_better else (new - old) / old
+        if change > tolerance:
+            regressions.append((name, old, new))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Roku remote against a fake or real TV.")
+    parser.add_argument("--ip", type=str, help="Benchmark a real TV instead of the built-in fake")
+    parser.add_argument("--port", type=int, default=8060, help="Port of the real TV (default: 8060)")
+    parser.add_argument("--samples", type=int, default=500, help="send_command latency samples (default: 500)")
+    parser.add_argument("--duration", type=float, default=2.0, help="Seconds per throughput run (default: 2)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake TV: seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Fake TV: random +- seconds on top of --latency")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Fake TV: fraction of requests left unanswered")
+    parser.add_argument("--reply-loss-rate", type=float, default=0.0, help="Fake TV: fraction of requests acted on whose reply is lost")
+    parser.add_argument("--close-after", type=int, default=0, help="Fake TV: close connections after this many requests")
+    parser.add_argument("--timeout", type=float, default=2.0, help="Per-request timeout (default: 2 seconds)")
+    parser.add_argument("--startup-runs", type=int, default=5, help="Fresh interpreters per start-up measurement, 0 to skip (default: 5)")
+    parser.add_argument("--render-events", type=int, default=300,
+                        help="Scripted GUI input events for the headless render benchmark, 0 to skip (default: 300)")
+    parser.add_argument("--output", type=str, help="Write the JSON report to this file as well as stdout")
+    parser.add_argument("--baseline", type=str, help="Earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed fractional regression vs the baseline (default: 0.2)")
+    parser.add_argument("--enable-logging", action="store_true", help="Enable logging")
+    args = parser.parse_args()
+
+    if args.enable_logging:
+        logging.basicConfig(level=logging.INFO)
+    else:
+        logging.basicConfig(level=logging.CRITICAL)
+
+    report = run_benchmarks(args.ip, args.port, args.samples, args.duration, args.latency, args.jitter,
+                            args.drop_rate, args.close_after, args.timeout, args.startup_runs, args.render_events,
+                            args.reply_loss_rate)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+    if report["send_command"].get("duplicates"):
+        print(f"{report['send_command']['duplicates']} keypresses reached the fake TV twice", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for name, old, new in regressions:
+            print(f"Regression in {name}: {old:.3f} -> {new:.3f}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
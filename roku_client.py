@@ -0,0 +1,191 @@
+import os
+import socket
+import sys
+import threading
+
+import roku_keys
+
+# thin client for the roku_remote.py --daemon control socket. deliberately
+# imports nothing beyond the standard library basics and the roku_keys table
+# so a one-off command costs an interpreter start and one round trip on a
+# Unix socket.
+#
+# protocol: one request per line, "[@ip[:port]] VERB ARGS...". every reply is
+# a header line "ok N" or "err N" followed by N bytes of payload (text, JSON
+# or a raw ECP reply). a connection can carry any number of requests.
+#
+#   ping                 -> pong
+#   key KEY [KEY...]     keypresses in order -> how many the TV acknowledged
+#   down KEY / up KEY    hold / release a key
+#   type TEXT            the rest of the line, typed as Lit_ keypresses -> how
+#                        many were acknowledged ("err": typed N/M characters)
+#   query ENDPOINT       device-info, active-app or media-player as JSON
+#   launch APP_ID        start a channel, e.g. launch 12
+#   get PATH             raw body of an ECP GET, e.g. /query/device-info
+#   devices              devices the daemon holds warm connections to
+#   metrics              per-command latency metrics as JSON
+#   health               per-device breaker state and timeouts as JSON
+
+VERBS = ("ping", "key", "down", "up", "type", "launch", "query", "get", "devices", "metrics", "health")
+
+
+def default_socket_path():
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime:
+        return os.path.join(runtime, "simple-remote.sock")
+    return f"/tmp/simple-remote-{os.getuid()}.sock"
+
+
+class DaemonError(OSError):
+    # an "err" reply; an OSError so code that copes with a failed request to
+    # the TV copes with this too
+    pass
+
+
+class DaemonClient:
+    def __init__(self, path=None, timeout=5.0):
+        self.path = path or default_socket_path()
+        self.timeout = timeout
+        self._sock = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        self._sock = sock
+        self._file = sock.makefile("rb")
+        return self
+
+    def close(self):
+        if self._sock is not None:
+            self._file.close()
+            self._sock.close()
+            self._sock = self._file = None
+
+    def request(self, line, device=None):
+        # returns the payload bytes; raises DaemonError for an "err" reply and
+        # OSError if the daemon isn't reachable
+        if device:
+            line = f"@{device} {line}"
+        with self._lock:
+            if self._sock is None:
+                self.connect()
+            try:
+                self._sock.sendall(line.encode() + b"\n")
+                header = self._file.readline().split()
+                if len(header) != 2:
+                    raise ConnectionResetError("Daemon closed the connection")
+                payload = self._file.read(int(header[1]))
+            except OSError:
+                self.close()
+                raise
+        if header[0] != b"ok":
+            raise DaemonError(payload.decode(errors="replace"))
+        return payload
+
+
+class DaemonRemote:
+    # the parts of RokuRemote the GUI uses, sent through the daemon so the
+    # window shares its warm connections and cached state
+    def __init__(self, ip_address, port=8060, socket_path=None, timeout=5.0):
+        self.ip_address = ip_address
+        self.port = port
+        self.base_url = f"http://{ip_address}:{port}"
+        self.timeout = timeout
+        self.device = f"{ip_address}:{port}"
+        self.client = DaemonClient(socket_path, timeout)
+
+    def close(self):
+        self.client.close()
+
+    def _ok(self, line):
+        try:
+            return self.client.request(line, self.device)
+        except OSError:
+            return None
+
+    def send_command(self, command):
+        return self._ok(f"key {command}") == b"1"
+
+    def key_down(self, key):
+        return self._ok(f"down {key}") is not None
+
+    def key_up(self, key):
+        return self._ok(f"up {key}") is not None
+
+    def type_text(self, text, pacing=None, pipeline=False):
+        # a partial type is an "err" reply, "typed N/M characters"; N is what
+        # the TV acknowledged
+        try:
+            return int(self.client.request(f"type {text}", self.device))
+        except DaemonError as e:
+            words = str(e).split()
+            if len(words) > 1 and words[0] == "typed":
+                return int(words[1].partition("/")[0])
+            return 0
+        except OSError:
+            return 0
+
+    def iter_query(self, path, chunk_size=1024):
+        yield self.client.request(f"get {path}", self.device)
+
+    def query_apps(self):
+        import roku_state
+        return roku_state.parse_apps(self.iter_query("/query/apps"))
+
+    def query_icon(self, app_id):
+        import urllib.parse
+        return self.client.request(f"get /query/icon/{urllib.parse.quote(str(app_id), safe='')}", self.device)
+
+    def launch(self, app_id):
+        return self._ok(f"launch {app_id}") is not None
+
+
+# the same home(), power_off(), ... as RokuRemote; the daemon checks the keys
+roku_keys.add_key_methods(DaemonRemote)
+
+
+def main(argv):
+    # roku_client.py [--socket PATH] [--ip IP[:PORT]] VERB ARGS... ; a bare list
+    # of keys means "key": roku_client.py Home Down Select
+    path = device = None
+    while argv and argv[0] in ("--socket", "--ip"):
+        if len(argv) < 2:
+            print(f"{argv[0]} needs a value", file=sys.stderr)
+            return 2
+        if argv[0] == "--socket":
+            path = argv[1]
+        else:
+            device = argv[1]
+        argv = argv[2:]
+    if not argv:
+        print("usage: roku_client.py [--socket PATH] [--ip IP[:PORT]] VERB ARGS...", file=sys.stderr)
+        print(f"verbs: {', '.join(VERBS)}; or just a list of keys", file=sys.stderr)
+        return 2
+    if argv[0] not in VERBS:
+        argv = ["key", *argv]
+    client = DaemonClient(path)
+    try:
+        payload = client.request(" ".join(argv), device)
+    except DaemonError as e:
+        print(e, file=sys.stderr)
+        return 1
+    except OSError as e:
+        print(f"Can't reach the daemon at {client.path} ({e}). Start it with: python roku_remote.py --daemon",
+              file=sys.stderr)
+        return 2
+    finally:
+        client.close()
+    if payload:
+        sys.stdout.write(payload.decode(errors="replace") + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,194 @@
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+
+import roku_http
+import roku_keys
+import roku_state
+from roku_client import default_socket_path
+from roku_metrics import CommandMetrics
+from roku_remote import RokuRemote
+
+logger = logging.getLogger(__name__)
+
+# resident control daemon behind roku_remote.py --daemon. keeps one warm
+# RokuRemote and StateCache per TV and answers the line protocol described in
+# roku_client.py on a Unix socket, so scripts that shell out per keypress skip
+# interpreter start-up, module imports and a TCP connect to the TV.
+
+
+class _Device:
+    def __init__(self, remote):
+        self.remote = remote
+        self.state = roku_state.StateCache(remote)
+        # one request at a time per TV keeps keys from different clients in order
+        self.lock = threading.Lock()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        daemon = self.server.roku_daemon
+        for line in self.rfile:
+            line = line.rstrip(b"\r\n").decode(errors="replace")
+            if not line:
+                continue
+            try:
+                ok, payload = daemon.execute(line)
+            except roku_http.ERRORS as e:
+                ok, payload = False, f"{type(e).__name__}: {e}"
+            except Exception as e:
+                logger.exception(f"Daemon request '{line}' failed")
+                ok, payload = False, f"{type(e).__name__}: {e}"
+            if isinstance(payload, str):
+                payload = payload.encode()
+            self.wfile.write(b"%s %d\n%s" % (b"ok" if ok else b"err", len(payload), payload))
+            self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class RokuDaemon:
+    def __init__(self, ip_address=None, port=8060, socket_path=None, timeout=2, pool_size=4, idle_timeout=30,
+                 type_pacing=0.0, pipeline=True, transport="http", failure_threshold=3, adaptive_timeout=True,
+                 recorder=None):
+        self.default_device = f"{ip_address}:{port}" if ip_address else None
+        self.port = port
+        self.socket_path = socket_path or default_socket_path()
+        self.remote_kwargs = {"timeout": timeout, "pool_size": pool_size, "idle_timeout": idle_timeout,
+                              "type_pacing": type_pacing, "transport": transport,
+                              "failure_threshold": failure_threshold, "adaptive_timeout": adaptive_timeout,
+                              "recorder": recorder}
+        self.pipeline = pipeline
+        self.metrics = CommandMetrics()
+        self._devices = {}  # "ip:port" -> _Device
+        self._lock = threading.Lock()
+        self._server = None
+
+    def device(self, name):
+        if ":" not in name:
+            name = f"{name}:{self.port}"
+        with self._lock:
+            device = self._devices.get(name)
+            if device is None:
+                ip, _, port = name.rpartition(":")
+                remote = RokuRemote(ip, int(port), metrics=self.metrics, **self.remote_kwargs)
+                device = self._devices[name] = _Device(remote)
+            return device
+
+    def execute(self, line):
+        # returns (ok, payload)
+        target = None
+        if line.startswith("@"):
+            target, _, line = line[1:].partition(" ")
+        verb, _, rest = line.partition(" ")
+        if verb == "ping":
+            return True, "pong"
+        if verb == "devices":
+            with self._lock:
+                return True, json.dumps(list(self._devices))
+        if verb == "metrics":
+            return True, json.dumps(self.metrics.snapshot())
+        if verb == "health":
+            with self._lock:
+                devices = list(self._devices.items())
+            return True, json.dumps({name: device.remote.health.snapshot() for name, device in devices})
+        target = target or self.default_device
+        if not target:
+            return False, "no device: start the daemon with --ip or prefix the request with @IP"
+        device = self.device(target)
+        remote = device.remote
+        with device.lock:
+            if verb == "key":
+                try:
+                    keys = [roku_keys.canonical(key) for key in rest.split()]
+                except roku_keys.UnknownKey as e:
+                    return False, str(e)
+                if not keys:
+                    return False, "key needs at least one key name"
+                sent = 0
+                for key in keys:
+                    if not remote.send_command(key):
+                        break
+                    sent += 1
+                device.state.invalidate()
+                if sent < len(keys):
+                    return False, f"sent {sent}/{len(keys)} keys, '{keys[sent]}' failed"
+                return True, str(sent)
+            if verb in ("down", "up"):
+                if not rest:
+                    return False, f"{verb} needs a key name"
+                try:
+                    rest = roku_keys.canonical(rest)
+                except roku_keys.UnknownKey as e:
+                    return False, str(e)
+                ok = remote.key_down(rest) if verb == "down" else remote.key_up(rest)
+                return ok, "" if ok else f"{verb} {rest} failed"
+            if verb == "type":
+                typed = remote.type_text(rest, pipeline=self.pipeline)
+                if typed < len(rest):
+                    return False, f"typed {typed}/{len(rest)} characters"
+                return True, str(typed)
+            if verb == "launch":
+                if not rest:
+                    return False, "launch needs an app id"
+                ok = remote.launch(rest)
+                device.state.invalidate()
+                return ok, "" if ok else f"launch {rest} failed"
+            if verb == "query":
+                if rest not in roku_state.ENDPOINTS:
+                    return False, f"unknown query '{rest}'; one of {', '.join(roku_state.ENDPOINTS)}"
+                if device.state.is_stale(rest):
+                    device.state.refresh(rest)
+                return True, json.dumps(device.state.get(rest))
+            if verb == "get":
+                return True, b"".join(remote.iter_query(rest))
+        return False, f"unknown request '{verb}'"
+
+    def _claim_socket(self):
+        # a socket file left by a daemon that died is removed; a live one is an error
+        if not os.path.exists(self.socket_path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except OSError:
+            os.unlink(self.socket_path)
+        else:
+            raise OSError(f"A daemon is already listening on {self.socket_path}")
+        finally:
+            probe.close()
+
+    def start(self):
+        self._claim_socket()
+        umask = os.umask(0o177)  # socket readable and writable by this user only
+        try:
+            self._server = _Server(self.socket_path, _Handler)
+        finally:
+            os.umask(umask)
+        self._server.roku_daemon = self
+        logger.info(f"Daemon listening on {self.socket_path}")
+        return self
+
+    def serve_forever(self):
+        try:
+            self._server.serve_forever()
+        finally:
+            self.close()
+
+    def shutdown(self):
+        self._server.shutdown()
+
+    def close(self):
+        self._server.server_close()
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            for device in self._devices.values():
+                device.remote.close()
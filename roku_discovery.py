@@ -0,0 +1,353 @@
+import asyncio
+import ipaddress
+import json
+import logging
+import os
+import selectors
+import socket
+import threading
+import time
+import urllib.parse
+import xml.etree.ElementTree as ET
+
+logger = logging.getLogger(__name__)
+
+SSDP_ADDRESS = ("239.255.255.250", 1900)
+SEARCH_TARGET = "roku:ecp"
+DEFAULT_CACHE_PATH = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "simple-remote", "devices.json",
+)
+
+
+class RokuDevice:
+    def __init__(self, ip, port=8060, usn=None, location=None, seen=None):
+        self.ip = ip
+        self.port = port
+        # unique service name, e.g. "uuid:roku:ecp:X00000000000"; falls back to the
+        # address when a device didn't give one
+        self.usn = usn or f"{ip}:{port}"
+        self.location = location or f"http://{ip}:{port}/"
+        self.seen = time.time() if seen is None else seen
+
+    @property
+    def serial(self):
+        return self.usn.rsplit(":", 1)[-1]
+
+    def to_dict(self):
+        return {"ip": self.ip, "port": self.port, "usn": self.usn, "location": self.location, "seen": self.seen}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["ip"], data.get("port", 8060), data.get("usn"), data.get("location"), data.get("seen"))
+
+    def __repr__(self):
+        return f"RokuDevice({self.ip!r}, {self.port}, usn={self.usn!r})"
+
+
+def parse_ssdp_response(data, addr):
+    # returns a RokuDevice for an ECP answer, or None for anything else
+    text = data.decode("utf-8", errors="replace")
+    headers = {}
+    for line in text.split("\r\n")[1:]:
+        name, sep, value = line.partition(":")
+        if sep:
+            headers[name.strip().upper()] = value.strip()
+    if SEARCH_TARGET not in headers.get("ST", "") and SEARCH_TARGET not in headers.get("USN", ""):
+        return None
+    location = headers.get("LOCATION")
+    if not location:
+        return None
+    parsed = urllib.parse.urlsplit(location)
+    return RokuDevice(parsed.hostname or addr[0], parsed.port or 8060, headers.get("USN"), location)
+
+
+def local_ipv4_addresses():
+    addresses = set()
+    try:
+        for info in socket.getaddrinfo(socket.gethostname(), None, socket.AF_INET):
+            addresses.add(info[4][0])
+    except socket.gaierror:
+        pass
+    # the address the OS would route multicast from, which getaddrinfo may miss
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect(SSDP_ADDRESS)
+            addresses.add(sock.getsockname()[0])
+    except OSError:
+        pass
+    return sorted(a for a in addresses if not a.startswith("127.") and a != "0.0.0.0")
+
+
+def _search_request(mx):
+    return (
+        "M-SEARCH * HTTP/1.1\r\n"
+        f"HOST: {SSDP_ADDRESS[0]}:{SSDP_ADDRESS[1]}\r\n"
+        "MAN: \"ssdp:discover\"\r\n"
+        f"MX: {mx}\r\n"
+        f"ST: {SEARCH_TARGET}\r\n"
+        "\r\n"
+    ).encode()
+
+
+def _open_search_sockets(interfaces):
+    sockets = []
+    for address in interfaces:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        try:
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+            if address:
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(address))
+            sock.bind((address, 0))
+            sock.setblocking(False)
+        except OSError as e:
+            logger.warning(f"Can't search from interface {address or 'default'}. Exception: {e}")
+            sock.close()
+            continue
+        sockets.append(sock)
+    return sockets
+
+
+def iter_discover(timeout=2.0, retries=2, interval=0.25, interfaces=None, mx=1, ssdp_address=SSDP_ADDRESS):
+    # yields each Roku TV as soon as it answers, once per USN. M-SEARCH goes out
+    # from every local interface and is repeated `retries` times since UDP can
+    # drop it; stop iterating early to return before the timeout.
+    if interfaces is None:
+        interfaces = local_ipv4_addresses() or [""]
+    sockets = _open_search_sockets(interfaces)
+    if not sockets:
+        return
+    request = _search_request(mx)
+    selector = selectors.DefaultSelector()
+    for sock in sockets:
+        selector.register(sock, selectors.EVENT_READ)
+
+    seen = set()
+    now = time.monotonic()
+    deadline = now + timeout
+    next_send = now
+    sends_left = retries + 1
+    try:
+        while now < deadline:
+            if sends_left and now >= next_send:
+                for sock in sockets:
+                    try:
+                        sock.sendto(request, ssdp_address)
+                    except OSError as e:
+                        logger.warning(f"Failed to send SSDP request from {sock.getsockname()[0]}. Exception: {e}")
+                sends_left -= 1
+                next_send = now + interval
+            wake = min(deadline, next_send) if sends_left else deadline
+            for key, _ in selector.select(max(0.0, wake - now)):
+                try:
+                    data, addr = key.fileobj.recvfrom(2048)
+                except OSError:
+                    continue
+                device = parse_ssdp_response(data, addr)
+                if device is not None and device.usn not in seen:
+                    seen.add(device.usn)
+                    logger.info(f"Found Roku TV at IP: {device.ip}")
+                    yield device
+            now = time.monotonic()
+    finally:
+        selector.close()
+        for sock in sockets:
+            sock.close()
+    logger.info("Discovery completed.")
+
+
+def discover_devices(timeout=2.0, max_devices=None, cache=None, **kwargs):
+    # collects iter_discover results, returning early once max_devices answered
+    devices = []
+    search = iter_discover(timeout, **kwargs)
+    try:
+        for device in search:
+            devices.append(device)
+            if max_devices is not None and len(devices) >= max_devices:
+                break
+    finally:
+        search.close()
+    if cache is not None and devices:
+        cache.update(devices)
+    return devices
+
+
+def merge_devices(*device_lists):
+    # one entry per USN, later lists winning, in first-seen order
+    merged = {}
+    for devices in device_lists:
+        for device in devices:
+            merged[device.usn] = device
+    return list(merged.values())
+
+
+def local_subnets(prefix=24):
+    # the /prefix networks around each local interface, for scan_subnet
+    return [str(ipaddress.ip_network(f"{a}/{prefix}", strict=False)) for a in local_ipv4_addresses()]
+
+
+def _parse_device_info(ip, port, response):
+    # HTTP/1.0 response to /query/device-info -> RokuDevice, or None if it isn't one
+    _, _, body = response.partition(b"\r\n\r\n")
+    try:
+        root = ET.fromstring(body)
+    except ET.ParseError:
+        return None
+    if root.tag != "device-info":
+        return None
+    serial = root.findtext("serial-number")
+    usn = f"uuid:roku:ecp:{serial}" if serial else None
+    return RokuDevice(ip, port, usn)
+
+
+def _raise_fd_limit(wanted):
+    # every in-flight connect holds a socket; returns how many we can afford and
+    # the limits to hand back to _restore_fd_limit (None if nothing was changed)
+    try:
+        import resource
+    except ImportError:
+        return wanted, None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = wanted + 64 if hard == resource.RLIM_INFINITY else min(hard, wanted + 64)
+    previous = None
+    if soft < target:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+            previous = (soft, hard)
+            soft = target
+        except (ValueError, OSError):
+            pass
+    return max(1, min(wanted, soft - 64)), previous
+
+
+def _restore_fd_limit(previous):
+    # the limit is process-wide, so a scan puts back what it found
+    if previous is None:
+        return
+    import resource
+    try:
+        resource.setrlimit(resource.RLIMIT_NOFILE, previous)
+    except (ValueError, OSError) as e:
+        logger.warning(f"Failed to restore the open file limit to {previous[0]}. Exception: {e}")
+
+
+async def _probe(ip, port, connect_timeout, confirm_timeout):
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), connect_timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    try:
+        # HTTP/1.0 so the reply is never chunked and the TV closes when done
+        writer.write(f"GET /query/device-info HTTP/1.0\r\nHost: {ip}:{port}\r\n\r\n".encode())
+        response = await asyncio.wait_for(reader.read(), confirm_timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    finally:
+        writer.close()
+        # let the transport finish closing so thousands of probes don't pile up
+        # half-closed sockets
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+    return _parse_device_info(ip, port, response)
+
+
+async def scan_subnet_async(cidrs, port=8060, connect_timeout=0.5, confirm_timeout=2.0, concurrency=2048):
+    if isinstance(cidrs, str):
+        cidrs = [cidrs]
+    hosts = [str(ip) for cidr in cidrs for ip in ipaddress.ip_network(cidr, strict=False).hosts()]
+    affordable, previous = _raise_fd_limit(concurrency)
+    limit = asyncio.Semaphore(affordable)
+
+    async def probe(ip):
+        async with limit:
+            return await _probe(ip, port, connect_timeout, confirm_timeout)
+
+    try:
+        results = await asyncio.gather(*(probe(ip) for ip in hosts))
+    finally:
+        _restore_fd_limit(previous)
+    devices = merge_devices([device for device in results if device is not None])
+    for device in devices:
+        logger.info(f"Found Roku TV at IP: {device.ip} (subnet scan)")
+    return devices
+
+
+def scan_subnet(cidrs, port=8060, connect_timeout=0.5, confirm_timeout=2.0, concurrency=2048, cache=None):
+    # unicast fallback for networks that filter SSDP multicast: connects to the
+    # ECP port on every host in the given CIDR(s) at once and keeps the ones that
+    # answer /query/device-info. returns RokuDevices like discover_devices.
+    logger.info(f"Scanning {cidrs} for Roku TVs on port {port}...")
+    devices = asyncio.run(scan_subnet_async(cidrs, port, connect_timeout, confirm_timeout, concurrency))
+    if cache is not None and devices:
+        cache.update(devices)
+    return devices
+
+
+class DeviceCache:
+    # devices seen recently, kept on disk so the GUI and CLI can connect to a
+    # known TV at startup without waiting on discovery
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return [RokuDevice.from_dict(d) for d in json.load(f)]
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable device cache {self.path}. Exception: {e}")
+            return []
+
+    def load(self):
+        # fresh devices, most recently seen first
+        cutoff = time.time() - self.ttl
+        devices = [d for d in self._read() if d.seen >= cutoff]
+        return sorted(devices, key=lambda d: d.seen, reverse=True)
+
+    def update(self, devices):
+        with self._lock:
+            merged = {d.usn: d for d in self.load()}
+            merged.update((d.usn, d) for d in devices)
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump([d.to_dict() for d in merged.values()], f)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.warning(f"Failed to write device cache {self.path}. Exception: {e}")
+
+
+def refresh_in_background(cache, on_update=None, **kwargs):
+    # re-runs discovery on a daemon thread, updating the cache and calling
+    # on_update(devices) when it's done
+    def refresh():
+        devices = discover_devices(cache=cache, **kwargs)
+        if on_update is not None:
+            on_update(devices)
+
+    thread = threading.Thread(target=refresh, name="roku-discovery", daemon=True)
+    thread.start()
+    return thread
+
+
+def pick_device(cache=None, timeout=2.0, scan=True):
+    # the most recently seen cached device, refreshed in the background, or
+    # else the first device to answer a live search. when multicast finds
+    # nothing and scan is set, the local /24 subnets are swept instead.
+    cache = cache or DeviceCache()
+    devices = cache.load()
+    if devices:
+        refresh_in_background(cache, timeout=timeout)
+        return devices[0]
+    found = discover_devices(timeout, max_devices=1, cache=cache)
+    if not found and scan:
+        subnets = local_subnets()
+        if subnets:
+            found = scan_subnet(subnets, cache=cache)
+    return found[0] if found else None
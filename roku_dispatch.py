@@ -0,0 +1,318 @@
+import collections
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# keys where a burst of repeats can be folded into the one already queued
+COALESCE_KEYS = frozenset({"VolumeUp", "VolumeDown", "ChannelUp", "ChannelDown"})
+# navigation keys that are worthless once the user has pressed a newer one
+DROPPABLE_KEYS = frozenset({"Up", "Down", "Left", "Right"})
+
+# keys worth auto-repeating while held in KeyHolder's "repeat" mode
+REPEAT_KEYS = frozenset({
+    "Up", "Down", "Left", "Right", "VolumeUp", "VolumeDown",
+    "ChannelUp", "ChannelDown", "Rev", "Fwd", "Backspace",
+})
+
+# completion statuses handed to on_complete
+SENT = "sent"
+FAILED = "failed"
+COALESCED = "coalesced"
+DROPPED = "dropped"
+REJECTED = "rejected"
+
+
+class Command:
+    def __init__(self, device, key, fn, args):
+        self.device = device
+        self.key = key
+        self.fn = fn
+        self.args = args
+        self.coalesced = 0
+
+    def __repr__(self):
+        return f"Command({self.device!r}, {self.key!r})"
+
+
+class BackpressurePolicy:
+    def __init__(self, threshold=4, coalesce_keys=COALESCE_KEYS, droppable_keys=DROPPABLE_KEYS):
+        self.threshold = threshold
+        self.coalesce_keys = frozenset(coalesce_keys)
+        self.droppable_keys = frozenset(droppable_keys)
+
+    def apply(self, pending, command):
+        # returns (accept, removed): whether command still needs queueing, and
+        # any queued commands that were discarded to make room for it. a
+        # coalesced repeat rides along on the queued command and is replayed
+        # with it, so it takes no extra queue slot but no press is lost.
+        if len(pending) < self.threshold:
+            return True, []
+        if command.key in self.coalesce_keys and pending and pending[-1].key == command.key:
+            pending[-1].coalesced += 1
+            return False, []
+        removed = []
+        if command.key in self.droppable_keys:
+            kept = collections.deque()
+            for queued in pending:
+                (removed if queued.key in self.droppable_keys else kept).append(queued)
+            pending.clear()
+            pending.extend(kept)
+        return True, removed
+
+
+class _DeviceWorker:
+    def __init__(self, dispatcher, device):
+        self.dispatcher = dispatcher
+        self.device = device
+        self.pending = collections.deque()
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.on_drained = None
+        self.thread = threading.Thread(target=self._run, name=f"roku-dispatch-{device}", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.stopped:
+                    self.condition.wait()
+                if self.stopped and not self.pending:
+                    break
+                command = self.pending.popleft()
+            self.dispatcher._execute(command)
+        if self.on_drained is not None:
+            try:
+                self.on_drained()
+            except Exception:
+                logger.exception(f"Retiring the dispatch worker for {self.device} raised")
+
+
+class CommandDispatcher:
+    # runs RokuRemote calls off the caller's thread. each device gets its own
+    # worker and FIFO, so commands to one TV stay in order while a slow TV
+    # can't hold up another.
+    def __init__(self, max_pending=32, policy=None, on_complete=None):
+        self.max_pending = max_pending
+        self.policy = policy or BackpressurePolicy()
+        self.on_complete = on_complete
+        self._workers = {}
+        self._lock = threading.Lock()
+
+    def submit(self, device, key, fn, *args, force=False):
+        # force skips backpressure and the queue cap, for commands that must
+        # not be lost such as releasing a held key
+        command = Command(device, key, fn, args)
+        worker = self._worker(device)
+        with worker.condition:
+            if force:
+                accept, removed = True, []
+            else:
+                accept, removed = self.policy.apply(worker.pending, command)
+            rejected = accept and not force and len(worker.pending) >= self.max_pending
+            if accept and not rejected:
+                worker.pending.append(command)
+                worker.condition.notify()
+        for dropped in removed:
+            self._complete(dropped, DROPPED)
+        if rejected:
+            logger.warning(f"Dispatch queue for {device} is full, rejecting '{key}'")
+            self._complete(command, REJECTED)
+            return False
+        if not accept:
+            self._complete(command, COALESCED)
+        return True
+
+    def pending(self, device=None):
+        with self._lock:
+            if device is None:
+                workers = list(self._workers.values())
+            else:
+                workers = [self._workers[device]] if device in self._workers else []
+        return sum(len(worker.pending) for worker in workers)
+
+    def stop(self, timeout=None):
+        with self._lock:
+            workers = list(self._workers.values())
+            self._workers.clear()
+        for worker in workers:
+            with worker.condition:
+                worker.stopped = True
+                worker.condition.notify()
+        for worker in workers:
+            worker.thread.join(timeout)
+
+    def remove(self, device, on_drained=None):
+        # retires a device's worker once its queue drains, for devices that
+        # won't be used again. a later submit() starts a fresh one.
+        # on_drained() then runs on the worker's thread after its last
+        # command, or right away if the device has no worker, e.g. to close
+        # the remote the commands were using.
+        with self._lock:
+            worker = self._workers.pop(device, None)
+        if worker is None:
+            if on_drained is not None:
+                on_drained()
+            return
+        with worker.condition:
+            worker.on_drained = on_drained
+            worker.stopped = True
+            worker.condition.notify()
+
+    def _worker(self, device):
+        with self._lock:
+            worker = self._workers.get(device)
+            if worker is None:
+                worker = self._workers[device] = _DeviceWorker(self, device)
+            return worker
+
+    def _execute(self, command):
+        # a coalesced command still owes the TV one press per request it absorbed
+        for _ in range(1 + command.coalesced):
+            try:
+                result = command.fn(*command.args)
+            except Exception as e:
+                logger.exception(f"Command '{command.key}' for {command.device} raised")
+                self._complete(command, FAILED, e)
+                return
+            # RokuRemote methods return False on delivery failure, None for local actions
+            if result is False:
+                self._complete(command, FAILED)
+                return
+        self._complete(command, SENT)
+
+    def _complete(self, command, status, error=None):
+        if self.on_complete is None:
+            return
+        try:
+            self.on_complete(command, status, error)
+        except Exception:
+            logger.exception("Command completion callback raised")
+
+
+class _Held:
+    def __init__(self, remote, key, now, next_repeat):
+        self.remote = remote
+        self.key = key
+        self.started = now
+        self.next_repeat = next_repeat
+        self.down = False  # keydown mode: whether /keydown went out
+
+
+class KeyHolder:
+    # press-and-hold on top of a CommandDispatcher. modes:
+    #   "press"    a press is a single /keypress, holding does nothing
+    #   "keydown"  a click is a single /keypress sent on release; a press held
+    #              past repeat_delay sends /keydown then, and /keyup on release
+    #   "repeat"   /keypress when pressed, then re-sent while held (REPEAT_KEYS
+    #              only) after repeat_delay, no faster than max_rate per device
+    # a watchdog thread releases anything held longer than max_hold, and callers
+    # should release_all() on focus loss, quit and errors so no key stays down.
+    def __init__(self, dispatcher, mode="keydown", repeat_delay=0.4, max_rate=8.0, max_hold=30.0,
+                 repeat_keys=REPEAT_KEYS):
+        if mode not in ("press", "keydown", "repeat"):
+            raise ValueError(f"Unknown hold mode '{mode}'")
+        self.dispatcher = dispatcher
+        self.mode = mode
+        self.repeat_delay = repeat_delay
+        self.max_rate = max_rate
+        self.max_hold = max_hold
+        self.repeat_keys = frozenset(repeat_keys)
+        self._held = {}  # (device, key) -> _Held
+        self._last_sent = {}  # device -> time of the last auto-repeat
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="roku-key-holder", daemon=True)
+        self._thread.start()
+
+    # press() and release() return whether they queued a command
+    def press(self, device, remote, key):
+        if self.mode == "press":
+            self.dispatcher.submit(device, key, remote.send_command, key)
+            return True
+        with self._condition:
+            if (device, key) in self._held:
+                return False
+            now = time.monotonic()
+            self._held[(device, key)] = _Held(remote, key, now, now + self.repeat_delay)
+            self._condition.notify()
+        if self.mode != "repeat":
+            return False
+        self.dispatcher.submit(device, key, remote.send_command, key)
+        return True
+
+    def release(self, device, key):
+        with self._condition:
+            held = self._held.pop((device, key), None)
+            down = held is not None and held.down
+        if held is None or self.mode != "keydown":
+            return False
+        if down:
+            self._send_key_up(device, held)
+        else:
+            # a click: one queue entry, so backpressure can fold or drop it
+            self.dispatcher.submit(device, key, held.remote.send_command, key)
+        return True
+
+    def release_all(self):
+        # keys not yet down on the TV are abandoned rather than clicked
+        with self._condition:
+            held = list(self._held.items())
+            self._held.clear()
+        for (device, _), entry in held:
+            if entry.down:
+                self._send_key_up(device, entry)
+        return len(held)
+
+    def held(self):
+        with self._condition:
+            return list(self._held)
+
+    def stop(self):
+        self.release_all()
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _send_key_up(self, device, held):
+        # forced past backpressure and retried so a flaky network can't leave the key down
+        def key_up():
+            return any(held.remote.key_up(held.key) for _ in range(3))
+        self.dispatcher.submit(device, f"{held.key} (up)", key_up, force=True)
+
+    def _run(self):
+        with self._condition:
+            while not self._stopped:
+                now = time.monotonic()
+                wake = None
+                for (device, key), held in list(self._held.items()):
+                    expires = held.started + self.max_hold
+                    if now >= expires:
+                        logger.warning(f"Releasing '{key}' on {device}: held longer than {self.max_hold}s")
+                        del self._held[(device, key)]
+                        if held.down:
+                            self._send_key_up(device, held)
+                        continue
+                    wake = expires if wake is None else min(wake, expires)
+                    if self.mode == "keydown":
+                        if held.down:
+                            continue
+                        if now >= held.next_repeat:
+                            # held past a click: hold it on the TV too
+                            self.dispatcher.submit(device, key, held.remote.key_down, key)
+                            held.down = True
+                            continue
+                        wake = min(wake, held.next_repeat)
+                        continue
+                    if self.mode != "repeat" or key not in self.repeat_keys:
+                        continue
+                    if now >= held.next_repeat:
+                        # skip a beat rather than queue repeats behind a slow TV
+                        if not self.dispatcher.pending(device):
+                            self.dispatcher.submit(device, key, held.remote.send_command, key)
+                            self._last_sent[device] = now
+                        held.next_repeat = max(now, self._last_sent.get(device, now)) + 1 / self.max_rate
+                    wake = min(wake, held.next_repeat)
+                self._condition.wait(None if wake is None else max(0.0, wake - time.monotonic()))
@@ -0,0 +1,338 @@
+import argparse
+import collections
+import http.server
+import logging
+import random
+import socket
+import struct
+import threading
+import time
+import urllib.parse
+import zlib
+from xml.sax.saxutils import escape
+
+from roku_discovery import SEARCH_TARGET
+
+logger = logging.getLogger(__name__)
+
+# a stand-in Roku TV for benchmarks and for trying the GUI without one: answers
+# ECP keypress/keydown/keyup, launch and the /query endpoints (icons included)
+# over HTTP/1.1 keep-alive
+# (pipelining included), and SSDP M-SEARCH on loopback. faults are injectable:
+#   latency, jitter   seconds added before every response (latency +- jitter)
+#   drop_rate         fraction of requests lost on the way: the TV never acts on
+#                     them and the connection is closed unanswered
+#   reply_loss_rate   fraction of replies lost: the TV acts on the request, then
+#                     the connection is closed unanswered. a client that resends
+#                     these presses the key twice
+#   close_after       send "Connection: close" after this many requests on a connection
+
+APPS = {
+    "tvinput.dtv": ("Antenna TV", "tvin"),
+    "tvinput.hdmi1": ("HDMI 1", "tvin"),
+    "tvinput.hdmi2": ("HDMI 2", "tvin"),
+    "tvinput.hdmi3": ("HDMI 3", "tvin"),
+    "tvinput.hdmi4": ("HDMI 4", "tvin"),
+    "tvinput.cvbs": ("AV", "tvin"),
+    "12": ("Netflix", "appl"),
+    "837": ("YouTube", "appl"),
+}
+
+# keys that change what the fake reports from /query
+INPUT_KEYS = {
+    "InputTuner": "tvinput.dtv",
+    "InputHDMI1": "tvinput.hdmi1",
+    "InputHDMI2": "tvinput.hdmi2",
+    "InputHDMI3": "tvinput.hdmi3",
+    "InputHDMI4": "tvinput.hdmi4",
+    "InputAV1": "tvinput.cvbs",
+}
+
+
+class FakeRoku:
+    # the TV's state; shared by every connection to one FakeRokuServer
+    def __init__(self, serial="X00000000000", name="Fake Roku TV"):
+        self.serial = serial
+        self.name = name
+        self.power_mode = "PowerOn"
+        self.app_id = None  # None is the home screen
+        self.held = set()
+        self.counts = {}  # ECP action ("keypress", "query", ...) -> requests handled
+        self.keys = collections.deque(maxlen=10000)  # most recent keys received, in order
+        self._lock = threading.Lock()
+
+    def key(self, action, key):
+        with self._lock:
+            self.counts[action] = self.counts.get(action, 0) + 1
+            if action == "keydown":
+                self.held.add(key)
+            elif action == "keyup":
+                self.held.discard(key)
+            self.keys.append(key)
+            if action == "keyup":
+                return
+            lowered = key.lower()
+            if lowered == "poweroff":
+                self.power_mode = "PowerOff"
+            elif lowered == "poweron":
+                self.power_mode = "PowerOn"
+            elif lowered == "power":
+                self.power_mode = "PowerOff" if self.power_mode == "PowerOn" else "PowerOn"
+            elif key == "Home":
+                self.app_id = None
+            elif key in INPUT_KEYS:
+                self.app_id = INPUT_KEYS[key]
+
+    def query(self, endpoint):
+        with self._lock:
+            self.counts["query"] = self.counts.get("query", 0) + 1
+            if endpoint == "device-info":
+                return (
+                    '<?xml version="1.0" encoding="UTF-8" ?>\n<device-info>'
+                    f"<serial-number>{self.serial}</serial-number>"
+                    f"<user-device-name>{escape(self.name)}</user-device-name>"
+                    "<model-name>Fake</model-name>"
+                    f"<power-mode>{self.power_mode}</power-mode>"
+                    "</device-info>"
+                )
+            if endpoint == "active-app":
+                if self.app_id is None:
+                    app = "<app>Roku</app>"
+                else:
+                    name, kind = APPS[self.app_id]
+                    app = f'<app id="{self.app_id}" type="{kind}" version="1.0">{escape(name)}</app>'
+                return f'<?xml version="1.0" encoding="UTF-8" ?>\n<active-app>{app}</active-app>'
+            if endpoint == "media-player":
+                state = "play" if self.app_id in APPS and APPS[self.app_id][1] == "appl" else "close"
+                return f'<?xml version="1.0" encoding="UTF-8" ?>\n<player error="false" state="{state}"/>'
+            if endpoint == "apps":
+                apps = "".join(
+                    f'<app id="{app_id}" type="{kind}" version="1.0">{escape(name)}</app>'
+                    for app_id, (name, kind) in APPS.items()
+                )
+                return f'<?xml version="1.0" encoding="UTF-8" ?>\n<apps>{apps}</apps>'
+        return None
+
+    def launch(self, app_id):
+        with self._lock:
+            self.counts["launch"] = self.counts.get("launch", 0) + 1
+            if app_id not in APPS:
+                return False
+            self.app_id = app_id
+            return True
+
+    def icon(self, app_id):
+        with self._lock:
+            self.counts["icon"] = self.counts.get("icon", 0) + 1
+        if app_id not in APPS:
+            return None
+        return _png(zlib.crc32(app_id.encode()) & 0xFFFFFF)
+
+
+def _png(rgb, width=58, height=44):
+    # a solid-colour PNG, so every fake channel gets a distinct, decodable icon
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    row = b"\0" + rgb.to_bytes(3, "big") * width
+    return b"".join((
+        b"\x89PNG\r\n\x1a\n",
+        chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)),
+        chunk(b"IDAT", zlib.compress(row * height)),
+        chunk(b"IEND", b""),
+    ))
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.handled = 0
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+    def lost(self):
+        # decided before the request is handled, so a dropped keypress is never
+        # counted as received and shows up as a failure on the client
+        if self.server.drop_rate and random.random() < self.server.drop_rate:
+            self.close_connection = True
+            return True
+        return False
+
+    def respond(self, status, body=b"", content_type="text/xml; charset=utf-8"):
+        server = self.server
+        if server.reply_loss_rate and random.random() < server.reply_loss_rate:
+            self.close_connection = True
+            return
+        delay = server.latency + random.uniform(-server.jitter, server.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        self.handled += 1
+        self.send_response(status)
+        if body:
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if server.close_after and self.handled >= server.close_after:
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        if self.lost():
+            return
+        action, _, key = self.path.lstrip("/").partition("/")
+        if action == "launch" and key:
+            launched = self.server.roku.launch(urllib.parse.unquote(key.partition("?")[0]))
+            self.respond(200 if launched else 404)
+            return
+        if action not in ("keypress", "keydown", "keyup") or not key:
+            self.respond(404)
+            return
+        self.server.roku.key(action, urllib.parse.unquote(key))
+        self.respond(200)
+
+    def do_GET(self):
+        if self.lost():
+            return
+        prefix = "/query/"
+        if self.path.startswith("/query/icon/"):
+            icon = self.server.roku.icon(urllib.parse.unquote(self.path[len("/query/icon/"):]))
+            if icon is None:
+                self.respond(404)
+            else:
+                self.respond(200, icon, "image/png")
+            return
+        body = self.server.roku.query(self.path[len(prefix):]) if self.path.startswith(prefix) else None
+        if body is None:
+            self.respond(404)
+        else:
+            self.respond(200, body.encode())
+
+
+class FakeRokuServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, drop_rate=0.0, close_after=0,
+                 roku=None, reply_loss_rate=0.0):
+        super().__init__((host, port), _Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.reply_loss_rate = reply_loss_rate
+        self.close_after = close_after
+        self.roku = roku or FakeRoku()
+        self._thread = None
+
+    @property
+    def address(self):
+        return self.server_address[:2]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-roku", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class FakeSSDPResponder:
+    # answers M-SEARCH for roku:ecp on a unicast loopback port; point
+    # roku_discovery.iter_discover at it with ssdp_address=responder.address
+    # and interfaces=["127.0.0.1"]
+    def __init__(self, servers, host="127.0.0.1", port=0, delay=0.0):
+        self.servers = list(servers)
+        self.delay = delay
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind((host, port))
+        self._stopped = False
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._sock.getsockname()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="fake-ssdp", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped = True
+        self._sock.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        while not self._stopped:
+            try:
+                data, addr = self._sock.recvfrom(2048)
+            except OSError:
+                return
+            if b"M-SEARCH" not in data or SEARCH_TARGET.encode() not in data:
+                continue
+            if self.delay:
+                time.sleep(self.delay)
+            for server in self.servers:
+                host, port = server.address
+                reply = (
+                    "HTTP/1.1 200 OK\r\n"
+                    "Cache-Control: max-age=3600\r\n"
+                    f"ST: {SEARCH_TARGET}\r\n"
+                    f"LOCATION: http://{host}:{port}/\r\n"
+                    f"USN: uuid:roku:ecp:{server.roku.serial}\r\n"
+                    "\r\n"
+                )
+                try:
+                    self._sock.sendto(reply.encode(), addr)
+                except OSError as e:
+                    logger.debug(f"SSDP reply to {addr} failed. Exception: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a fake Roku TV that answers ECP requests.")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8060, help="ECP port to listen on (default: 8060)")
+    parser.add_argument("--ssdp-port", type=int, default=1900, help="Unicast SSDP port to answer on, 0 to disable (default: 1900)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response (default: 0)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random +- seconds on top of --latency (default: 0)")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Fraction of requests lost: never acted on, the connection is closed (default: 0)")
+    parser.add_argument("--reply-loss-rate", type=float, default=0.0, help="Fraction of requests acted on whose reply is lost (default: 0)")
+    parser.add_argument("--close-after", type=int, default=0, help="Close each connection after this many requests, 0 for never (default: 0)")
+    parser.add_argument("--serial", type=str, default="X00000000000", help="Serial number to report")
+    parser.add_argument("--enable-logging", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.enable_logging else logging.INFO)
+
+    server = FakeRokuServer(args.host, args.port, args.latency, args.jitter, args.drop_rate, args.close_after,
+                            FakeRoku(args.serial), args.reply_loss_rate)
+    responder = FakeSSDPResponder([server], args.host, args.ssdp_port).start() if args.ssdp_port else None
+    logger.info(f"Fake Roku TV listening on {args.host}:{server.address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if responder is not None:
+            responder.stop()
+        server.server_close()
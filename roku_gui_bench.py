@@ -0,0 +1,347 @@
+import argparse
+import collections
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import threading
+import time
+import tracemalloc
+
+import roku_keys
+from roku_stats import latency_summary, percentile
+
+logger = logging.getLogger(__name__)
+
+# headless render benchmark for remote_gui. RokuRemoteApp runs on SDL's dummy
+# video driver with BenchRemote in place of a RokuRemote, and a scripted
+# stream of clicks and key events is posted through pygame's event queue, a
+# few per frame, on a simulated clock at --fps. every event goes through
+# handle_event and every frame through draw_frame, as in the real event loop,
+# while FrameProfiler collects through the app's profiler hooks:
+#
+#   frame              draw time of each frame that drew something
+#   buttons            per button: draws and time spent in draw_button
+#   event_to_dispatch  from the app taking an event to its command reaching
+#                      the remote on the dispatcher thread
+#   allocations        per drawn frame, with tracemalloc on (a second pass, so
+#                      tracing doesn't slow the timed one): peak KiB allocated
+#                      and memory blocks left allocated
+#
+# the report is JSON; its "summary" goes into roku_bench.py's report as
+# "render" so render regressions are tracked next to the network benchmarks.
+
+# script steps: [frame, pygame event type name, {attributes}]; key attributes
+# are pygame key names, converted when the script is played
+SETTLE_SECONDS = 0.5  # simulated time after the last event, so highlights fade and commands land
+
+
+class BenchRemote:
+    # stands in for RokuRemote: every call succeeds at once without a network,
+    # and the profiler is told when each command arrives
+    def __init__(self, profiler=None):
+        self.profiler = profiler
+        self.base_url = "http://bench"
+        self.timeout = 1.0
+        self.calls = collections.Counter()
+
+    def _sent(self, key):
+        self.calls[key] += 1
+        if self.profiler is not None:
+            self.profiler.sent(key)
+        return True
+
+    def send_command(self, command):
+        return self._sent(command)
+
+    def key_down(self, key):
+        return self._sent(key)
+
+    def key_up(self, key):
+        return self._sent(key)
+
+    def type_text(self, text, pacing=None, pipeline=False):
+        # "Lit" is the key RokuRemoteApp.type_input dispatches typed text under
+        self._sent("Lit")
+        return len(text)
+
+    def launch(self, app_id, **params):
+        return self._sent(str(app_id))
+
+    def iter_query(self, path, chunk_size=1024):
+        return iter(())
+
+    def query_apps(self):
+        return []
+
+    def query_icon(self, app_id):
+        return b""
+
+    def close(self):
+        pass
+
+
+roku_keys.add_key_methods(BenchRemote)
+
+
+class FrameProfiler:
+    # what RokuRemoteApp reports through its profiler hooks. sent() is called
+    # on the dispatcher thread, everything else on the frame loop's.
+    def __init__(self, trace_allocations=False):
+        self.trace_allocations = trace_allocations
+        self.frame_times = []  # seconds, frames that drew something
+        self.idle_frames = 0
+        self.buttons = collections.defaultdict(lambda: [0, 0.0])  # name -> [draws, seconds]
+        self.dispatch_times = []  # seconds from event to command reaching the remote
+        self.unmatched = 0  # commands the remote got that no event accounts for
+        self.alloc_peaks = []  # bytes
+        self.alloc_blocks = []
+        self._event_start = None
+        self._frame_start = None
+        self._memory = self._blocks = 0
+        self._pending = collections.defaultdict(collections.deque)  # key -> event start times
+        self._lock = threading.Lock()
+
+    def event(self, event):
+        self._event_start = time.perf_counter()
+
+    def queued(self, key):
+        started = self._event_start if self._event_start is not None else time.perf_counter()
+        with self._lock:
+            self._pending[key].append(started)
+
+    def sent(self, key):
+        now = time.perf_counter()
+        with self._lock:
+            pending = self._pending.get(key)
+            if not pending:
+                self.unmatched += 1
+                return
+            self.dispatch_times.append(now - pending.popleft())
+
+    def lost(self):
+        # commands queued that never reached the remote
+        with self._lock:
+            return sum(len(pending) for pending in self._pending.values())
+
+    def frame_start(self):
+        if self.trace_allocations:
+            tracemalloc.reset_peak()
+            self._memory = tracemalloc.get_traced_memory()[0]
+            self._blocks = sys.getallocatedblocks()
+        self._frame_start = time.perf_counter()
+
+    def frame_end(self, drawn):
+        elapsed = time.perf_counter() - self._frame_start
+        if not drawn:
+            self.idle_frames += 1
+            return
+        self.frame_times.append(elapsed)
+        if self.trace_allocations:
+            self.alloc_peaks.append(tracemalloc.get_traced_memory()[1] - self._memory)
+            self.alloc_blocks.append(sys.getallocatedblocks() - self._blocks)
+
+    def button(self, name, seconds):
+        entry = self.buttons[name]
+        entry[0] += 1
+        entry[1] += seconds
+
+
+def _center(spec):
+    if "circle" in spec:
+        return list(spec["circle"])
+    x, y, w, h = spec["rect"]
+    return [x + w // 2, y + h // 2]
+
+
+def synthetic_script(layout, events=300, seed=1, word="netflix"):
+    # a reproducible stream of `events` user actions, roughly how the remote
+    # gets used: mostly d-pad and other key buttons, clicked or pressed with
+    # their shortcut and held for a few frames, now and then cycling inputs or
+    # typing a word. the launcher is left out: it reads and writes the icon
+    # cache on disk.
+    rng = random.Random(seed)
+    buttons = layout["buttons"]
+    commands = [spec for spec in buttons if spec.get("command")]
+    shortcuts = [spec for spec in commands if spec.get("shortcut")]
+    actions = {spec["action"]: spec for spec in buttons if spec.get("action")}
+    script = []
+    frame = 1
+
+    def click(spec, hold):
+        pos = _center(spec)
+        script.append([frame, "MOUSEBUTTONDOWN", {"pos": pos, "button": 1}])
+        script.append([frame + hold, "MOUSEBUTTONUP", {"pos": pos, "button": 1}])
+
+    def key(name, hold, unicode=""):
+        script.append([frame, "KEYDOWN", {"key": name, "unicode": unicode}])
+        script.append([frame + hold, "KEYUP", {"key": name}])
+
+    for _ in range(events):
+        roll = rng.random()
+        hold = rng.randint(1, 6)
+        if roll < 0.05 and "start_typing" in actions:
+            click(actions["start_typing"], 1)
+            for char in word:
+                frame += rng.randint(2, 5)
+                key(char, 1, char)
+            frame += 2
+            key("return", 1)
+        elif roll < 0.1 and "cycle_input" in actions:
+            click(actions["cycle_input"], hold)
+        elif roll < 0.55 or not shortcuts:
+            click(rng.choice(commands), hold)
+        else:
+            key(rng.choice(shortcuts)["shortcut"], hold)
+        frame += hold + rng.randint(1, 10)
+    script.sort(key=lambda step: step[0])
+    return script
+
+
+def _play(app, script, fps):
+    import pygame
+    clock = [0.0]
+    app.now = lambda: clock[0]
+    app.mark_dirty(app.screen.get_rect())
+    steps = collections.deque(script)
+    last = script[-1][0] if script else 0
+    for frame in range(last + int(SETTLE_SECONDS * fps) + 1):
+        clock[0] = frame / fps
+        while steps and steps[0][0] <= frame:
+            _, name, attributes = steps.popleft()
+            attributes = dict(attributes)
+            if "key" in attributes:
+                attributes["key"] = pygame.key.key_code(attributes["key"])
+            if "pos" in attributes:
+                attributes["pos"] = tuple(attributes["pos"])
+            pygame.event.post(pygame.event.Event(getattr(pygame, name), **attributes))
+        for event in pygame.event.get():
+            app.handle_event(event)
+        app.draw_frame()
+        # the real loop sleeps between frames; without a pause here the
+        # dispatcher thread waits on the GIL and its queue backs up
+        time.sleep(0)
+    # let the dispatcher finish, then draw whatever its completions changed
+    deadline = time.monotonic() + 5
+    while app.dispatcher.pending() and time.monotonic() < deadline:
+        time.sleep(0.001)
+    time.sleep(0.01)
+    for event in pygame.event.get():
+        app.handle_event(event)
+    app.draw_frame()
+
+
+def run_pass(script, render_mode="cached", fps=30, layout=None, trace_allocations=False):
+    # plays script once through a fresh headless app and returns what the
+    # profiler saw
+    import remote_gui
+    profiler = FrameProfiler(trace_allocations)
+    remote = BenchRemote(profiler)
+    app = remote_gui.RokuRemoteApp(None, render_mode=render_mode, fps=fps, layout=layout, remote=remote,
+                                   headless=True, profiler=profiler)
+    profiler.buttons.clear()  # drop the one-off background drawn at start-up
+    if trace_allocations:
+        tracemalloc.start()
+    try:
+        _play(app, script, fps)
+    finally:
+        if trace_allocations:
+            tracemalloc.stop()
+        app.close()
+    return profiler
+
+
+def _pass_report(profiler):
+    buttons = sorted(profiler.buttons.items(), key=lambda item: -item[1][1])
+    return {
+        "frames": len(profiler.frame_times) + profiler.idle_frames,
+        "idle_frames": profiler.idle_frames,
+        "frame": latency_summary([seconds * 1000 for seconds in profiler.frame_times]),
+        "buttons": {
+            name: {"draws": draws, "mean_us": seconds / draws * 1e6, "total_ms": seconds * 1000}
+            for name, (draws, seconds) in buttons
+        },
+        # failures: commands the GUI queued that never reached the remote
+        "event_to_dispatch": latency_summary([seconds * 1000 for seconds in profiler.dispatch_times],
+                                             profiler.lost()),
+    }
+
+
+def _allocation_report(profiler):
+    peaks_kib = [peak / 1024 for peak in profiler.alloc_peaks]
+    if not peaks_kib:
+        return {"frames": 0}
+    return {
+        "frames": len(peaks_kib),
+        "peak_kib": {"p50": percentile(peaks_kib, 50), "p99": percentile(peaks_kib, 99), "max": max(peaks_kib)},
+        "net_blocks_mean": sum(profiler.alloc_blocks) / len(profiler.alloc_blocks),
+    }
+
+
+def run_benchmark(events=300, seed=1, render_modes=("cached", "full"), fps=30, layout=None, script=None,
+                  allocations=True):
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    import pygame
+    import remote_gui
+    if script is None:
+        script = synthetic_script(layout or remote_gui.DEFAULT_LAYOUT, events, seed)
+    report = {
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "platform": platform.platform(),
+        "config": {"script_steps": len(script), "seed": seed, "fps": fps, "render_modes": list(render_modes),
+                   "allocations": allocations},
+    }
+    summary = {}
+    for mode in render_modes:
+        result = _pass_report(run_pass(script, mode, fps, layout))
+        if allocations:
+            result["allocations"] = _allocation_report(run_pass(script, mode, fps, layout, trace_allocations=True))
+        report[mode] = result
+        # microseconds: roku_bench ignores changes under 1 as noise
+        summary[f"{mode}_frame_p50_us"] = result["frame"].get("p50_ms", 0) * 1000
+        summary[f"{mode}_frame_p99_us"] = result["frame"].get("p99_ms", 0) * 1000
+        summary[f"{mode}_dispatch_p99_us"] = result["event_to_dispatch"].get("p99_ms", 0) * 1000
+    report["summary"] = summary
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark remote_gui's rendering headless with a scripted stream of input.")
+    parser.add_argument("--events", type=int, default=300, help="User actions in the synthetic script (default: 300)")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the synthetic script (default: 1)")
+    parser.add_argument("--script", type=str, help="Play this JSON script instead of a synthetic one")
+    parser.add_argument("--save-script", type=str, metavar="PATH", help="Write the script played to PATH")
+    parser.add_argument("--render", choices=["cached", "full", "both"], default="both",
+                        help="Render mode(s) to measure (default: both)")
+    parser.add_argument("--fps", type=int, default=30, help="Simulated frame rate events are spread over (default: 30)")
+    parser.add_argument("--layout", type=str, help="JSON file with an alternate button layout")
+    parser.add_argument("--no-allocations", action="store_true", help="Skip the tracemalloc pass")
+    parser.add_argument("--output", type=str, help="Write the JSON report to this file as well as stdout")
+    parser.add_argument("--enable-logging", action="store_true", help="Enable logging")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.enable_logging else logging.CRITICAL)
+
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    import remote_gui
+    layout = remote_gui.load_layout(args.layout) if args.layout else None
+    if args.script:
+        with open(args.script) as f:
+            script = json.load(f)
+    else:
+        script = synthetic_script(layout or remote_gui.DEFAULT_LAYOUT, args.events, args.seed)
+    if args.save_script:
+        with open(args.save_script, "w") as f:
+            json.dump(script, f)
+
+    modes = ("cached", "full") if args.render == "both" else (args.render,)
+    report = run_benchmark(args.events, args.seed, modes, args.fps, layout, script, not args.no_allocations)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
@@ -0,0 +1,235 @@
+import collections
+import logging
+import threading
+import time
+
+import roku_http
+
+logger = logging.getLogger(__name__)
+
+# per-device liveness. every request a remote makes is reported here: replies
+# train a round-trip estimate the connect and read timeouts are derived from,
+# and failures are sorted into connect errors (nothing answered, the TV is off
+# or unplugged), timeouts (it answered too slowly) and everything else. after
+# failure_threshold failures in a row the breaker opens and requests fail at
+# once with DeviceUnavailable, while a probe retries in the background with
+# exponential backoff and closes the breaker when the TV answers again.
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+
+class DeviceUnavailable(ConnectionError):
+    # raised instead of contacting a TV whose breaker is open
+    def __init__(self, device, retry_in):
+        super().__init__(f"{device} is unavailable, next probe in {retry_in:.1f}s")
+        self.device = device
+        self.retry_in = retry_in
+
+
+def failure_kind(error):
+    if isinstance(error, roku_http.ConnectFailed):
+        return "connect"
+    if isinstance(error, TimeoutError):
+        return "timeout"
+    return "error"
+
+
+class RTTEstimator:
+    # smoothed round trip and its variation, as TCP estimates its
+    # retransmission timeout (RFC 6298). a timeout doubles the estimate until
+    # the next reply, so a TV that is just slow gets more time instead of
+    # timing out again at the same point.
+    def __init__(self):
+        self.srtt = None
+        self.rttvar = None
+        self.scale = 1
+
+    def update(self, sample):
+        if self.srtt is None:
+            self.srtt, self.rttvar = sample, sample / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - sample)
+            self.srtt = 0.875 * self.srtt + 0.125 * sample
+        self.scale = 1
+
+    def back_off(self):
+        self.scale = min(self.scale * 2, 64)
+
+    def timeout(self, minimum, maximum):
+        if self.srtt is None:
+            return maximum
+        return min(maximum, max(minimum, self.srtt + 4 * self.rttvar) * self.scale)
+
+
+class DeviceHealth:
+    def __init__(self, device, max_timeout=2.0, failure_threshold=3, adaptive=True, min_timeout=0.5,
+                 backoff=1.0, max_backoff=60.0, probe=None):
+        self.device = device
+        self.max_timeout = max_timeout
+        self.min_timeout = min_timeout
+        self.failure_threshold = failure_threshold  # 0 never opens the breaker
+        self.adaptive = adaptive
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # probe() checks the TV from a timer thread while the breaker is open;
+        # without one, the first request after the backoff is let through instead
+        self.probe = probe
+        self.state = CLOSED
+        self.failures = 0  # in a row
+        self.probes = 0  # failed probes since the breaker opened
+        self.retry_at = None
+        self.last_error = None
+        self.last_error_kind = None
+        self.counts = collections.Counter()  # "ok", "connect", "timeout", "error", "rejected"
+        self.rtt = RTTEstimator()
+        self.connect_rtt = RTTEstimator()
+        self._listeners = []
+        self._timer = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener):
+        # listener(health) runs whenever the breaker changes state, on whichever
+        # thread made the request or ran the probe
+        self._listeners.append(listener)
+        return listener
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    @property
+    def available(self):
+        return self.state == CLOSED
+
+    def connect_timeout(self):
+        if not self.adaptive:
+            return self.max_timeout
+        return self.connect_rtt.timeout(self.min_timeout, self.max_timeout)
+
+    def timeout(self):
+        # for reading the reply once connected
+        if not self.adaptive:
+            return self.max_timeout
+        return self.rtt.timeout(self.min_timeout, self.max_timeout)
+
+    def allow(self):
+        # whether a request may go out now; False means fail fast
+        if self.state == CLOSED:
+            return True
+        with self._lock:
+            if self.state == OPEN and self.probe is None and time.monotonic() >= self.retry_at:
+                # this request is the trial: it closes or reopens the breaker
+                self.state = HALF_OPEN
+                return True
+            self.counts["rejected"] += 1
+            return False
+
+    def unavailable(self):
+        return DeviceUnavailable(self.device, max(0.0, (self.retry_at or 0.0) - time.monotonic()))
+
+    def record_success(self, elapsed, connect=0.0):
+        # elapsed is None for requests that shouldn't train the read timeout
+        with self._lock:
+            self.counts["ok"] += 1
+            if self.adaptive:
+                if connect:
+                    self.connect_rtt.update(connect)
+                if elapsed is not None:
+                    self.rtt.update(elapsed - connect)
+            self.failures = 0
+            changed = self.state != CLOSED
+            if changed:
+                self._close()
+        if changed:
+            self._notify()
+
+    def record_failure(self, error, kind=None):
+        kind = kind or failure_kind(error)
+        with self._lock:
+            self.counts[kind] += 1
+            self.last_error = f"{type(error).__name__}: {error}"
+            self.last_error_kind = kind
+            if kind == "timeout":
+                self.rtt.back_off()
+            elif kind == "connect":
+                self.connect_rtt.back_off()
+            self.failures += 1
+            changed = self.state == HALF_OPEN or (
+                self.state == CLOSED and self.failure_threshold and self.failures >= self.failure_threshold)
+            if changed:
+                if self.state == HALF_OPEN:
+                    self.probes += 1
+                self._open()
+        if changed:
+            self._notify()
+
+    def _open(self):
+        delay = min(self.max_backoff, self.backoff * 2 ** self.probes)
+        self.state = OPEN
+        self.retry_at = time.monotonic() + delay
+        logger.warning(f"{self.device} is unreachable ({self.last_error}), retrying in {delay:.1f}s")
+        if self.probe is not None and not self._closed:
+            self._timer = threading.Timer(delay, self._run_probe)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _close(self):
+        logger.info(f"{self.device} is reachable again")
+        self.state = CLOSED
+        self.failures = 0
+        self.probes = 0
+        self.retry_at = None
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _run_probe(self):
+        with self._lock:
+            if self.state != OPEN or self._closed:
+                return
+            self.state = HALF_OPEN
+        self._notify()
+        try:
+            self.probe()
+        except roku_http.ERRORS as e:
+            self.record_failure(e)
+        else:
+            self._probe_succeeded()
+
+    def _probe_succeeded(self):
+        # not record_success: a probe opens a fresh connection, so its time
+        # says nothing about the round trip of pooled requests
+        with self._lock:
+            self.counts["ok"] += 1
+            self._close()
+        self._notify()
+
+    def _notify(self):
+        for listener in self._listeners:
+            try:
+                listener(self)
+            except Exception:
+                logger.exception("Health listener %r failed", listener)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "device": self.device,
+                "state": self.state,
+                "failures": self.failures,
+                "retry_in": max(0.0, self.retry_at - time.monotonic()) if self.retry_at else None,
+                "rtt": self.rtt.srtt,
+                "connect_rtt": self.connect_rtt.srtt,
+                "timeout": self.timeout(),
+                "connect_timeout": self.connect_timeout(),
+                "last_error": self.last_error,
+                "last_error_kind": self.last_error_kind,
+                "counts": dict(self.counts),
+            }
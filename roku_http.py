@@ -0,0 +1,297 @@
+import collections
+import http.client
+import logging
+import select
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# the default RokuRemote transport: keep-alive HTTP/1.1 on http.client, which
+# is all ECP needs (empty-body POSTs and small XML replies on the LAN) and
+# imports in a fraction of the time requests does. roku_requests has the same
+# interface on top of requests for anyone who wants it.
+
+# everything a request can raise: socket errors, timeouts and protocol errors.
+# requests' exceptions are OSErrors too, so this covers both transports.
+ERRORS = (OSError, http.client.HTTPException)
+
+# seconds the current thread spent opening connections; lets metrics split a
+# command's time into connect and response phases
+phases = threading.local()
+
+
+class ConnectFailed(ConnectionError):
+    # the TV never accepted the connection: refused, unreachable or timed out
+    # while connecting, as opposed to a slow or broken reply
+    pass
+
+
+class HTTPStatusError(OSError):
+    def __init__(self, status, path):
+        super().__init__(f"{status} for {path}")
+        self.status = status
+
+
+class Response:
+    def __init__(self, status, path, response=None, body=b"", release=None):
+        self.status_code = status
+        self.path = path
+        self._response = response  # still streaming when not None
+        self._body = body
+        self._release = release
+
+    @property
+    def content(self):
+        if self._response is not None:
+            self._body = b"".join(self.iter_content())
+        return self._body
+
+    def iter_content(self, chunk_size=1024):
+        if self._response is None:
+            if self._body:
+                yield self._body
+            return
+        try:
+            while True:
+                chunk = self._response.read1(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        except BaseException:
+            self.close(reusable=False)
+            raise
+        self.close()
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise HTTPStatusError(self.status_code, self.path)
+
+    def close(self, reusable=True):
+        # hands the connection back once the body has been read
+        response, self._response = self._response, None
+        if response is not None:
+            if reusable and not response.isclosed():
+                # a partly read body can't be left on a keep-alive socket
+                reusable = False
+            self._release(reusable and not response.will_close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close(reusable=exc_info[0] is None)
+
+
+class HTTPPool:
+    # up to pool_size idle keep-alive connections to one host. connections
+    # idle longer than idle_timeout are dropped, since the TV closes them on
+    # its own, and so are idle connections the TV has already closed. a request
+    # is only ever retried on a new connection when sending it failed; once it
+    # has gone out, a keypress might have reached the TV, so the error is raised.
+    def __init__(self, host, port=8060, timeout=2, pool_size=4, idle_timeout=30):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self._idle = collections.deque()  # (connection, last used)
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def close(self):
+        # connections still out on requests are closed when they come back
+        with self._lock:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+        for conn, _ in idle:
+            conn.close()
+
+    def _checkout(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                conn, last_used = self._idle.pop()
+                if now - last_used > self.idle_timeout:
+                    logger.debug("Pooled connection idle too long, reconnecting")
+                elif _is_stale(conn):
+                    logger.debug("Pooled connection closed by the TV, reconnecting")
+                else:
+                    return conn
+                conn.close()
+        return None
+
+    def _checkin(self, conn, reusable):
+        if reusable:
+            with self._lock:
+                if not self._closed and len(self._idle) < self.pool_size:
+                    self._idle.append((conn, time.monotonic()))
+                    return
+        conn.close()
+
+    def _connect(self, connect_timeout):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=connect_timeout)
+        start = time.perf_counter()
+        try:
+            conn.connect()
+        except OSError as e:
+            raise ConnectFailed(f"Can't connect to {self.host}:{self.port}: {e}") from e
+        phases.connect = getattr(phases, "connect", 0.0) + time.perf_counter() - start
+        return conn
+
+    def _write(self, conn, method, path, timeout, raw):
+        conn.timeout = timeout
+        conn.sock.settimeout(timeout)
+        if raw is None:
+            conn.request(method, path)
+        else:
+            # prebuilt request bytes go out as they are; http.client only parses the reply
+            conn.sock.sendall(raw)
+
+    def _read(self, conn, method, raw):
+        if raw is None:
+            return conn.getresponse()
+        response = conn.response_class(conn.sock, method=method)
+        response.begin()
+        return response
+
+    def pipeline(self, requests, connect_timeout=None, timeout=None):
+        # writes prebuilt requests back to back on one connection, then yields
+        # (status, keep_alive) for each reply in order. the connection goes back
+        # to the pool only when every reply was read and the TV kept it open.
+        # nothing is retried: once the batch is written, any of it may have
+        # reached the TV. a garbled reply raises http.client.HTTPException.
+        connect_timeout = self.timeout if connect_timeout is None else connect_timeout
+        timeout = self.timeout if timeout is None else timeout
+        conn = self._checkout() or self._connect(connect_timeout)
+        reusable = False
+        try:
+            conn.sock.settimeout(timeout)
+            conn.sock.sendall(b"".join(requests))
+            # one buffered reader for the whole batch: replies arrive back to
+            # back, and a reader per reply would swallow the start of the next
+            with conn.sock.makefile("rb") as fp:
+                for _ in requests:
+                    status, _, _, keep_alive = read_response(fp)
+                    yield status, keep_alive
+                    if not keep_alive:
+                        break
+                else:
+                    reusable = True
+        finally:
+            self._checkin(conn, reusable)
+
+    def request(self, method, path, stream=False, connect_timeout=None, timeout=None, raw=None):
+        # the timeouts default to the pool's; RokuRemote passes ones adapted
+        # to the TV's round trip. raw, if given, is the whole request for
+        # method and path already encoded (see roku_keys.KeyRequests).
+        connect_timeout = self.timeout if connect_timeout is None else connect_timeout
+        timeout = self.timeout if timeout is None else timeout
+        conn = self._checkout()
+        if conn is not None:
+            try:
+                self._write(conn, method, path, timeout, raw)
+            except ConnectionError as e:
+                # the TV closed this warm socket after the check in _checkout
+                # and the request couldn't be written, so it never reached the
+                # TV and can safely go again on a new one
+                logger.debug("Stale pooled connection (%s), reconnecting", e)
+                conn.close()
+                conn = None
+            except BaseException:
+                conn.close()
+                raise
+        if conn is None:
+            conn = self._connect(connect_timeout)
+            try:
+                self._write(conn, method, path, timeout, raw)
+            except BaseException:
+                conn.close()
+                raise
+        try:
+            response = self._read(conn, method, raw)
+        except BaseException:
+            conn.close()
+            raise
+
+        def release(reusable):
+            self._checkin(conn, reusable)
+
+        if stream:
+            return Response(response.status, path, response, release=release)
+        try:
+            body = response.read()
+        except BaseException:
+            conn.close()
+            raise
+        release(not response.will_close)
+        return Response(response.status, path, body=body)
+
+
+def read_response(fp):
+    # reads one HTTP/1.1 response from a buffered socket file; returns
+    # (status, headers, body, keep_alive). a reply that can't be parsed raises
+    # http.client.HTTPException, so it is one of ERRORS.
+    status_line = fp.readline()
+    if not status_line:
+        raise ConnectionResetError("Connection closed before response")
+    try:
+        parts = status_line.split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith(b"HTTP/"):
+            raise ValueError(f"bad status line {status_line!r}")
+        status = int(parts[1])
+        headers = {}
+        while True:
+            line = fp.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        keep_alive = headers.get("connection", "").lower() != "close" and parts[0] != b"HTTP/1.0"
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(fp.readline().split(b";")[0], 16)
+                if size == 0:
+                    fp.readline()
+                    break
+                chunks.append(fp.read(size))
+                fp.readline()
+            body = b"".join(chunks)
+        elif "content-length" in headers:
+            body = fp.read(int(headers["content-length"]))
+        else:
+            body = fp.read()
+            keep_alive = False
+    except ValueError as e:
+        raise http.client.HTTPException(f"Malformed response: {e}") from e
+    return status, headers, body, keep_alive
+
+
+def _is_stale(conn):
+    # an idle keep-alive socket should have nothing to read; if it is readable
+    # the TV has closed it (or sent something unasked for) and it can't be reused
+    sock = conn.sock
+    if sock is None:
+        return True
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+def request_once(host, port, method, path, timeout=2):
+    # one request on a brand new connection, closed afterwards
+    conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        try:
+            conn.connect()
+        except OSError as e:
+            raise ConnectFailed(f"Can't connect to {host}:{port}: {e}") from e
+        conn.request(method, path)
+        response = conn.getresponse()
+        return Response(response.status, path, body=response.read())
+    finally:
+        conn.close()
@@ -0,0 +1,172 @@
+import concurrent.futures
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import roku_http
+
+logger = logging.getLogger(__name__)
+
+# channel icons for the GUI's launcher, kept on disk so a warm launcher makes
+# no icon requests at all. blobs are content-addressed (named by their sha256,
+# so channels sharing an icon share a file) and an index maps each channel's
+# id and version to its blob and when it was last used. once the blobs pass
+# max_bytes the least recently used channels are evicted.
+
+DEFAULT_ICON_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "simple-remote", "icons",
+)
+
+
+def icon_key(app):
+    # a channel update can change its icon, so the version is part of the key
+    return f"{app['id']}@{app.get('version', '')}"
+
+
+class IconCache:
+    def __init__(self, path=DEFAULT_ICON_DIR, max_bytes=8 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(path, "index.json")
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._entries, self._blobs = self._read()  # key -> [digest, last used]; digest -> size
+
+    def _read(self):
+        try:
+            with open(self.index_path) as f:
+                data = json.load(f)
+            return dict(data["entries"]), dict(data["blobs"])
+        except FileNotFoundError:
+            return {}, {}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable icon index {self.index_path}. Exception: {e}")
+            return {}, {}
+
+    def _blob_path(self, digest):
+        return os.path.join(self.path, digest[:2], digest)
+
+    @property
+    def size(self):
+        with self._lock:
+            return sum(self._blobs.values())
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key):
+        # the icon's bytes, or None if it isn't cached
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry[1] = time.time()
+            self._dirty = True
+            digest = entry[0]
+        try:
+            with open(self._blob_path(digest), "rb") as f:
+                return f.read()
+        except OSError as e:
+            logger.warning(f"Icon blob for '{key}' is missing, dropping it. Exception: {e}")
+            with self._lock:
+                if self._entries.get(key, [None])[0] == digest:
+                    del self._entries[key]
+                    self._forget(digest)
+            return None
+
+    def put(self, key, data):
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            if digest not in self._blobs:
+                path = self._blob_path(digest)
+                try:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    tmp_path = f"{path}.tmp"
+                    with open(tmp_path, "wb") as f:
+                        f.write(data)
+                    os.replace(tmp_path, path)
+                except OSError as e:
+                    logger.warning(f"Failed to cache icon '{key}'. Exception: {e}")
+                    return None
+                self._blobs[digest] = len(data)
+            previous = self._entries.get(key)
+            self._entries[key] = [digest, time.time()]
+            if previous is not None and previous[0] != digest:
+                self._forget(previous[0])
+            self._evict()
+            self._dirty = True
+        return digest
+
+    def _forget(self, digest):
+        # deletes a blob once no channel refers to it
+        if any(entry[0] == digest for entry in self._entries.values()):
+            return
+        self._blobs.pop(digest, None)
+        try:
+            os.unlink(self._blob_path(digest))
+        except OSError:
+            pass
+
+    def _evict(self):
+        total = sum(self._blobs.values())
+        if total <= self.max_bytes:
+            return
+        for key, (digest, _) in sorted(self._entries.items(), key=lambda item: item[1][1]):
+            del self._entries[key]
+            size = self._blobs.get(digest, 0)
+            self._forget(digest)
+            if digest not in self._blobs:
+                total -= size
+                logger.debug("Evicted icon '%s' (%d bytes)", key, size)
+            if total <= self.max_bytes:
+                break
+
+    def save(self):
+        # writes the index if anything changed; recency from get() is only
+        # persisted here, not on every lookup
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps({"entries": self._entries, "blobs": self._blobs})
+            self._dirty = False
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            tmp_path = f"{self.index_path}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            logger.warning(f"Failed to write icon index {self.index_path}. Exception: {e}")
+
+
+def fetch_icons(remote, apps, cache, concurrency=4, on_icon=None):
+    # downloads the icons of apps that aren't cached yet, several at a time,
+    # and returns how many were fetched. on_icon(app) is called from a worker
+    # thread as each one lands.
+    missing = [app for app in apps if icon_key(app) not in cache]
+    if not missing:
+        cache.save()
+        return 0
+
+    def fetch(app):
+        try:
+            data = remote.query_icon(app["id"])
+        except roku_http.ERRORS as e:
+            logger.warning(f"Failed to fetch icon for '{app['name']}'. Exception: {e}")
+            return False
+        if not data or cache.put(icon_key(app), data) is None:
+            return False
+        if on_icon is not None:
+            on_icon(app)
+        return True
+
+    with concurrent.futures.ThreadPoolExecutor(min(concurrency, len(missing)), "roku-icons") as pool:
+        fetched = sum(pool.map(fetch, missing))
+    cache.save()
+    logger.info(f"Fetched {fetched}/{len(missing)} channel icons")
+    return fetched
@@ -0,0 +1,133 @@
+# the ECP key set, as the convenience method that sends each key -> the key in
+# the casing Roku documents. RokuRemote, AsyncRokuRemote and the daemon client
+# get their methods from this table (add_key_methods), and every key a remote
+# sends is checked against it before anything goes on the wire. besides these,
+# Lit_<char> sends one character; see literal().
+# https://developer.roku.com/docs/developer-program/dev-tools/external-control-api.md#keypress-key-values
+
+KEYS = {
+    "home": "Home",
+    "back": "Back",
+    "select": "Select",
+    "up": "Up",
+    "down": "Down",
+    "left": "Left",
+    "right": "Right",
+    "play": "Play",
+    "pause": "Pause",  # not in the ECP docs, but TVs answer it
+    "rewind": "Rev",
+    "fast_forward": "Fwd",
+    "info": "Info",
+    "instant_replay": "InstantReplay",
+    "backspace": "Backspace",
+    "search": "Search",
+    "enter": "Enter",
+    "find_remote": "FindRemote",
+    # Roku TVs only
+    "power": "Power",
+    "power_on": "PowerOn",
+    "power_off": "PowerOff",
+    "volume_up": "VolumeUp",
+    "volume_down": "VolumeDown",
+    "volume_mute": "VolumeMute",
+    "channel_up": "ChannelUp",
+    "channel_down": "ChannelDown",
+    "input_tuner": "InputTuner",
+    "input_hdmi1": "InputHDMI1",
+    "input_hdmi2": "InputHDMI2",
+    "input_hdmi3": "InputHDMI3",
+    "input_hdmi4": "InputHDMI4",
+    "input_av1": "InputAV1",
+}
+
+# the input keys in the order the GUI's Input button cycles through them
+INPUTS = tuple(key for key in KEYS.values() if key.startswith("Input"))
+
+# keys that change the TV's power-mode, the only part of /query/device-info a
+# key changes
+POWER_KEYS = frozenset({"Power", "PowerOn", "PowerOff"})
+
+# ECP actions that take a key
+ACTIONS = ("keypress", "keydown", "keyup")
+
+_CANONICAL = {key.lower(): key for key in KEYS.values()}
+
+
+class UnknownKey(ValueError):
+    def __init__(self, key):
+        super().__init__(f"Unknown ECP key '{key}'")
+        self.key = key
+
+
+def literal(char):
+    # percent-encoded as UTF-8 so spaces, reserved and non-ASCII characters
+    # arrive intact. urllib is imported here so roku_client, which only needs
+    # the table, starts without it.
+    import urllib.parse
+    return "Lit_" + urllib.parse.quote(char, safe="")
+
+
+def canonical(key):
+    # the key as it goes on the wire: known keys in their documented casing,
+    # so "powerOn" and "poweron" both become "PowerOn", and literals
+    # percent-encoded. raises UnknownKey for anything else.
+    known = _CANONICAL.get(key.lower())
+    if known is not None:
+        return known
+    if key[:4].lower() == "lit_":
+        import urllib.parse
+        try:
+            char = urllib.parse.unquote(key[4:], errors="strict")
+        except UnicodeDecodeError:
+            raise UnknownKey(key) from None
+        if len(char) == 1:
+            return literal(char)
+    raise UnknownKey(key)
+
+
+def request_bytes(method, host, path):
+    return f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Length: 0\r\n\r\n".encode()
+
+
+class KeyRequests:
+    # one device's key requests, validated and encoded the first time each
+    # (action, key) is sent so later presses do no formatting at all. the
+    # keypresses of the whole table are built up front.
+    def __init__(self, host):
+        self.host = host
+        self._requests = {}  # (action, key as given) -> (key, path, request bytes)
+        for key in KEYS.values():
+            self.get("keypress", key)
+
+    def get(self, action, key):
+        request = self._requests.get((action, key))
+        if request is None:
+            if action not in ACTIONS:
+                raise ValueError(f"Unknown ECP action '{action}'")
+            known = canonical(key)
+            request = self._requests.get((action, known))
+            if request is None:
+                path = f"/{action}/{known}"
+                request = self._requests[(action, known)] = (known, path, request_bytes("POST", self.host, path))
+            self._requests[(action, key)] = request
+        return request
+
+
+def _key_method(cls, name, key, coroutine):
+    if coroutine:
+        async def method(self):
+            return await self.send_command(key)
+    else:
+        def method(self):
+            return self.send_command(key)
+    method.__name__ = name
+    method.__qualname__ = f"{cls.__name__}.{name}"
+    return method
+
+
+def add_key_methods(cls, coroutine=False):
+    # gives cls one method per KEYS entry, e.g. cls.volume_up(), that calls
+    # cls.send_command with its key; coroutine for classes whose send_command is one
+    for name, key in KEYS.items():
+        setattr(cls, name, _key_method(cls, name, key, coroutine))
+    return cls
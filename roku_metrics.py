@@ -0,0 +1,216 @@
+import bisect
+import collections
+import http.server
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# per-command latency metrics. a remote created with metrics=CommandMetrics()
+# times every key it sends, split into connect (TCP setup, zero on a reused
+# keep-alive socket) and response (request written to status line read), and
+# records status codes and exception types per device ("ip:port") and per key.
+# remotes without metrics skip all of it.
+
+# histogram bucket upper bounds, in seconds
+BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+
+# every field a hook receives
+CommandSample = collections.namedtuple(
+    "CommandSample", "device action key started elapsed connect status error")
+
+
+def metric_key(key):
+    # typed literals would give every character its own series, and launch
+    # parameters every piece of content
+    if key.startswith("Lit_"):
+        return "Lit"
+    return key.partition("?")[0]
+
+
+class Histogram:
+    # fixed buckets, so memory doesn't grow with the number of samples
+    def __init__(self, bounds=BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        # linear interpolation inside the bucket holding the q-th sample
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.bounds[index - 1] if index else 0.0
+                upper = self.bounds[index] if index < len(self.bounds) else self.bounds[-1]
+                return lower + (upper - lower) * max(0.0, rank - seen) / count
+            seen += count
+        return self.bounds[-1]
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "buckets": dict(zip([*map(str, self.bounds), "+Inf"], self.counts)),
+        }
+
+
+class _Series:
+    def __init__(self):
+        self.latency = Histogram()
+        self.connect = Histogram()
+        self.response = Histogram()
+        self.statuses = collections.Counter()
+        self.errors = collections.Counter()
+
+    def record(self, sample):
+        self.latency.observe(sample.elapsed)
+        self.connect.observe(sample.connect)
+        self.response.observe(sample.elapsed - sample.connect)
+        if sample.status is not None:
+            self.statuses[sample.status] += 1
+        if sample.error is not None:
+            self.errors[type(sample.error).__name__] += 1
+
+    def to_dict(self):
+        return {
+            "requests": self.latency.count,
+            "failures": sum(self.errors.values()) + sum(n for s, n in self.statuses.items() if s not in (200, 204)),
+            "statuses": {str(status): n for status, n in self.statuses.items()},
+            "errors": dict(self.errors),
+            "latency": self.latency.to_dict(),
+            "connect": self.connect.to_dict(),
+            "response": self.response.to_dict(),
+        }
+
+
+class CommandMetrics:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._devices = {}  # device -> _Series
+        self._keys = {}  # (device, key) -> _Series
+        self._hooks = []
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+        # hook(CommandSample) runs on the sending thread after every command;
+        # for tracing or exporting elsewhere. keep it quick.
+        self._hooks.append(hook)
+        return hook
+
+    def remove_hook(self, hook):
+        self._hooks.remove(hook)
+
+    def record(self, device, action, key, started, elapsed, connect=0.0, status=None, error=None):
+        if not self.enabled:
+            return
+        sample = CommandSample(device, action, metric_key(key), started, elapsed, connect, status, error)
+        with self._lock:
+            series = self._devices.get(device)
+            if series is None:
+                series = self._devices[device] = _Series()
+            series.record(sample)
+            series = self._keys.get((device, sample.key))
+            if series is None:
+                series = self._keys[(device, sample.key)] = _Series()
+            series.record(sample)
+        for hook in self._hooks:
+            try:
+                hook(sample)
+            except Exception:
+                logger.exception("Metrics hook %r failed", hook)
+
+    def reset(self):
+        with self._lock:
+            self._devices.clear()
+            self._keys.clear()
+
+    def snapshot(self):
+        # plain dicts, safe to json.dump: device -> totals plus a "keys" breakdown
+        with self._lock:
+            devices = {device: series.to_dict() for device, series in self._devices.items()}
+            for (device, key), series in self._keys.items():
+                devices[device].setdefault("keys", {})[key] = series.to_dict()
+        return {"timestamp": time.time(), "devices": devices}
+
+    def slowest(self, q=0.99, limit=5):
+        # [(device, seconds)] with the highest latency quantile first
+        with self._lock:
+            ranked = [(device, series.latency.quantile(q)) for device, series in self._devices.items()]
+        ranked.sort(key=lambda item: item[1] or 0.0, reverse=True)
+        return ranked[:limit]
+
+    def to_prometheus(self):
+        lines = []
+
+        def histogram(name, help_text, attribute):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for (device, key), series in self._keys.items():
+                hist = getattr(series, attribute)
+                labels = f'device="{device}",key="{key}"'
+                cumulative = 0
+                for bound, count in zip([*map(str, hist.bounds), "+Inf"], hist.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"{name}_sum{{{labels}}} {hist.sum}")
+                lines.append(f"{name}_count{{{labels}}} {hist.count}")
+
+        with self._lock:
+            histogram("roku_command_seconds", "Time to send an ECP command and read the reply.", "latency")
+            histogram("roku_command_connect_seconds", "Time spent opening a connection for a command.", "connect")
+            lines.append("# HELP roku_command_responses_total ECP command replies by HTTP status.")
+            lines.append("# TYPE roku_command_responses_total counter")
+            for (device, key), series in self._keys.items():
+                for status, count in series.statuses.items():
+                    lines.append(f'roku_command_responses_total{{device="{device}",key="{key}",status="{status}"}} {count}')
+            lines.append("# HELP roku_command_errors_total ECP commands that failed without a reply, by exception.")
+            lines.append("# TYPE roku_command_errors_total counter")
+            for (device, key), series in self._keys.items():
+                for error, count in series.errors.items():
+                    lines.append(f'roku_command_errors_total{{device="{device}",key="{key}",error="{error}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        metrics = self.server.metrics
+        if self.path == "/metrics":
+            body, content_type = metrics.to_prometheus().encode(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = json.dumps(metrics.snapshot()).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+def serve_metrics(metrics, host="127.0.0.1", port=9464):
+    # serves /metrics (Prometheus text) and /metrics.json from a daemon thread;
+    # returns the server, stop it with shutdown()
+    server = http.server.ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    server.metrics = metrics
+    threading.Thread(target=server.serve_forever, name="roku-metrics", daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,306 @@
+import collections
+import logging
+import os
+import struct
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# session recordings: an append-only binary log of every ECP command a remote
+# sent (and, from the GUI, every button pressed), for reproducing field issues
+# and replaying real usage as load. the layout is
+#
+#   header   "RKREC\x01", float64 unix time the file was started
+#   "S"      uint16 id, uint16 length, UTF-8 text: defines a string once per file
+#   "E"      float64 unix time, uint16 device, action and key string ids,
+#            uint16 HTTP status (0: no reply), uint16 error name id (0: none),
+#            float32 seconds the command took
+#
+# little-endian throughout, so a keypress costs 23 bytes once its strings are
+# defined. typed characters (Lit_ keys) are recorded as plain "Lit" unless the
+# recorder is created with literals=True, so passwords and PINs entered with
+# the Type box never reach the disk; replays skip them. each file has its own string table; when one passes max_bytes it is
+# rotated to PATH.1, PATH.1 to PATH.2 and so on, keeping `backups` old files.
+
+MAGIC = b"RKREC\x01"
+HEADER = struct.Struct("<6sd")
+STRING = struct.Struct("<HH")
+EVENT = struct.Struct("<dHHHHHf")
+MAX_STRINGS = 0xFFFF
+
+# commands a replay re-sends; anything else (GUI button events) is context
+ECP_ACTIONS = ("keypress", "keydown", "keyup", "launch")
+
+# what a typed character is recorded as without literals=True
+REDACTED_LITERAL = "Lit"
+
+Record = collections.namedtuple("Record", "timestamp device action key status error elapsed")
+
+
+class SessionRecorder:
+    def __init__(self, path, max_bytes=4 * 1024 * 1024, backups=5, literals=False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.literals = literals  # keep the characters typed, not just that something was
+        self._lock = threading.Lock()
+        self._file = None
+        self._strings = {}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # every run starts a new file: appending to one a crashed run left
+        # half-written would leave the reader misaligned
+        if os.path.exists(path) and os.path.getsize(path):
+            self._rotate_files()
+        self._open()
+
+    def _open(self):
+        self._file = open(self.path, "wb")
+        self._file.write(HEADER.pack(MAGIC, time.time()))
+        self._strings = {}
+
+    def _rotate_files(self):
+        if self.backups <= 0:
+            os.unlink(self.path)
+            return
+        for index in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{index}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def _rotate(self):
+        self._file.close()
+        self._rotate_files()
+        self._open()
+
+    def _string_id(self, text):
+        string_id = self._strings.get(text)
+        if string_id is None:
+            string_id = self._strings[text] = len(self._strings) + 1
+            data = text.encode()[:0xFFFF]
+            self._file.write(b"S" + STRING.pack(string_id, len(data)) + data)
+        return string_id
+
+    def record(self, device, action, key, started, elapsed=0.0, status=None, error=None):
+        # error may be an exception or a short name
+        if error is not None and not isinstance(error, str):
+            error = type(error).__name__
+        if not self.literals and key.startswith("Lit_"):
+            key = REDACTED_LITERAL
+        with self._lock:
+            if self._file is None:
+                return
+            try:
+                if len(self._strings) > MAX_STRINGS - 4:
+                    self._rotate()
+                ids = (self._string_id(device), self._string_id(action), self._string_id(key))
+                error_id = self._string_id(error) if error else 0
+                self._file.write(b"E" + EVENT.pack(started, *ids, status or 0, error_id, elapsed))
+                # flushed per record so a crash loses nothing that was sent
+                self._file.flush()
+                if self._file.tell() >= self.max_bytes:
+                    self._rotate()
+            except OSError as e:
+                logger.warning(f"Stopped recording to {self.path}. Exception: {e}")
+                self._file.close()
+                self._file = None
+
+    def record_request(self, device, path, started, elapsed, status=None, error=None):
+        # path is the ECP path as sent, e.g. /keypress/Lit_a
+        action, _, key = path.lstrip("/").partition("/")
+        self.record(device, action, key, started, elapsed, status, error)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def iter_records(path):
+    # streams the records of one file without reading it all in. a record cut
+    # short by a crash ends the stream with a warning.
+    with open(path, "rb") as f:
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size or header[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a session recording")
+        strings = {0: None}
+        while True:
+            kind = f.read(1)
+            if not kind:
+                return
+            if kind == b"S":
+                head = f.read(STRING.size)
+                if len(head) < STRING.size:
+                    break
+                string_id, length = STRING.unpack(head)
+                data = f.read(length)
+                if len(data) < length:
+                    break
+                strings[string_id] = data.decode(errors="replace")
+            elif kind == b"E":
+                body = f.read(EVENT.size)
+                if len(body) < EVENT.size:
+                    break
+                started, device, action, key, status, error, elapsed = EVENT.unpack(body)
+                try:
+                    record = Record(started, strings[device], strings[action], strings[key], status or None,
+                                    strings[error], elapsed)
+                except KeyError:
+                    # refers to a string that was never written
+                    raise ValueError(f"{path} is corrupt at byte {f.tell() - EVENT.size - 1}") from None
+                yield record
+            else:
+                raise ValueError(f"{path} is corrupt at byte {f.tell() - 1}")
+    logger.warning(f"{path} ends in a partial record")
+
+
+def session_files(path):
+    # the rotated files of a recording, oldest first
+    older = []
+    index = 1
+    while os.path.exists(f"{path}.{index}"):
+        older.append(f"{path}.{index}")
+        index += 1
+    return [*reversed(older), *([path] if os.path.exists(path) else [])]
+
+
+def iter_session(path):
+    for name in session_files(path):
+        yield from iter_records(name)
+
+
+def replay(records, targets=None, speed=1.0, timeout=2, queue_size=256):
+    # re-sends the ECP commands in records, keeping their relative timing
+    # scaled by speed (2 is twice as fast, 0 as fast as possible). targets,
+    # a list of "ip:port", receives every command; by default each goes back
+    # to the device it was recorded against. returns a latency report.
+    import asyncio
+    return asyncio.run(_replay(records, targets, speed, timeout, queue_size))
+
+
+async def _replay(records, targets, speed, timeout, queue_size):
+    import asyncio
+    from roku_async import AsyncRokuRemote
+    from roku_stats import latency_summary
+
+    loop = asyncio.get_running_loop()
+    devices = {}  # "ip:port" -> [remote, queue, worker, latencies, lags, failures]
+
+    async def worker(remote, queue, latencies, lags, failures):
+        # one per device, so each TV gets its commands in recorded order
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            due, action, key = item
+            lags.append((loop.time() - due) * 1000)
+            start = time.perf_counter()
+            if await remote.send(action, key):
+                latencies.append((time.perf_counter() - start) * 1000)
+            else:
+                failures[0] += 1
+
+    def device(name):
+        entry = devices.get(name)
+        if entry is None:
+            ip, _, port = name.rpartition(":")
+            remote = AsyncRokuRemote(ip, int(port), timeout)
+            queue = asyncio.Queue(queue_size)
+            latencies, lags, failures = [], [], [0]
+            task = loop.create_task(worker(remote, queue, latencies, lags, failures))
+            entry = devices[name] = [remote, queue, task, latencies, lags, failures]
+        return entry
+
+    replayed = skipped = 0
+    first = last = None
+    start = loop.time()
+    try:
+        for record in records:
+            if record.action not in ECP_ACTIONS or record.key == REDACTED_LITERAL:
+                skipped += 1
+                continue
+            if first is None:
+                first = record.timestamp
+            last = record.timestamp
+            due = start + (record.timestamp - first) / speed if speed else loop.time()
+            delay = due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            for name in targets or [record.device]:
+                # a full queue means that TV is behind; waiting here keeps memory bounded
+                await device(name)[1].put((due, record.action, record.key))
+            replayed += 1
+        for entry in devices.values():
+            await entry[1].put(None)
+        await asyncio.gather(*(entry[2] for entry in devices.values()))
+    finally:
+        for entry in devices.values():
+            entry[2].cancel()
+            await entry[0].aclose()
+
+    all_latencies = [ms for entry in devices.values() for ms in entry[3]]
+    return {
+        "records": replayed,
+        "skipped": skipped,
+        "speed": speed,
+        "recorded_s": (last - first) if first is not None else 0.0,
+        "replay_s": loop.time() - start,
+        "latency": latency_summary(all_latencies, sum(entry[5][0] for entry in devices.values())),
+        "devices": {
+            name: {
+                "latency": latency_summary(entry[3], entry[5][0]),
+                "lag": latency_summary(entry[4]),
+            }
+            for name, entry in devices.items()
+        },
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Show or replay a session recorded with --record.")
+    parser.add_argument("log", type=str, help="Recording to read; rotated PATH.1, PATH.2, ... are read first")
+    parser.add_argument("--replay", action="store_true", help="Re-send the recorded commands and print a latency report as JSON")
+    parser.add_argument("--ip", type=str, nargs="*", default=[], metavar="IP[:PORT]",
+                        help="Send every command to these TVs instead of the ones they were recorded against")
+    parser.add_argument("--port", type=int, default=8060, help="Port for --ip addresses without one (default: 8060)")
+    parser.add_argument("--fake", type=int, nargs="?", const=1, default=0, metavar="N",
+                        help="Replay against N local fake TVs (default 1)")
+    parser.add_argument("--speed", type=str, default="1", help="Replay speed: 1 is real time, 10 ten times faster, max no waiting (default: 1)")
+    parser.add_argument("--timeout", type=float, default=2, help="Per-command timeout (default: 2 seconds)")
+    parser.add_argument("--output", type=str, help="Also write the replay report to this file")
+    parser.add_argument("--enable-logging", action="store_true", help="Enable logging")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.enable_logging else logging.CRITICAL)
+
+    if not args.replay:
+        for record in iter_session(args.log):
+            outcome = record.status if record.status is not None else (record.error or "-")
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record.timestamp))
+            print(f"{stamp}.{int(record.timestamp % 1 * 1000):03d}  {record.device}  {record.action} {record.key}  "
+                  f"{outcome}  {record.elapsed * 1000:.1f} ms")
+    else:
+        speed = 0.0 if args.speed == "max" else float(args.speed)
+        targets = [ip if ":" in ip else f"{ip}:{args.port}" for ip in args.ip]
+        fakes = []
+        if args.fake:
+            from roku_fake import FakeRokuServer
+            fakes = [FakeRokuServer().start() for _ in range(args.fake)]
+            targets += [f"{host}:{port}" for host, port in (fake.address for fake in fakes)]
+        try:
+            report = replay(iter_session(args.log), targets or None, speed, args.timeout)
+        finally:
+            for fake in fakes:
+                fake.stop()
+        text = json.dumps(report, indent=2)
+        print(text)
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(text + "\n")
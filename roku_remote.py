@@ -1,202 +1,331 @@
-import requests
+import contextlib
 import logging
-import socket
-import re
-import argparse 
+import time
+import urllib.parse
+
+import roku_health
+import roku_http
+import roku_keys
 
 logger = logging.getLogger(__name__)
 
 # https://developer.roku.com/docs/developer-program/dev-tools/external-control-api.md
 
 class RokuRemote:
-    def __init__(self, ip_address=None, port=8060, timeout=2):
+    def __init__(self, ip_address=None, port=8060, timeout=2, pool_size=4, idle_timeout=30, type_pacing=0.0,
+                 metrics=None, transport="http", failure_threshold=3, adaptive_timeout=True, recorder=None):
+        self.ip_address = ip_address
+        self.port = port
         self.base_url = f"http://{ip_address}:{port}" if ip_address else None
         self.timeout = timeout  # Add timeout attribute
+        self.type_pacing = type_pacing  # seconds between literals for apps that drop fast input
+        self.metrics = metrics  # a roku_metrics.CommandMetrics to time every key sent, or None
+        self.recorder = recorder  # a roku_record.SessionRecorder to log every command sent, or None
+
+        # keep-alive pool shared by every command this remote sends: "http" is
+        # roku_http on the standard library, "requests" needs the requests package
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.transport = transport
+        self.pool = self._make_pool() if ip_address else None
+        # every key request to this TV, encoded once; also rejects unknown keys
+        self.key_requests = roku_keys.KeyRequests(f"{ip_address}:{port}") if ip_address else None
+
+        # liveness and circuit breaker: after failure_threshold failures in a row
+        # (0 for never) requests fail fast until a background probe reaches the
+        # TV again. with adaptive_timeout, timeout is only the upper bound and
+        # the real ones follow the TV's round trip.
+        self.health = roku_health.DeviceHealth(
+            f"{ip_address}:{port}", timeout, failure_threshold, adaptive_timeout, probe=self._probe,
+        ) if ip_address else None
+
         if ip_address:
             logger.info(f"Initialized RokuRemote with IP: {ip_address} and port: {port}")
         else:
             logger.info("Initialized RokuRemote without IP address")
 
-    def send_command(self, command):
-        if not self.base_url:
-            logger.error("No IP address set for RokuRemote")
-            return
-        url = f"{self.base_url}/keypress/{command}"
+    def _make_pool(self):
+        if self.transport == "requests":
+            from roku_requests import RequestsPool
+            pool_class = RequestsPool
+        elif self.transport == "http":
+            pool_class = roku_http.HTTPPool
+        else:
+            raise ValueError(f"Unknown transport '{self.transport}'")
+        return pool_class(self.ip_address, self.port, self.timeout, self.pool_size, self.idle_timeout)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+        if self.health is not None:
+            self.health.close()
+
+    def _request(self, method, path, stream=False, timeout=None, raw=None):
+        # timeout=None reads the reply with the adaptive timeout; queries and
+        # launches, which can take a while on a busy TV, pass a fixed one.
+        # raw is the request already encoded, from key_requests.
+        recorder = self.recorder
+        if recorder is None or method != "POST":
+            return self._perform(method, path, stream, timeout, raw)
+        started = time.time()
+        start = time.perf_counter()
         try:
-            response = requests.post(url, timeout=self.timeout)  # Add timeout parameter
-            if response.status_code == 200:
-                logger.info(f"Command '{command}' sent successfully.")
-            else:
-                logger.error(f"Failed to send command '{command}'. Status code: {response.status_code}")
-        except requests.exceptions.RequestException as e:
-            logger.warning(f"Failed to send command '{command}'. Exception: {e}")
-
-    def power_on(self):
-        logger.info("Power On command called")
-        self.send_command("powerOn")
-
-    def power_off(self):
-        logger.info("Power Off command called")
-        self.send_command("PowerOff")
-
-    def keyup(self):
-        logger.info("Key Up command called")
-        self.send_command("keyup")
-
-    def volume_up(self):
-        logger.info("Volume Up command called")
-        self.send_command("VolumeUp")
-
-    def volume_down(self):
-        logger.info("Volume Down command called")
-        self.send_command("VolumeDown")
-
-    def volume_mute(self):
-        logger.info("Volume Mute command called")
-        self.send_command("VolumeMute")
-
-    def home(self):
-        logger.info("Home command called")
-        self.send_command("Home")
-
-    def back(self):
-        logger.info("Back command called")
-        self.send_command("Back")
-
-    def select(self):
-        logger.info("Select command called")
-        self.send_command("Select")
-
-    def up(self):
-        logger.info("Up command called")
-        self.send_command("Up")
-
-    def down(self):
-        logger.info("Down command called")
-        self.send_command("Down")
-
-    def left(self):
-        logger.info("Left command called")
-        self.send_command("Left")
-
-    def right(self):
-        logger.info("Right command called")
-        self.send_command("Right")
-
-    def play(self):
-        logger.info("Play command called")
-        self.send_command("Play")
-
-    def pause(self):
-        logger.info("Pause command called")
-        self.send_command("Pause")
-
-    def rewind(self):
-        logger.info("Rewind command called")
-        self.send_command("Rev")
-
-    def fast_forward(self):
-        logger.info("Fast Forward command called")
-        self.send_command("Fwd")
-
-    def info(self):
-        logger.info("Info command called")
-        self.send_command("Info")
-
-    def instant_replay(self):
-        logger.info("Instant Replay command called")
-        self.send_command("InstantReplay")
-
-    def backspace(self):
-        logger.info("Backspace command called")
-        self.send_command("Backspace")
-
-    def search(self):
-        logger.info("Search command called")
-        self.send_command("Search")
-
-    def enter(self):
-        logger.info("Enter command called")
-        self.send_command("Enter")
-
-    def find_remote(self):
-        logger.info("Find Remote command called")
-        self.send_command("FindRemote")
-
-    def channel_up(self):
-        logger.info("Channel Up command called")
-        self.send_command("ChannelUp")
-
-    def channel_down(self):
-        logger.info("Channel Down command called")
-        self.send_command("ChannelDown")
-
-    def input_tuner(self):
-        logger.info("Input Tuner command called")
-        self.send_command("InputTuner")
-
-    def input_hdmi1(self):
-        logger.info("Input HDMI1 command called")
-        self.send_command("InputHDMI1")
-
-    def input_hdmi2(self):
-        logger.info("Input HDMI2 command called")
-        self.send_command("InputHDMI2")
-
-    def input_hdmi3(self):
-        logger.info("Input HDMI3 command called")
-        self.send_command("InputHDMI3")
+            response = self._perform(method, path, stream, timeout, raw)
+        except roku_http.ERRORS as e:
+            recorder.record_request(f"{self.ip_address}:{self.port}", path, started, time.perf_counter() - start,
+                                    error=e)
+            raise
+        recorder.record_request(f"{self.ip_address}:{self.port}", path, started, time.perf_counter() - start,
+                                response.status_code)
+        return response
+
+    def _perform(self, method, path, stream, timeout, raw):
+        health = self.health
+        if not health.allow():
+            raise health.unavailable()
+        roku_http.phases.connect = 0.0
+        start = time.perf_counter()
+        try:
+            response = self.pool.request(method, path, stream, health.connect_timeout(),
+                                         health.timeout() if timeout is None else timeout, raw)
+        except roku_http.ERRORS as e:
+            health.record_failure(e)
+            raise
+        health.record_success(time.perf_counter() - start if timeout is None else None, roku_http.phases.connect)
+        return response
+
+    def _probe(self):
+        # any reply on a fresh connection means the TV is back
+        roku_http.request_once(self.ip_address, self.port, "GET", "/", self.timeout)
 
-    def input_hdmi4(self):
-        logger.info("Input HDMI4 command called")
-        self.send_command("InputHDMI4")
+    def send_command(self, command):
+        return self._send_key("keypress", command)
 
-    def input_av1(self):
-        logger.info("Input AV1 command called")
-        self.send_command("InputAV1")
+    def key_down(self, key):
+        # starts holding key until key_up; the TV repeats it as a held remote button would
+        return self._send_key("keydown", key)
 
-    @staticmethod
-    def discover_roku_tvs():
-        logger.info("Discovering Roku TVs on the network...")
-        ssdp_request = (
-            "M-SEARCH * HTTP/1.1\r\n"
-            "HOST: 239.255.255.250:1900\r\n"
-            "MAN: \"ssdp:discover\"\r\n"
-            "MX: 1\r\n"
-            "ST: roku:ecp\r\n"
-            "\r\n"
-        )
-        ssdp_address = ("239.255.255.250", 1900)
-
-        # Create a UDP socket
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
-        sock.settimeout(5)
+    def key_up(self, key):
+        return self._send_key("keyup", key)
 
+    def _send_key(self, action, command, timeout=None):
+        # hot path: log arguments are only formatted when the level is enabled
+        if not self.base_url:
+            logger.error("No IP address set for RokuRemote")
+            return False
+        if action == "launch":
+            path, raw = f"/launch/{command}", None
+        else:
+            # an unknown key raises roku_keys.UnknownKey here, before anything is sent
+            command, path, raw = self.key_requests.get(action, command)
+        metrics = self.metrics
+        if metrics is not None:
+            roku_http.phases.connect = 0.0
+            started = time.time()
+            start = time.perf_counter()
+        status = error = None
         try:
-            sock.sendto(ssdp_request.encode(), ssdp_address)
-        except OSError as e:
-            logger.warning(f"Failed to send SSDP request. Exception: {e}")
-            return []
-
-        roku_tvs = []
+            status = self._request("POST", path, timeout=timeout, raw=raw).status_code
+        except roku_http.ERRORS as e:
+            error = e
+            logger.warning("Failed to send command '%s' (%s). Exception: %s", command, action, e)
+        if metrics is not None:
+            metrics.record(f"{self.ip_address}:{self.port}", action, command, started, time.perf_counter() - start,
+                           roku_http.phases.connect, status, error)
+        if status in (200, 204):
+            logger.info("Command '%s' (%s) sent successfully.", command, action)
+            return True
+        if status is not None:
+            logger.error("Failed to send command '%s' (%s). Status code: %s", command, action, status)
+        return False
+
+    def iter_query(self, path, chunk_size=1024):
+        # streams the body of a GET so callers can parse it as it arrives.
+        # raises one of roku_http.ERRORS on failure.
+        if not self.base_url:
+            raise ValueError("No IP address set for RokuRemote")
+        response = self._request("GET", path, stream=True, timeout=self.timeout)
+        with response:
+            response.raise_for_status()
+            yield from response.iter_content(chunk_size)
+
+    def query(self, endpoint):
+        # fresh answer from one of roku_state.ENDPOINTS as a flat dict, e.g.
+        # query("device-info")["power-mode"]; see roku_state.StateCache for caching
+        import roku_state
+        return roku_state.parse_chunks(self.iter_query(roku_state.ENDPOINTS[endpoint][0]))
+
+    def query_device_info(self):
+        return self.query("device-info")
+
+    def query_active_app(self):
+        return self.query("active-app")
+
+    def query_media_player(self):
+        return self.query("media-player")
+
+    def query_apps(self):
+        # installed channels as [{"id", "type", "version", "name"}]
+        import roku_state
+        return roku_state.parse_apps(self.iter_query("/query/apps"))
+
+    def query_icon(self, app_id):
+        # a channel's icon image (usually PNG) as bytes
+        return b"".join(self.iter_query(f"/query/icon/{urllib.parse.quote(str(app_id), safe='')}"))
+
+    def launch(self, app_id, **params):
+        # starts a channel by id, e.g. launch("12") or launch("12", contentId="...", mediaType="movie")
+        command = urllib.parse.quote(str(app_id), safe="")
+        if params:
+            command += "?" + urllib.parse.urlencode(params)
+        return self._send_key("launch", command, timeout=self.timeout)
+
+    def type_text(self, text, pacing=None, pipeline=False):
+        # sends text as Lit_ keypresses in order and returns how many characters
+        # the TV acknowledged
+        if not self.base_url:
+            logger.error("No IP address set for RokuRemote")
+            return 0
+        pacing = self.type_pacing if pacing is None else pacing
+        requests = [self.key_requests.get("keypress", roku_keys.literal(char)) for char in text]
+        acknowledged = 0
+        if pipeline and not pacing and requests and self.health.available and hasattr(self.pool, "pipeline"):
+            acknowledged, complete = self._pipeline(requests)
+            if complete:
+                logger.info("Typed %d/%d characters (pipelined)", acknowledged, len(requests))
+                return acknowledged
+        for command, _, _ in requests[acknowledged:]:
+            if pacing and acknowledged:
+                time.sleep(pacing)
+            if not self._send_key("keypress", command):
+                break
+            acknowledged += 1
+        logger.info("Typed %d/%d characters", acknowledged, len(requests))
+        return acknowledged
+
+    def _pipeline(self, requests):
+        # writes every request (from key_requests) on one pooled connection
+        # before reading any response. returns (acknowledged, complete):
+        # complete is False only when the TV announced it was closing the
+        # connection, in which case the requests after the acknowledged ones
+        # were never processed and may be resent.
+        health = self.health
+        if not health.allow():
+            return 0, False
+        host = f"{self.ip_address}:{self.port}"
+        metrics = self.metrics
+        recorder = self.recorder
+        acknowledged = 0
+        roku_http.phases.connect = 0.0
+        started = time.time()
+        start = time.perf_counter()
+        complete = True
         try:
-            while True:
-                data, addr = sock.recvfrom(1024)
-                if "roku:ecp" in data.decode():
-                    ip_address = re.search(r"LOCATION: http://(.*):8060/", data.decode()).group(1)
-                    roku_tvs.append(ip_address)
-                    logger.info(f"Found Roku TV at IP: {ip_address}")
-        except socket.timeout:
-            logger.info("Discovery completed.")
+            batch = self.pool.pipeline([raw for _, _, raw in requests], health.connect_timeout(), health.timeout())
+            with contextlib.closing(batch):
+                # batch first: zip then runs it to its end, which returns the connection
+                for (status, keep_alive), (command, path, _) in zip(batch, requests):
+                    # each reply is timed from the start of the batch
+                    elapsed = time.perf_counter() - start
+                    if metrics is not None:
+                        metrics.record(host, "keypress", command, started, elapsed, roku_http.phases.connect, status)
+                    if recorder is not None:
+                        recorder.record_request(host, path, started, elapsed, status)
+                    if status not in (200, 204):
+                        logger.error("Failed to send '%s'. Status code: %s", path, status)
+                        break
+                    acknowledged += 1
+                    if not keep_alive:
+                        complete = acknowledged == len(requests)
+                        break
+        except roku_http.ERRORS as e:
+            health.record_failure(e)
+            command, path, _ = requests[acknowledged]
+            elapsed = time.perf_counter() - start
+            if metrics is not None:
+                metrics.record(host, "keypress", command, started, elapsed, roku_http.phases.connect, error=e)
+            if recorder is not None:
+                recorder.record_request(host, path, started, elapsed, error=e)
+            # a socket error or a garbled reply (HTTPException) alike: the whole
+            # batch is already on the wire, so resending any of it could press
+            # a key twice. the caller gets the count the TV confirmed.
+            logger.warning("Pipelined send failed after %d requests. Exception: %s", acknowledged, e)
+            return acknowledged, True
+        # one sample for the whole batch would skew the round-trip estimate
+        health.record_success(None, roku_http.phases.connect)
+        return acknowledged, complete
 
-        return roku_tvs
+    @staticmethod
+    def discover_roku_tvs(timeout=2.0, cache=True, **kwargs):
+        # IP addresses of the Roku TVs that answer SSDP; see roku_discovery for
+        # streaming results, the on-disk device cache and the other options
+        import roku_discovery
+        logger.info("Discovering Roku TVs on the network...")
+        devices = roku_discovery.discover_devices(
+            timeout, cache=roku_discovery.DeviceCache() if cache else None, **kwargs)
+        return list(dict.fromkeys(device.ip for device in devices))
+
+
+# home(), volume_up(), input_hdmi1() and the rest, one per roku_keys.KEYS entry
+roku_keys.add_key_methods(RokuRemote)
+
+
+def compare_latency(remote, samples=20):
+    # times the same harmless query with a fresh connection per request (the old
+    # requests.post behaviour) and over the remote's keep-alive pool
+    import statistics
+    path = "/query/device-info"
+
+    def timed(fn):
+        times = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            fn()
+            times.append((time.perf_counter() - start) * 1000)
+        return times
+
+    cold = timed(lambda: roku_http.request_once(remote.ip_address, remote.port, "GET", path, remote.timeout))
+    remote._request("GET", path)  # warm the pool before measuring it
+    warm = timed(lambda: remote._request("GET", path))
+    return {
+        name: {
+            "median_ms": statistics.median(times),
+            "mean_ms": statistics.mean(times),
+            "max_ms": max(times),
+        }
+        for name, times in (("new_connection", cold), ("keep_alive", warm))
+    }
 
 if __name__ == "__main__":
+    import argparse
+    import roku_discovery
+    import roku_state
+
     parser = argparse.ArgumentParser(description="Control a Roku TV using ECP-based commands.")
     parser.add_argument("--ip", type=str, help="IP address of the Roku TV")
     parser.add_argument("--port", type=int, default=8060, help="Port of the Roku TV (default: 8060)")
-    parser.add_argument("--timeout", type=int, default=2, help="Timeout for requests (default: 2 seconds)")
+    parser.add_argument("--timeout", type=float, default=2, help="Timeout for requests (default: 2 seconds)")
+    parser.add_argument("--pool-size", type=int, default=4, help="Max keep-alive connections to the TV (default: 4)")
+    parser.add_argument("--transport", choices=["http", "requests"], default="http",
+                        help="HTTP client: the built-in http.client one, or the requests package if installed (default: http)")
+    parser.add_argument("--idle-timeout", type=float, default=30, help="Drop pooled connections idle this long (default: 30 seconds)")
+    parser.add_argument("--failure-threshold", type=int, default=3,
+                        help="Fail fast after this many failures in a row until the TV answers a probe; 0 never does (default: 3)")
+    parser.add_argument("--fixed-timeout", action="store_true", help="Always wait the full --timeout instead of adapting to the TV's round trip")
+    parser.add_argument("--compare-latency", type=int, metavar="N", help="Compare new-connection vs keep-alive latency over N requests")
     parser.add_argument("--demo", action="store_true", help="Run example commands")
+    parser.add_argument("--query", choices=sorted(roku_state.ENDPOINTS), help="Print the TV's answer to an ECP query")
+    parser.add_argument("--type", type=str, metavar="TEXT", help="Type TEXT into the active text field")
+    parser.add_argument("--type-pacing", type=float, default=0.0, help="Seconds to wait between typed characters (default: 0)")
+    parser.add_argument("--pipeline", action="store_true", help="Pipeline typed characters on one connection")
+    parser.add_argument("--discover", action="store_true", help="List Roku TVs on the network as they answer")
+    parser.add_argument("--discover-timeout", type=float, default=2.0, help="How long discovery listens for answers (default: 2 seconds)")
+    parser.add_argument("--scan", type=str, nargs="*", metavar="CIDR", help="Find TVs by probing every host in CIDR (default: local /24 subnets) when multicast is blocked")
+    parser.add_argument("--daemon", action="store_true", help="Stay resident and take commands from roku_client.py over a Unix socket")
+    parser.add_argument("--socket", type=str, help="Control socket path for --daemon (default: $XDG_RUNTIME_DIR/simple-remote.sock)")
+    parser.add_argument("--metrics", action="store_true", help="Time every command and print the metrics as JSON at the end")
+    parser.add_argument("--record", type=str, metavar="PATH", help="Record every command sent to PATH (see roku_record.py)")
+    parser.add_argument("--record-literals", action="store_true", help="Also record the characters typed; by default they are redacted")
     parser.add_argument("--enable-logging", action="store_true", help="Enable logging")
     args = parser.parse_args()
 
@@ -205,40 +334,79 @@ if __name__ == "__main__":
     else:
         logging.basicConfig(level=logging.CRITICAL)
 
-    if args.ip:
-        remote = RokuRemote(args.ip, args.port, args.timeout)
+    metrics = None
+    if args.metrics:
+        import json
+        import roku_metrics
+        metrics = roku_metrics.CommandMetrics()
+
+    if args.discover:
+        found = []
+        for device in roku_discovery.iter_discover(args.discover_timeout):
+            print(f"{device.ip}:{device.port}  {device.usn}")
+            found.append(device)
+        roku_discovery.DeviceCache().update(found)
+    if args.scan is not None:
+        subnets = args.scan or roku_discovery.local_subnets()
+        start = time.perf_counter()
+        scanned = roku_discovery.scan_subnet(subnets, args.port, cache=roku_discovery.DeviceCache())
+        for device in scanned:
+            print(f"{device.ip}:{device.port}  {device.usn}")
+        print(f"Scanned {', '.join(subnets)} in {time.perf_counter() - start:.2f}s")
+    elif not args.ip and args.scan is None:
+        # no address given: start on the last TV we saw, or the first to answer
+        device = roku_discovery.pick_device(timeout=args.discover_timeout)
+        if device:
+            logger.info(f"Using Roku TV at {device.ip}:{device.port}")
+            args.ip, args.port = device.ip, device.port
+
+    recorder = None
+    if args.record:
+        from roku_record import SessionRecorder
+        recorder = SessionRecorder(args.record, literals=args.record_literals)
+
+    if args.daemon:
+        import roku_daemon
+        daemon = roku_daemon.RokuDaemon(args.ip, args.port, args.socket, args.timeout, args.pool_size,
+                                        args.idle_timeout, args.type_pacing, args.pipeline, args.transport,
+                                        args.failure_threshold, not args.fixed_timeout, recorder).start()
+        print(f"Listening on {daemon.socket_path}" + (f", default TV {args.ip}:{args.port}" if args.ip else ""))
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    elif args.ip:
+        remote = RokuRemote(args.ip, args.port, args.timeout, args.pool_size, args.idle_timeout, args.type_pacing,
+                            metrics, args.transport, args.failure_threshold, not args.fixed_timeout, recorder)
+        if args.query:
+            try:
+                for name, value in remote.query(args.query).items():
+                    print(f"{name}: {value}")
+            except roku_http.ERRORS as e:
+                print(f"Query failed: {e}")
+        if args.type:
+            typed = remote.type_text(args.type, pipeline=args.pipeline)
+            print(f"Typed {typed}/{len(args.type)} characters")
+        if args.compare_latency:
+            try:
+                results = compare_latency(remote, args.compare_latency)
+            except roku_http.ERRORS as e:
+                print(f"Latency comparison failed: {e}")
+            else:
+                for name, stats in results.items():
+                    print(f"{name:>15}: median {stats['median_ms']:.1f} ms, "
+                          f"mean {stats['mean_ms']:.1f} ms, max {stats['max_ms']:.1f} ms")
         if args.demo:
-            # Example commands
-            remote.power_on()
-            remote.power_off()
-            remote.keyup()
-            remote.volume_up()
-            remote.volume_down()
-            remote.volume_mute()
-            remote.home()
-            remote.back()
-            remote.select()
-            remote.up()
-            remote.down()
-            remote.left()
-            remote.right()
-            remote.play()
-            remote.pause()
-            remote.rewind()
-            remote.fast_forward()
-            remote.info()
-            remote.instant_replay()
-            remote.backspace()
-            remote.search()
-            remote.enter()
-            remote.find_remote()
-            remote.channel_up()
-            remote.channel_down()
-            remote.input_tuner()
-            remote.input_hdmi1()
-            remote.input_hdmi2()
-            remote.input_hdmi3()
-            remote.input_hdmi4()
-            remote.input_av1()
+            # Example commands, run through the script engine (see roku_script.DEMO_SCRIPT)
+            import roku_script
+            report = roku_script.run_script(roku_script.DEMO_SCRIPT, [args.ip], args.port, args.timeout,
+                                            metrics=metrics)
+            print(report.summary())
+        if metrics is not None:
+            print(json.dumps(metrics.snapshot(), indent=2))
     else:
-        logger.error("No IP address provided. Use --ip to specify the IP address.")
+        if not args.discover and args.scan is None:
+            logger.error("No IP address provided and no Roku TV found. Use --ip to specify the IP address.")
+
+    if recorder is not None:
+        recorder.close()
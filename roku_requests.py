@@ -0,0 +1,84 @@
+import logging
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool
+from urllib3.exceptions import NewConnectionError
+
+from roku_http import ConnectFailed, phases
+
+logger = logging.getLogger(__name__)
+
+# the optional requests-based transport, RokuRemote(transport="requests").
+# same interface as roku_http.HTTPPool, down to the exceptions: connect
+# failures are raised as roku_http.ConnectFailed and read timeouts as
+# TimeoutError. only imported when asked for.
+
+
+class _TimedConnection(HTTPConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        phases.connect = getattr(phases, "connect", 0.0) + time.perf_counter() - start
+
+
+class _TimedConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {**self.poolmanager.pool_classes_by_scheme,
+                                                   "http": _TimedConnectionPool}
+
+
+class RequestsPool:
+    # keep-alive pool shared by every command a remote sends. the ECP server
+    # drops idle sockets on its own, so connections unused for idle_timeout
+    # seconds are thrown away instead of being reused and failing. requests
+    # are never retried, as with roku_http.HTTPPool.
+    def __init__(self, host, port=8060, timeout=2, pool_size=4, idle_timeout=30):
+        self.base_url = f"http://{host}:{port}"
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.session = requests.Session()
+        self.session.mount("http://", _TimedAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self._last_used = None
+
+    def close(self):
+        self.session.close()
+        self._last_used = None
+
+    def request(self, method, path, stream=False, connect_timeout=None, timeout=None, raw=None):
+        # raw, the prebuilt request HTTPPool can send as is, is ignored: requests
+        # always formats its own
+        try:
+            return self._request(method, path, stream, (
+                self.timeout if connect_timeout is None else connect_timeout,
+                self.timeout if timeout is None else timeout,
+            ))
+        except requests.exceptions.ConnectTimeout as e:
+            raise ConnectFailed(f"Can't connect to {self.base_url}: {e}") from e
+        except requests.exceptions.ReadTimeout as e:
+            raise TimeoutError(str(e)) from e
+        except requests.exceptions.ConnectionError as e:
+            reason = getattr(e.args[0], "reason", None) if e.args else None
+            if isinstance(reason, NewConnectionError):
+                raise ConnectFailed(f"Can't connect to {self.base_url}: {e}") from e
+            raise
+
+    def _request(self, method, path, stream, timeout):
+        now = time.monotonic()
+        if self._last_used is not None and now - self._last_used > self.idle_timeout:
+            logger.debug("Pooled connections idle too long, reconnecting")
+            self.close()
+        # no retry here: once a request is written, a failure can't tell us
+        # whether the TV acted on it, and resending would double a keypress.
+        # urllib3 already checks each pooled socket for EOF when it is checked
+        # out, so one the TV closed while idle is replaced before anything is sent.
+        response = self.session.request(method, f"{self.base_url}{path}", timeout=timeout, stream=stream)
+        self._last_used = time.monotonic()
+        return response
@@ -0,0 +1,287 @@
+import asyncio
+import logging
+import re
+import shlex
+import time
+
+import roku_keys
+import roku_state
+from roku_async import DeviceResult, FleetReport, HTTPError, RokuFleet
+
+logger = logging.getLogger(__name__)
+
+# a script is one statement per line; # starts a comment and blocks close with "end".
+#
+#   target 192.168.1.20 192.168.1.21    devices to run on (the CLI can add more)
+#   key Home Down Down                  keypresses, in order
+#   text "my password"                  typed as Lit_ keypresses
+#   wait 1.5  /  wait 500ms             pause once the keys before it are acknowledged
+#   repeat 3 ... end                    loop
+#   if app Netflix ... else ... end     branch on the active app's name or id
+#   if not app tvinput.hdmi1 ... end
+#
+# scripts are compiled once into a flat list of instructions:
+#   ("keys", [key, ...])          send keys back to back
+#   ("wait", seconds)
+#   ("counter", slot, n, end)     start a repeat; jump to end when n <= 0
+#   ("loop", slot, start)         decrement a repeat counter; jump to start while > 0
+#   ("branch", negate, app, to)   jump to `to` unless the active app matches (xor negate)
+#   ("jump", to)
+
+DEMO_SCRIPT = """
+# the RokuRemote convenience commands (roku_keys.KEYS) but the Power toggle
+key PowerOn PowerOff VolumeUp VolumeDown VolumeMute Home Back Select
+key Up Down Left Right Play Pause Rev Fwd Info InstantReplay Backspace Search
+key Enter FindRemote ChannelUp ChannelDown InputTuner InputHDMI1 InputHDMI2
+key InputHDMI3 InputHDMI4 InputAV1
+"""
+
+
+class ScriptError(Exception):
+    def __init__(self, message, line=None):
+        super().__init__(f"line {line}: {message}" if line else message)
+        self.line = line
+
+
+class Program:
+    def __init__(self, instructions, targets):
+        self.instructions = instructions
+        self.targets = targets
+
+    def __repr__(self):
+        return f"Program({len(self.instructions)} instructions, targets={self.targets})"
+
+
+def _parse_duration(token, line):
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)(ms|s)?", token)
+    if not match:
+        raise ScriptError(f"bad duration '{token}'", line)
+    value = float(match.group(1))
+    return value / 1000 if match.group(2) == "ms" else value
+
+
+def compile_script(source):
+    instructions = []
+    targets = []
+    labels = set()  # instruction indexes something jumps to
+    blocks = []  # open repeat/if blocks: [kind, line, data]
+
+    def emit_keys(keys):
+        # consecutive keys share one instruction (and one pipelined batch) unless
+        # a jump lands between them
+        if instructions and instructions[-1][0] == "keys" and len(instructions) not in labels:
+            instructions[-1][1].extend(keys)
+        else:
+            instructions.append(("keys", list(keys)))
+
+    def label():
+        labels.add(len(instructions))
+        return len(instructions)
+
+    for number, raw in enumerate(source.splitlines(), 1):
+        try:
+            tokens = shlex.split(raw, comments=True)
+        except ValueError as e:
+            raise ScriptError(str(e), number)
+        if not tokens:
+            continue
+        op, args = tokens[0].lower(), tokens[1:]
+
+        if op == "target":
+            if not args:
+                raise ScriptError("target needs at least one address", number)
+            targets.extend(args)
+        elif op == "key":
+            if not args:
+                raise ScriptError("key needs at least one key name", number)
+            try:
+                keys = [roku_keys.canonical(key) for key in args]
+            except roku_keys.UnknownKey as e:
+                raise ScriptError(str(e), number)
+            emit_keys(keys)
+        elif op == "text":
+            if len(args) != 1:
+                raise ScriptError("text takes one (quoted) argument", number)
+            emit_keys(roku_keys.literal(char) for char in args[0])
+        elif op == "wait":
+            if len(args) != 1:
+                raise ScriptError("wait takes one duration", number)
+            instructions.append(("wait", _parse_duration(args[0], number)))
+        elif op == "repeat":
+            if len(args) != 1 or not args[0].isdigit():
+                raise ScriptError("repeat takes a count", number)
+            slot = sum(1 for block in blocks if block[0] == "repeat")
+            instructions.append(["counter", slot, int(args[0]), None])
+            blocks.append(["repeat", number, (len(instructions) - 1, slot, label())])
+        elif op == "if":
+            negate = bool(args) and args[0] == "not"
+            if negate:
+                args = args[1:]
+            if len(args) != 2 or args[0] != "app":
+                raise ScriptError("expected 'if [not] app NAME'", number)
+            instructions.append(["branch", negate, args[1], None])
+            blocks.append(["if", number, len(instructions) - 1])
+        elif op == "else":
+            if not blocks or blocks[-1][0] != "if":
+                raise ScriptError("else without if", number)
+            instructions.append(["jump", None])
+            branch = blocks[-1][2]
+            instructions[branch][3] = label()
+            blocks[-1] = ["else", number, len(instructions) - 1]
+        elif op == "end":
+            if not blocks:
+                raise ScriptError("end without repeat or if", number)
+            kind, _, data = blocks.pop()
+            if kind == "repeat":
+                counter, slot, start = data
+                instructions.append(("loop", slot, start))
+                instructions[counter][3] = label()
+            elif kind == "if":
+                instructions[data][3] = label()
+            else:
+                instructions[data][1] = label()
+        else:
+            raise ScriptError(f"unknown statement '{tokens[0]}'", number)
+
+    if blocks:
+        raise ScriptError(f"{blocks[-1][0]} is never closed", blocks[-1][1])
+    return Program([tuple(i) for i in instructions], targets)
+
+
+class _DeviceRun:
+    # executes a Program against one device
+    def __init__(self, program, remote, pipeline):
+        self.program = program
+        self.remote = remote
+        self.pipeline = pipeline
+        self.sent = 0
+        self._app = None  # (fetched_at, active-app dict)
+
+    async def active_app(self):
+        ttl = roku_state.ENDPOINTS["active-app"][1]
+        if self._app is None or time.monotonic() - self._app[0] > ttl:
+            self._app = (time.monotonic(), await self.remote.query("active-app"))
+        return self._app[1]
+
+    async def run(self):
+        instructions = self.program.instructions
+        counters = {}
+        pc = 0
+        while pc < len(instructions):
+            op = instructions[pc]
+            kind = op[0]
+            if kind == "keys":
+                acknowledged = await self.remote.send_commands(op[1], self.pipeline)
+                self.sent += acknowledged
+                if acknowledged < len(op[1]):
+                    return f"stopped after {self.sent} keys: '{op[1][acknowledged]}' failed"
+            elif kind == "wait":
+                # timed from the previous keys' acknowledgement, however long
+                # they took, so the TV always gets the full wait after them
+                await asyncio.sleep(op[1])
+            elif kind == "counter":
+                counters[op[1]] = op[2]
+                if op[2] <= 0:
+                    pc = op[3]
+                    continue
+            elif kind == "loop":
+                counters[op[1]] -= 1
+                if counters[op[1]] > 0:
+                    pc = op[2]
+                    continue
+            elif kind == "branch":
+                try:
+                    app = await self.active_app()
+                except (OSError, asyncio.TimeoutError, HTTPError) as e:
+                    return f"active-app query failed: {e!r}"
+                wanted = op[2].lower()
+                matched = wanted in (app.get("app", "").lower(), app.get("app_id", "").lower())
+                if matched == op[1]:
+                    pc = op[3]
+                    continue
+            elif kind == "jump":
+                pc = op[1]
+                continue
+            pc += 1
+        return None
+
+
+async def run_program(program, fleet, pipeline=True):
+    # runs the program on every device in the fleet at once and reports per
+    # device whether it ran to the end
+    limit = asyncio.Semaphore(fleet.concurrency)
+
+    async def run(ip, remote):
+        async with limit:
+            start = time.perf_counter()
+            device_run = _DeviceRun(program, remote, pipeline)
+            error = await device_run.run()
+            return DeviceResult(ip, error is None, time.perf_counter() - start, error)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(run(ip, remote) for ip, remote in fleet.remotes.items()))
+    report = FleetReport("script", results, time.perf_counter() - start)
+    logger.info(report.summary())
+    return report
+
+
+def run_script(source, ip_addresses=(), port=8060, timeout=2, concurrency=32, pipeline=True, metrics=None):
+    # compiles and runs a script on the given devices plus its own targets
+    program = compile_script(source)
+    ips = list(dict.fromkeys([*ip_addresses, *program.targets]))
+    if not ips:
+        raise ScriptError("no devices to run on; add a target line or pass addresses")
+
+    async def main():
+        async with RokuFleet(ips, port, timeout, concurrency, metrics=metrics) as fleet:
+            return await run_program(program, fleet, pipeline)
+
+    return asyncio.run(main())
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    from roku_metrics import CommandMetrics
+    from roku_remote import RokuRemote
+
+    parser = argparse.ArgumentParser(description="Run a Roku remote script on one or more TVs.")
+    parser.add_argument("script", type=str, help="Script file to run")
+    parser.add_argument("--ip", type=str, nargs="*", default=[], help="IP addresses of the Roku TVs, in addition to the script's targets")
+    parser.add_argument("--discover", action="store_true", help="Also run on every Roku TV found via SSDP discovery")
+    parser.add_argument("--port", type=int, default=8060, help="Port of the Roku TVs (default: 8060)")
+    parser.add_argument("--timeout", type=float, default=2, help="Per-request timeout (default: 2 seconds)")
+    parser.add_argument("--concurrency", type=int, default=32, help="Max devices run at once (default: 32)")
+    parser.add_argument("--no-pipeline", action="store_true", help="Send keys one request at a time")
+    parser.add_argument("--check", action="store_true", help="Only compile the script and print its instructions")
+    parser.add_argument("--metrics", action="store_true", help="Print per-device command latency as JSON at the end")
+    parser.add_argument("--enable-logging", action="store_true", help="Enable logging")
+    args = parser.parse_args()
+
+    if args.enable_logging:
+        logging.basicConfig(level=logging.INFO)
+    else:
+        logging.basicConfig(level=logging.CRITICAL)
+
+    with open(args.script) as f:
+        source = f.read()
+
+    try:
+        if args.check:
+            program = compile_script(source)
+            for index, instruction in enumerate(program.instructions):
+                print(f"{index:4} {instruction}")
+        else:
+            ips = list(args.ip)
+            if args.discover:
+                ips += RokuRemote.discover_roku_tvs()
+            metrics = CommandMetrics() if args.metrics else None
+            report = run_script(source, ips, args.port, args.timeout, args.concurrency, not args.no_pipeline, metrics)
+            print(report.summary())
+            for result in report.results:
+                if not result.ok:
+                    print(f"  {result.ip_address}: {result.error}")
+            if metrics is not None:
+                print(json.dumps(metrics.snapshot(), indent=2))
+    except ScriptError as e:
+        print(f"Script error: {e}")
@@ -0,0 +1,125 @@
+import collections
+import logging
+import time
+
+from roku_state import StateCache, StatePoller
+
+logger = logging.getLogger(__name__)
+
+# warm per-TV sessions behind the GUI's device switcher. each session keeps its
+# own remote (and so its pooled connections), state cache and poller, and the
+# bits of UI state that belong to a TV rather than the window, so switching is
+# a pointer swap and the next frame draws from what's already cached.
+
+
+class DeviceSession:
+    def __init__(self, name, remote, on_state_change=None, on_health_change=None):
+        self.name = name  # "ip:port", also the dispatcher and key holder's device key
+        self.remote = remote
+        self.state = StateCache(remote)
+        self.poller = StatePoller(self.state, on_change=self._state_changed)
+        self.on_state_change = on_state_change
+        self.last_used = time.monotonic()
+
+        # remotes without health (the daemon's) report no state
+        self.health = getattr(remote, "health", None)
+        self.health_state = None
+        self._health_listener = None
+        if self.health is not None:
+            self.health_state = self.health.state
+            if on_health_change is not None:
+                self._health_listener = self.health.add_listener(lambda health: on_health_change(self, health))
+
+        # what the window shows for this TV
+        self.app_text = ""
+        self.current_input_index = 0
+        self.power_on = False  # only used until the TV has reported its power mode
+        self.apps = None  # the launcher's channel list, once loaded
+        self.apps_loading = False
+        self.started = False
+
+    @property
+    def label(self):
+        # the name the TV gives itself once device-info has been polled
+        info = self.state.get("device-info") or {}
+        return info.get("user-device-name") or info.get("friendly-device-name") or self.name
+
+    def _state_changed(self, endpoint, data):
+        if self.on_state_change is not None:
+            self.on_state_change(self, endpoint, data)
+
+    def start(self):
+        if not self.started:
+            self.started = True
+            self.poller.start()
+        return self
+
+    def close(self, timeout=None):
+        # the poller may be mid-request with timeout=0; it exits after it,
+        # and a closed HTTPPool closes the connection it hands back
+        self.poller.stop(timeout)
+        if self._health_listener is not None:
+            self.health.remove_listener(self._health_listener)
+            self._health_listener = None
+        self.remote.close()
+
+
+class SessionPool:
+    # DeviceSessions by name, least recently used first. creating one past
+    # max_sessions evicts the least recently used, which is never the current
+    # session since get() makes that the most recent. an evicted session is
+    # handed to on_evict, which must close it once nothing is sending on its
+    # remote any more; without on_evict it is closed at once. sessions'
+    # pollers only run once start() has been called.
+    def __init__(self, factory, max_sessions=4, on_evict=None):
+        self.factory = factory  # name -> DeviceSession
+        self.max_sessions = max(1, max_sessions)
+        self.on_evict = on_evict
+        self.started = False
+        self.evictions = 0
+        self._sessions = collections.OrderedDict()
+
+    def __contains__(self, name):
+        return name in self._sessions
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __iter__(self):
+        return iter(list(self._sessions.values()))
+
+    def peek(self, name):
+        # the session if it's warm, without touching its place in the LRU order
+        return self._sessions.get(name)
+
+    def get(self, name):
+        session = self._sessions.get(name)
+        if session is None:
+            session = self._sessions[name] = self.factory(name)
+            if self.started:
+                session.start()
+            self._evict()
+        self._sessions.move_to_end(name)
+        session.last_used = time.monotonic()
+        return session
+
+    def start(self):
+        self.started = True
+        for session in self._sessions.values():
+            session.start()
+        return self
+
+    def _evict(self):
+        while len(self._sessions) > self.max_sessions:
+            name, session = self._sessions.popitem(last=False)
+            logger.info(f"Closing idle session for {name}")
+            self.evictions += 1
+            if self.on_evict is not None:
+                self.on_evict(session)
+            else:
+                session.close(timeout=0)
+
+    def close(self, timeout=None):
+        while self._sessions:
+            _, session = self._sessions.popitem()
+            session.close(timeout)
@@ -0,0 +1,210 @@
+import logging
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+logger = logging.getLogger(__name__)
+
+# endpoint -> (path, seconds a cached answer counts as fresh)
+ENDPOINTS = {
+    "device-info": ("/query/device-info", 30.0),
+    "active-app": ("/query/active-app", 0.5),
+    "media-player": ("/query/media-player", 0.5),
+}
+
+# active-app ids for the TV's own inputs -> the ECP key that selects them
+INPUT_APPS = {
+    "tvinput.dtv": "InputTuner",
+    "tvinput.hdmi1": "InputHDMI1",
+    "tvinput.hdmi2": "InputHDMI2",
+    "tvinput.hdmi3": "InputHDMI3",
+    "tvinput.hdmi4": "InputHDMI4",
+    "tvinput.cvbs": "InputAV1",
+}
+
+
+class IncrementalXML:
+    # parses an XML document as its chunks arrive off the socket
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=("start",))
+        self._root = None
+
+    def feed(self, chunk):
+        self._parser.feed(chunk)
+        for _, element in self._parser.read_events():
+            if self._root is None:
+                self._root = element
+
+    def close(self):
+        self._parser.close()
+        return self._root
+
+
+def flatten(root):
+    # ECP query replies are one level deep: root attributes plus child elements
+    # with text and/or attributes. <app id="x">Name</app> becomes
+    # {"app": "Name", "app_id": "x"}.
+    data = dict(root.attrib)
+    for child in root:
+        if child.text and child.text.strip():
+            data[child.tag] = child.text.strip()
+        for name, value in child.attrib.items():
+            data[f"{child.tag}_{name}"] = value
+    return data
+
+
+def parse_chunks(chunks):
+    parser = IncrementalXML()
+    for chunk in chunks:
+        parser.feed(chunk)
+    return flatten(parser.close())
+
+
+def parse_apps(chunks):
+    # /query/apps lists every installed channel: <app id="12" type="appl"
+    # version="5.1">Netflix</app> becomes {"id": "12", "type": "appl",
+    # "version": "5.1", "name": "Netflix"}
+    parser = IncrementalXML()
+    for chunk in chunks:
+        parser.feed(chunk)
+    return [
+        {**app.attrib, "name": (app.text or "").strip()}
+        for app in parser.close().iter("app")
+    ]
+
+
+def read_if_changed(chunks, previous):
+    # returns (body, data). while the body matches the previous payload byte for
+    # byte nothing is parsed; data is None if it never diverged.
+    received = []
+    size = 0
+    parser = None
+    for chunk in chunks:
+        if parser is None and previous is not None and previous[size:size + len(chunk)] == chunk:
+            received.append(chunk)
+            size += len(chunk)
+            continue
+        if parser is None:
+            parser = IncrementalXML()
+            for earlier in received:
+                parser.feed(earlier)
+        parser.feed(chunk)
+        received.append(chunk)
+        size += len(chunk)
+    body = b"".join(received)
+    if parser is None:
+        if body == previous:
+            return body, None
+        parser = IncrementalXML()
+        parser.feed(body)
+    return body, flatten(parser.close())
+
+
+class StateCache:
+    # last known answer per query endpoint. get() never touches the network, so
+    # the GUI can read it every frame; refresh() does the blocking fetch.
+    def __init__(self, remote, ttls=None):
+        self.remote = remote
+        self.ttls = {name: ttl for name, (_, ttl) in ENDPOINTS.items()}
+        self.ttls.update(ttls or {})
+        self._entries = {}  # endpoint -> (fetched_at, raw body, parsed dict)
+        self._invalidated = set()
+
+    def get(self, endpoint):
+        entry = self._entries.get(endpoint)
+        return entry[2] if entry else None
+
+    def age(self, endpoint):
+        entry = self._entries.get(endpoint)
+        return time.monotonic() - entry[0] if entry else None
+
+    def is_stale(self, endpoint):
+        age = self.age(endpoint)
+        return age is None or endpoint in self._invalidated or age >= self.ttls[endpoint]
+
+    def invalidate(self, endpoints=None):
+        self._invalidated.update(endpoints or ENDPOINTS)
+
+    def refresh(self, endpoint):
+        # returns True when the payload changed since the last fetch
+        path = ENDPOINTS[endpoint][0]
+        entry = self._entries.get(endpoint)
+        body, data = read_if_changed(self.remote.iter_query(path), entry[1] if entry else None)
+        self._invalidated.discard(endpoint)
+        if data is None:
+            self._entries[endpoint] = (time.monotonic(), entry[1], entry[2])
+            return False
+        self._entries[endpoint] = (time.monotonic(), body, data)
+        return True
+
+    def power_mode(self):
+        info = self.get("device-info")
+        return info.get("power-mode") if info else None
+
+    def active_input(self):
+        app = self.get("active-app")
+        return INPUT_APPS.get(app.get("app_id")) if app else None
+
+
+class StatePoller:
+    # keeps a StateCache fresh from a background thread. polling runs at
+    # fast_interval right after poke() (i.e. after a command) and doubles
+    # towards idle_interval while nothing changes. endpoints that aren't
+    # poked are refreshed when their TTL runs out.
+    def __init__(self, cache, endpoints=("device-info", "active-app"), fast_interval=0.5,
+                 idle_interval=10.0, on_change=None):
+        self.cache = cache
+        self.endpoints = tuple(endpoints)
+        self.fast_interval = fast_interval
+        self.idle_interval = idle_interval
+        self.on_change = on_change
+        self.interval = fast_interval
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="roku-state-poller", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stopped = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def poke(self, endpoints=("active-app",)):
+        # refetches endpoints (only the ones this poller polls) at once; after
+        # most commands only the active app can have changed
+        endpoints = [endpoint for endpoint in endpoints if endpoint in self.endpoints]
+        if endpoints:
+            self.cache.invalidate(endpoints)
+        self.interval = self.fast_interval
+        self._wake.set()
+
+    def poll_once(self):
+        changed = []
+        for endpoint in self.endpoints:
+            if not self.cache.is_stale(endpoint):
+                continue
+            try:
+                if self.cache.refresh(endpoint):
+                    changed.append(endpoint)
+            except Exception as e:
+                logger.debug(f"Polling {endpoint} failed. Exception: {e}")
+        return changed
+
+    def _run(self):
+        while not self._stopped:
+            # cleared before polling so a poke that lands mid-poll isn't lost
+            self._wake.clear()
+            changed = self.poll_once()
+            if changed:
+                self.interval = self.fast_interval
+                if self.on_change is not None:
+                    for endpoint in changed:
+                        self.on_change(endpoint, self.cache.get(endpoint))
+            else:
+                self.interval = min(self.idle_interval, self.interval * 2)
+            self._wake.wait(self.interval)
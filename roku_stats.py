@@ -0,0 +1,24 @@
+import math
+
+# latency summaries shared by the benchmarks and the session replayer, kept
+# apart from roku_bench so a replay doesn't import the benchmark harness.
+
+
+def percentile(values, q):
+    # nearest-rank percentile of an unsorted list, q in [0, 100]
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def latency_summary(times_ms, failures=0):
+    if not times_ms:
+        return {"samples": 0, "failures": failures}
+    return {
+        "samples": len(times_ms),
+        "failures": failures,
+        "p50_ms": percentile(times_ms, 50),
+        "p99_ms": percentile(times_ms, 99),
+        "mean_ms": sum(times_ms) / len(times_ms),
+        "max_ms": max(times_ms),
+    }
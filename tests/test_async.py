@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+import pytest
+
+from roku_async import AsyncRokuRemote
+from roku_fake import FakeRokuServer
+from test_http import OK, ScriptedServer
+
+
+@pytest.mark.parametrize("pipeline", [False, True])
+def test_dropped_keypress_is_never_sent_twice(pipeline):
+    async def send(address):
+        async with AsyncRokuRemote(*address, failure_threshold=0) as remote:
+            acknowledged = 0
+            for _ in range(40):
+                acknowledged += await remote.send_commands(["VolumeUp"] * 5, pipeline)
+            return acknowledged
+
+    # the TV acts on every key it gets but some replies are lost; nothing it
+    # acted on may be sent again
+    with FakeRokuServer(reply_loss_rate=0.05) as server:
+        acknowledged = asyncio.run(send(server.address))
+        received = server.roku.counts.get("keypress", 0)
+    assert acknowledged < 200
+    assert acknowledged <= received <= 200
+
+
+def test_query_without_an_address_fails_cleanly():
+    with pytest.raises(ValueError):
+        asyncio.run(AsyncRokuRemote().query("device-info"))
+
+
+def test_pipelined_batch_longer_than_one_timeout_is_acknowledged():
+    async def send(address):
+        async with AsyncRokuRemote(*address, timeout=0.5) as remote:
+            return await remote.send_commands(["VolumeUp"] * 20)
+
+    # 20 replies at 50 ms each take twice the timeout; each one is within it
+    with FakeRokuServer(latency=0.05) as server:
+        assert asyncio.run(send(server.address)) == 20
+        assert server.roku.counts["keypress"] == 20
+
+
+def test_pipelined_timeout_reports_the_keys_acknowledged():
+    async def send(address):
+        async with AsyncRokuRemote(*address, timeout=0.5, failure_threshold=0) as remote:
+            return await remote.send_commands(["VolumeUp"] * 3 + ["Home"] * 2)
+
+    with FakeRokuServer() as server:
+        original = server.roku.key
+
+        def key(action, name):
+            if name == "Home":
+                time.sleep(1.0)
+            return original(action, name)
+
+        server.roku.key = key
+        assert asyncio.run(send(server.address)) == 3
+
+
+@pytest.mark.parametrize("reply", [b"HTTP/1.1 abc OK\r\n\r\n", OK[:-4] + b"\r\nTransfer-Encoding: chunked\r\n\r\nzz\r\n"])
+def test_garbled_reply_is_a_failure_not_an_exception(reply):
+    server = ScriptedServer(lambda n: reply)
+
+    async def send():
+        async with AsyncRokuRemote("127.0.0.1", server.port) as remote:
+            return await remote.send_command("Home"), remote.health.counts["error"]
+
+    try:
+        assert asyncio.run(send()) == (False, 1)
+    finally:
+        server.close()
+
+
+def test_pipelined_sends_report_to_device_health():
+    server = ScriptedServer(lambda n: OK if n < 3 else b"HTTP/1.1 abc OK\r\n\r\n")
+
+    async def send():
+        async with AsyncRokuRemote("127.0.0.1", server.port, failure_threshold=1) as remote:
+            assert await remote.send_commands(["Up", "Down", "Left"]) == 3
+            assert remote.health.counts["ok"] == 1
+            assert await remote.send_commands(["Up", "Down"]) == 0
+            assert remote.health.counts["error"] == 1 and not remote.health.available
+            # the breaker is open: nothing more goes out
+            assert await remote.send_commands(["Up", "Down"]) == 0
+
+    try:
+        asyncio.run(send())
+        assert len(server.paths) == 5
+    finally:
+        server.close()
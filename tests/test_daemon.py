@@ -0,0 +1,21 @@
+import threading
+
+from roku_client import DaemonRemote
+from roku_daemon import RokuDaemon
+from test_http import OK, ScriptedServer
+
+
+def test_partial_type_and_icon_ids_through_the_daemon(tmp_path):
+    # the TV acknowledges two characters, then hangs up
+    server = ScriptedServer(lambda n: None if n == 2 else OK)
+    daemon = RokuDaemon("127.0.0.1", server.port, socket_path=str(tmp_path / "d.sock")).start()
+    threading.Thread(target=daemon.serve_forever, daemon=True).start()
+    remote = DaemonRemote("127.0.0.1", server.port, socket_path=daemon.socket_path)
+    try:
+        assert remote.type_text("hello") == 2
+        remote.query_icon("a/b c")
+        assert server.paths[-1] == "/query/icon/a%2Fb%20c"
+    finally:
+        remote.close()
+        daemon.shutdown()
+        server.close()
@@ -0,0 +1,27 @@
+import resource
+
+import pytest
+
+import roku_discovery
+from roku_fake import FakeRokuServer
+
+
+@pytest.fixture
+def low_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    low = 256 if hard == resource.RLIM_INFINITY else min(hard, 256)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (low, hard))
+    try:
+        yield low, hard
+    finally:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+
+
+def test_scan_puts_the_open_file_limit_back(low_fd_limit):
+    if low_fd_limit[1] != resource.RLIM_INFINITY and low_fd_limit[1] <= low_fd_limit[0]:
+        pytest.skip("hard limit leaves no room to raise")
+    with FakeRokuServer() as server:
+        ip, port = server.address
+        devices = roku_discovery.scan_subnet(f"{ip}/32", port=port, concurrency=1024)
+    assert [device.ip for device in devices] == [ip]
+    assert resource.getrlimit(resource.RLIMIT_NOFILE) == low_fd_limit
@@ -0,0 +1,144 @@
+import collections
+import threading
+import time
+
+import roku_dispatch
+from roku_dispatch import BackpressurePolicy, Command, CommandDispatcher
+
+
+def command(key):
+    return Command("tv", key, None, ())
+
+
+def test_policy_leaves_a_short_queue_alone():
+    pending = collections.deque([command("VolumeUp")])
+    assert BackpressurePolicy(threshold=2).apply(pending, command("VolumeUp")) == (True, [])
+    assert [queued.coalesced for queued in pending] == [0]
+
+
+def test_policy_coalesces_repeats_and_drops_stale_navigation():
+    policy = BackpressurePolicy(threshold=2)
+    pending = collections.deque([command("Up"), command("Select"), command("Left"), command("VolumeUp")])
+    assert policy.apply(pending, command("VolumeUp")) == (False, [])
+    assert pending[-1].coalesced == 1
+
+    accept, removed = policy.apply(pending, command("Down"))
+    assert accept
+    assert [queued.key for queued in removed] == ["Up", "Left"]
+    assert [queued.key for queued in pending] == ["Select", "VolumeUp"]
+
+
+def test_dispatcher_replays_coalesced_presses_in_order():
+    release = threading.Event()
+    sent = []
+    statuses = []
+    done = threading.Event()
+
+    def send(key):
+        if key == "Home":
+            release.wait(5)
+        sent.append(key)
+
+    def on_complete(cmd, status, error):
+        statuses.append((cmd.key, status))
+        if cmd.key == "Select" and status == roku_dispatch.SENT:
+            done.set()
+
+    dispatcher = CommandDispatcher(max_pending=8, policy=BackpressurePolicy(threshold=2), on_complete=on_complete)
+    try:
+        # Home blocks the worker so the rest pile up behind it
+        for key in ("Home", "Up", "VolumeUp", "VolumeUp", "VolumeUp", "Down", "Select"):
+            assert dispatcher.submit("tv", key, send, key)
+        release.set()
+        assert done.wait(5)
+    finally:
+        dispatcher.stop(5)
+
+    assert sent[0] == "Home"
+    assert sent[1:] == ["VolumeUp"] * 3 + ["Down", "Select"]
+    assert ("Up", roku_dispatch.DROPPED) in statuses
+    assert statuses.count(("VolumeUp", roku_dispatch.COALESCED)) == 2
+    assert dispatcher.pending("tv") == 0
+
+
+def test_dispatcher_rejects_past_the_cap_unless_forced():
+    release = threading.Event()
+    statuses = []
+    dispatcher = CommandDispatcher(max_pending=1, policy=BackpressurePolicy(threshold=8),
+                                   on_complete=lambda cmd, status, error: statuses.append((cmd.key, status)))
+    try:
+        dispatcher.submit("tv", "Home", release.wait, 5)
+        # wait for the worker to take Home off the queue
+        for _ in range(500):
+            if not dispatcher.pending("tv"):
+                break
+            time.sleep(0.01)
+        assert dispatcher.submit("tv", "Select", lambda: None)
+        assert not dispatcher.submit("tv", "Back", lambda: None)
+        assert dispatcher.submit("tv", "Back", lambda: None, force=True)
+        assert ("Back", roku_dispatch.REJECTED) in statuses
+        release.set()
+    finally:
+        dispatcher.stop(5)
+
+
+class KeyLog:
+    # stands in for a RokuRemote, logging what would reach the TV
+    def __init__(self):
+        self.sent = []
+
+    def send_command(self, key):
+        self.sent.append(("keypress", key))
+
+    def key_down(self, key):
+        self.sent.append(("keydown", key))
+
+    def key_up(self, key):
+        self.sent.append(("keyup", key))
+        return True
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_a_click_is_one_keypress_and_a_hold_is_keydown_keyup():
+    remote = KeyLog()
+    dispatcher = CommandDispatcher()
+    holder = roku_dispatch.KeyHolder(dispatcher, "keydown", repeat_delay=0.2)
+    try:
+        holder.press("tv", remote, "Select")
+        holder.release("tv", "Select")
+        holder.press("tv", remote, "Fwd")
+        assert wait_until(lambda: ("keydown", "Fwd") in remote.sent)
+        holder.release("tv", "Fwd")
+        assert wait_until(lambda: len(remote.sent) == 3)
+    finally:
+        holder.stop()
+        dispatcher.stop(5)
+    assert remote.sent == [("keypress", "Select"), ("keydown", "Fwd"), ("keyup", "Fwd")]
+
+
+def test_clicks_in_keydown_mode_still_coalesce():
+    remote = KeyLog()
+    release = threading.Event()
+    statuses = []
+    dispatcher = CommandDispatcher(policy=BackpressurePolicy(threshold=2),
+                                   on_complete=lambda cmd, status, error: statuses.append(status))
+    holder = roku_dispatch.KeyHolder(dispatcher, "keydown", repeat_delay=5)
+    try:
+        dispatcher.submit("tv", "Home", release.wait, 5)
+        for _ in range(8):
+            holder.press("tv", remote, "VolumeUp")
+            holder.release("tv", "VolumeUp")
+        assert dispatcher.pending("tv") <= 2
+        release.set()
+        assert wait_until(lambda: len(statuses) == 9)
+    finally:
+        holder.stop()
+        dispatcher.stop(5)
+    assert remote.sent == [("keypress", "VolumeUp")] * 8
+    assert roku_dispatch.COALESCED in statuses
@@ -0,0 +1,62 @@
+import pytest
+
+pygame = pytest.importorskip("pygame")
+
+import remote_gui
+from roku_gui_bench import BenchRemote
+
+
+@pytest.fixture
+def app():
+    app = remote_gui.RokuRemoteApp(None, remote=BenchRemote(), headless=True)
+    app.mark_dirty(app.screen.get_rect())
+    app.draw_frame()
+    yield app
+    app.close()
+
+
+def pixels(app, rect):
+    return pygame.image.tostring(app.screen.subsurface(rect), "RGB")
+
+
+def test_unrelated_dirty_frames_leave_the_overlay_alone(app):
+    app.status_text = "VolumeUp"
+    app.session.app_text = "Netflix"
+    app.start_typing()
+    app.input_text = "abc"
+    app.mark_dirty(app.STATUS_RECT)
+    app.mark_dirty(app.APP_RECT)
+    app.draw_frame()
+    app.handle_click(app.buttons["dpad_up"].rect.center, source="mouse")
+    app.draw_frame()
+    watched = [app.STATUS_RECT, app.APP_RECT, app.TYPING_RECT, app.buttons["dpad_up"].rect]
+    before = [pixels(app, rect) for rect in watched]
+    for _ in range(20):
+        app.mark_dirty(app.buttons["vol_up"].rect)
+        app.draw_frame()
+    assert [pixels(app, rect) for rect in watched] == before
+
+
+def test_dirty_frames_match_a_full_redraw(app):
+    app.apply_command_done(app.session.name, "Home", "sent")
+    app.draw_frame()
+    app.mark_dirty(app.STATUS_RECT.inflate(-100, -10))  # part of the status line only
+    app.draw_frame()
+    app.apply_command_done(app.session.name, "Up", "failed")
+    app.draw_frame()
+    cached = app.screen.copy()
+    app.render_full()
+    assert pygame.image.tostring(cached, "RGB") == pygame.image.tostring(app.screen, "RGB")
+
+
+def test_text_cache_evicts_the_least_recently_used_surface():
+    pygame.font.init()
+    cache = remote_gui.TextCache(max_surfaces=2)
+    first = cache.render("Home", 20, (255, 255, 255))
+    cache.render("Back", 20, (255, 255, 255))
+    assert cache.render("Home", 20, (255, 255, 255)) is first
+    cache.render("Select", 20, (255, 255, 255))
+    assert list(cache.surfaces) == [("Home", 20, (255, 255, 255)), ("Select", 20, (255, 255, 255))]
+    assert cache.render("Home", 20, (255, 255, 255)) is first
+    assert cache.stats() == {"font_hits": 2, "font_misses": 1, "text_hits": 2, "text_misses": 3,
+                             "cached_surfaces": 2}
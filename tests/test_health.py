@@ -0,0 +1,52 @@
+import roku_health
+from roku_http import ConnectFailed
+
+
+def test_breaker_opens_after_threshold_and_closes_on_trial(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(roku_health.time, "monotonic", lambda: now[0])
+    health = roku_health.DeviceHealth("tv", failure_threshold=2, backoff=1.0)
+    changes = []
+    health.add_listener(lambda h: changes.append(h.state))
+
+    health.record_failure(ConnectFailed("refused"))
+    assert health.state == roku_health.CLOSED and health.allow()
+    health.record_failure(ConnectFailed("refused"))
+    assert health.state == roku_health.OPEN
+    assert not health.allow()
+    assert health.counts["rejected"] == 1
+
+    # the first request after the backoff is the trial; a failure reopens
+    # with twice the backoff
+    now[0] += 1.0
+    assert health.allow() and health.state == roku_health.HALF_OPEN
+    assert not health.allow()
+    health.record_failure(TimeoutError())
+    assert health.state == roku_health.OPEN
+    assert health.retry_at == now[0] + 2.0
+
+    now[0] += 2.0
+    assert health.allow()
+    health.record_success(0.05)
+    assert health.state == roku_health.CLOSED and health.failures == 0 and health.retry_at is None
+    assert changes == ["open", "open", "closed"]
+    assert dict(health.counts) == {"connect": 2, "timeout": 1, "rejected": 2, "ok": 1}
+
+
+def test_zero_threshold_never_opens():
+    health = roku_health.DeviceHealth("tv", failure_threshold=0)
+    for _ in range(10):
+        health.record_failure(ConnectFailed("refused"))
+    assert health.available and health.allow()
+
+
+def test_timeout_backs_off_until_the_next_reply():
+    rtt = roku_health.RTTEstimator()
+    assert rtt.timeout(0.5, 2.0) == 2.0
+    rtt.update(0.1)
+    assert rtt.timeout(0.5, 2.0) == 0.5
+    rtt.back_off()
+    rtt.back_off()
+    assert rtt.timeout(0.5, 2.0) == 2.0
+    rtt.update(0.1)
+    assert rtt.scale == 1 and rtt.timeout(0.5, 2.0) == 0.5
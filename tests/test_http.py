@@ -0,0 +1,149 @@
+import socket
+import threading
+
+import pytest
+
+import roku_http
+from roku_fake import FakeRokuServer
+from roku_remote import RokuRemote
+
+
+OK = b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n"
+
+
+class ScriptedServer:
+    # a TV whose replies are scripted: reply(n) gives the bytes to answer the
+    # nth request received (counting from 0), or None to close the connection.
+    # with one_shot, every connection is closed after its first reply, as a TV
+    # does with sockets it considers idle.
+    def __init__(self, reply=lambda n: OK, one_shot=False):
+        self.reply = reply
+        self.one_shot = one_shot
+        self.paths = []
+        self.closed = threading.Event()
+        self.sock = socket.create_server(("127.0.0.1", 0))
+        threading.Thread(target=self._run, daemon=True).start()
+
+    @property
+    def port(self):
+        return self.sock.getsockname()[1]
+
+    def _run(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        with conn:
+            data = b""
+            while True:
+                while b"\r\n\r\n" not in data:
+                    chunk = conn.recv(4096)
+                    if not chunk:
+                        self.closed.set()
+                        return
+                    data += chunk
+                head, _, data = data.partition(b"\r\n\r\n")
+                self.paths.append(head.split()[1].decode())
+                reply = self.reply(len(self.paths) - 1)
+                if reply is None:
+                    break
+                conn.sendall(reply)
+                if self.one_shot:
+                    break
+        self.closed.set()
+
+    def close(self):
+        self.sock.close()
+
+
+def test_idle_socket_closed_by_tv_is_not_reused():
+    server = ScriptedServer(one_shot=True)
+    pool = roku_http.HTTPPool("127.0.0.1", server.port)
+    try:
+        assert pool.request("POST", "/keypress/Home").status_code == 200
+        assert server.closed.wait(2)
+        assert pool.request("POST", "/keypress/Home").status_code == 200
+        assert len(server.paths) == 2
+    finally:
+        pool.close()
+        server.close()
+
+
+@pytest.mark.parametrize("transport", ["http", "requests"])
+def test_dropped_keypress_is_never_sent_twice(transport):
+    if transport == "requests":
+        pytest.importorskip("requests")
+    # the fake acts on every request but loses a fifth of the replies: each
+    # key must still reach it exactly once
+    with FakeRokuServer(reply_loss_rate=0.2) as server:
+        remote = RokuRemote(*server.address, failure_threshold=0, transport=transport)
+        try:
+            acknowledged = sum(remote.volume_up() for _ in range(200))
+        finally:
+            remote.close()
+        received = server.roku.counts.get("keypress", 0)
+    assert acknowledged < 200
+    assert received == 200
+
+
+@pytest.mark.parametrize("faults", [{"drop_rate": 0.1}, {"reply_loss_rate": 0.1}])
+def test_bench_reports_faults_as_failures(faults):
+    import roku_bench
+    with FakeRokuServer(**faults) as server:
+        remote = RokuRemote(*server.address, failure_threshold=0)
+        try:
+            result = roku_bench.bench_send_command(remote, 200, roku=server.roku)
+        finally:
+            remote.close()
+    assert result["failures"] > 0
+    assert result["duplicates"] == 0
+    if "drop_rate" in faults:
+        assert result["received"] == result["samples"]
+    else:
+        assert result["received"] == 200
+
+
+@pytest.mark.parametrize("pipeline", [False, True])
+def test_type_text_accepts_204(pipeline):
+    server = ScriptedServer(lambda n: b"HTTP/1.1 204 No Content\r\nContent-Length: 0\r\n\r\n")
+    remote = RokuRemote("127.0.0.1", server.port)
+    try:
+        assert remote.type_text("abc", pipeline=pipeline) == 3
+    finally:
+        remote.close()
+        server.close()
+
+
+def test_pipelined_typing_reuses_the_pool_and_reports_metrics():
+    import roku_metrics
+    metrics = roku_metrics.CommandMetrics()
+    with FakeRokuServer() as server:
+        remote = RokuRemote(*server.address, metrics=metrics)
+        try:
+            remote.send_command("Home")
+            idle = [conn for conn, _ in remote.pool._idle]
+            assert remote.type_text("hello", pipeline=True) == 5
+            assert [conn for conn, _ in remote.pool._idle] == idle  # the same warm connection came back
+        finally:
+            remote.close()
+        assert "".join(list(server.roku.keys)[1:]) == "Lit_hLit_eLit_lLit_lLit_o"
+    device = metrics.snapshot()["devices"][f"{server.address[0]}:{server.address[1]}"]
+    assert device["keys"]["Lit"]["requests"] == 5
+    assert remote.health.counts["ok"] == 2
+
+
+def test_garbled_pipelined_reply_is_a_failure_not_an_exception():
+    garbled = b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\nzz\r\n"
+    server = ScriptedServer(lambda n: garbled if n == 1 else OK)
+    remote = RokuRemote("127.0.0.1", server.port, failure_threshold=0)
+    try:
+        assert remote.type_text("abc", pipeline=True) == 1
+    finally:
+        remote.close()
+        server.close()
+    # the whole batch was already written; none of it may go out again
+    assert server.paths == ["/keypress/Lit_a", "/keypress/Lit_b", "/keypress/Lit_c"]
@@ -0,0 +1,40 @@
+import os
+
+import roku_icons
+
+
+def test_blobs_are_shared_and_least_recently_used_channels_evicted(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(roku_icons.time, "time", lambda: now[0])
+    cache = roku_icons.IconCache(str(tmp_path), max_bytes=20)
+
+    shared = cache.put("12@1", b"a" * 10)
+    assert cache.put("13@1", b"a" * 10) == shared
+    assert cache.size == 10
+    now[0] += 1
+    cache.put("14@1", b"b" * 10)
+    now[0] += 1
+    assert cache.get("12@1") == b"a" * 10
+
+    # 13@1 is now the least recently used; dropping it keeps the shared blob
+    now[0] += 1
+    cache.put("15@1", b"c" * 10)
+    assert "13@1" not in cache and "12@1" in cache
+    assert "14@1" not in cache and "15@1" in cache
+    assert cache.size == 20
+    assert os.path.exists(os.path.join(str(tmp_path), shared[:2], shared))
+
+
+def test_index_survives_a_restart(tmp_path):
+    cache = roku_icons.IconCache(str(tmp_path))
+    cache.put("12@1", b"icon")
+    cache.save()
+    assert roku_icons.IconCache(str(tmp_path)).get("12@1") == b"icon"
+
+
+def test_a_missing_blob_is_dropped(tmp_path):
+    cache = roku_icons.IconCache(str(tmp_path))
+    digest = cache.put("12@1", b"icon")
+    os.unlink(os.path.join(str(tmp_path), digest[:2], digest))
+    assert cache.get("12@1") is None
+    assert "12@1" not in cache and cache.size == 0
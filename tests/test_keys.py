@@ -0,0 +1,81 @@
+import asyncio
+import socket
+
+import pytest
+
+import roku_async
+import roku_keys
+from roku_async import AsyncRokuRemote
+from roku_remote import RokuRemote
+
+
+@pytest.mark.parametrize("given, sent", [
+    ("powerOn", "PowerOn"),
+    ("POWEROFF", "PowerOff"),
+    ("inputhdmi1", "InputHDMI1"),
+    ("Home", "Home"),
+    ("lit_a", "Lit_a"),
+])
+def test_names_are_sent_in_roku_casing(given, sent):
+    assert roku_keys.canonical(given) == sent
+
+
+@pytest.mark.parametrize("char, sent", [
+    (" ", "Lit_%20"),
+    ("/", "Lit_%2F"),
+    ("&", "Lit_%26"),
+    ("é", "Lit_%C3%A9"),
+    ("日", "Lit_%E6%97%A5"),
+])
+def test_literals_are_percent_encoded(char, sent):
+    assert roku_keys.literal(char) == sent
+    # raw or already encoded, a literal goes out the same way
+    assert roku_keys.canonical(f"Lit_{char}") == sent
+    assert roku_keys.canonical(sent) == sent
+
+
+@pytest.mark.parametrize("key", ["Bogus", "Lit_", "Lit_ab", "Lit_%FF", ""])
+def test_unknown_keys_are_rejected(key):
+    with pytest.raises(roku_keys.UnknownKey):
+        roku_keys.canonical(key)
+
+
+def test_unknown_key_is_raised_before_any_io(monkeypatch):
+    def no_io(*args, **kwargs):
+        raise AssertionError("tried to connect")
+
+    monkeypatch.setattr(socket, "create_connection", no_io)
+    monkeypatch.setattr(roku_async._AsyncConnection, "open", no_io)
+    remote = RokuRemote("127.0.0.1", 8060)
+    try:
+        with pytest.raises(roku_keys.UnknownKey):
+            remote.send_command("Bogus")
+        with pytest.raises(roku_keys.UnknownKey):
+            remote.key_down("Lit_ab")
+    finally:
+        remote.close()
+
+    async def send():
+        async with AsyncRokuRemote("127.0.0.1", 8060) as remote:
+            # the good key ahead of it isn't sent either
+            await remote.send_commands(["Home", "Bogus"])
+
+    with pytest.raises(roku_keys.UnknownKey):
+        asyncio.run(send())
+
+
+def test_request_bytes_are_built_once_per_device_and_key():
+    requests = roku_keys.KeyRequests("10.0.0.2:8060")
+    home = requests.get("keypress", "Home")
+    assert home == ("Home", "/keypress/Home",
+                    b"POST /keypress/Home HTTP/1.1\r\nHost: 10.0.0.2:8060\r\nContent-Length: 0\r\n\r\n")
+    assert requests.get("keypress", "Home") is home
+    # another spelling of the same key shares the encoded request
+    assert requests.get("keypress", "home") is home
+    held = requests.get("keydown", "Up")
+    assert requests.get("keydown", "up") is held
+    assert held[2].startswith(b"POST /keydown/Up ")
+    # each device has its own Host header
+    assert roku_keys.KeyRequests("10.0.0.3:8060").get("keypress", "Home")[2] != home[2]
+    with pytest.raises(ValueError):
+        requests.get("press", "Home")
@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+import roku_record
+from roku_fake import FakeRokuServer
+from roku_remote import RokuRemote
+
+
+def test_records_round_trip(tmp_path):
+    path = str(tmp_path / "session.rec")
+    recorder = roku_record.SessionRecorder(path)
+    recorder.record_request("tv:8060", "/keypress/Home", 100.0, 0.01, 200)
+    recorder.record("tv:8060", "ui-press", "home", 100.5)
+    recorder.record_request("tv:8060", "/keypress/Up", 101.0, 2.0, error=TimeoutError())
+    recorder.close()
+    records = list(roku_record.iter_session(path))
+    assert [(r.action, r.key, r.status, r.error) for r in records] == [
+        ("keypress", "Home", 200, None),
+        ("ui-press", "home", None, None),
+        ("keypress", "Up", None, "TimeoutError"),
+    ]
+    assert records[0].timestamp == 100.0
+
+
+def test_typed_text_is_redacted_unless_asked_for(tmp_path):
+    with FakeRokuServer() as server:
+        for literals in (False, True):
+            path = str(tmp_path / f"{literals}.rec")
+            recorder = roku_record.SessionRecorder(path, literals=literals)
+            remote = RokuRemote(*server.address, recorder=recorder)
+            try:
+                assert remote.type_text("pw", pipeline=literals) == 2
+            finally:
+                remote.close()
+                recorder.close()
+            with open(path, "rb") as f:
+                data = f.read()
+            assert (b"Lit_p" in data) is literals
+            keys = [record.key for record in roku_record.iter_session(path)]
+            assert keys == (["Lit_p", "Lit_w"] if literals else ["Lit", "Lit"])
+
+
+def test_files_rotate_oldest_first(tmp_path):
+    path = str(tmp_path / "session.rec")
+    recorder = roku_record.SessionRecorder(path, max_bytes=200, backups=2)
+    for n in range(30):
+        recorder.record_request("tv:8060", f"/launch/{n}", float(n), 0.0, 200)
+    recorder.close()
+    files = roku_record.session_files(path)
+    assert files == [f"{path}.2", f"{path}.1", path]
+    keys = [int(record.key) for record in roku_record.iter_session(path)]
+    assert keys == sorted(keys) and keys[-1] == 29
+
+
+def test_replay_skips_redacted_literals(tmp_path):
+    path = str(tmp_path / "session.rec")
+    recorder = roku_record.SessionRecorder(path)
+    for n, key in enumerate(["Home", "Lit_x", "Down"]):
+        recorder.record_request("tv:8060", f"/keypress/{key}", float(n), 0.0, 200)
+    recorder.close()
+    with FakeRokuServer() as server:
+        target = "{}:{}".format(*server.address)
+        report = roku_record.replay(roku_record.iter_session(path), [target], speed=0)
+        assert list(server.roku.keys) == ["Home", "Down"]
+    assert report["records"] == 2 and report["skipped"] == 1
+
+
+def test_a_torn_last_record_ends_the_stream(tmp_path):
+    path = str(tmp_path / "session.rec")
+    recorder = roku_record.SessionRecorder(path)
+    recorder.record_request("tv:8060", "/keypress/Home", 100.0, 0.01, 200)
+    recorder.record_request("tv:8060", "/keypress/Up", 101.0, 0.01, 200)
+    recorder.close()
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 3)
+    assert [r.key for r in roku_record.iter_records(path)] == ["Home"]
+
+    with open(path, "r+b") as f:
+        f.seek(roku_record.HEADER.size)
+        f.write(b"X")
+    with pytest.raises(ValueError, match="corrupt"):
+        list(roku_record.iter_records(path))
+
+
+def test_an_undefined_string_is_corrupt(tmp_path):
+    path = str(tmp_path / "session.rec")
+    roku_record.SessionRecorder(path).close()
+    with open(path, "r+b") as f:
+        f.truncate(roku_record.HEADER.size)
+        f.seek(0, 2)
+        f.write(b"E" + roku_record.EVENT.pack(100.0, 7, 7, 7, 200, 0, 0.01))
+    with pytest.raises(ValueError, match="corrupt"):
+        list(roku_record.iter_records(path))
@@ -0,0 +1,66 @@
+import time
+
+import pytest
+
+import roku_script
+from roku_fake import FakeRokuServer
+
+
+def test_consecutive_keys_share_one_instruction():
+    program = roku_script.compile_script("key Home Down\nkey down\ntext 'a b'\nwait 500ms")
+    assert program.instructions == [
+        ("keys", ["Home", "Down", "Down", "Lit_a", "Lit_%20", "Lit_b"]),
+        ("wait", 0.5),
+    ]
+
+
+def test_blocks_compile_to_jumps():
+    program = roku_script.compile_script("""
+        repeat 2
+          if not app Netflix
+            key Home
+          else
+            key Back
+          end
+        end
+    """)
+    assert program.instructions == [
+        ("counter", 0, 2, 6),
+        ("branch", True, "Netflix", 4),
+        ("keys", ["Home"]),
+        ("jump", 5),
+        ("keys", ["Back"]),
+        ("loop", 0, 1),
+    ]
+
+
+@pytest.mark.parametrize("source, line", [
+    ("key Home\nkey Nope", 2),
+    ("repeat 2\nkey Home", 1),
+    ("end", 1),
+    ("wait soon", 1),
+])
+def test_errors_name_the_line(source, line):
+    with pytest.raises(roku_script.ScriptError) as error:
+        roku_script.compile_script(source)
+    assert error.value.line == line
+
+
+def test_repeat_sends_every_iteration():
+    with FakeRokuServer() as server:
+        host, port = server.address
+        report = roku_script.run_script("repeat 3\nkey Up\nend", [host], port)
+        assert report.succeeded == [host]
+        assert list(server.roku.keys) == ["Up"] * 3
+
+
+@pytest.mark.parametrize("keys, latency, wait", [(2, 0.3, 0.5), (4, 0.15, 0.2)])
+def test_wait_starts_after_the_keys_are_acknowledged(keys, latency, wait):
+    # the keys take longer than the wait itself; the wait must still follow them
+    with FakeRokuServer(latency=latency) as server:
+        host, port = server.address
+        start = time.perf_counter()
+        report = roku_script.run_script(f"key {' '.join(['Down'] * keys)}\nwait {wait}", [host], port)
+        elapsed = time.perf_counter() - start
+    assert report.succeeded == [host]
+    assert elapsed >= keys * latency + wait
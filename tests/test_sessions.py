@@ -0,0 +1,53 @@
+import threading
+
+import roku_http
+from roku_dispatch import CommandDispatcher, SENT
+from roku_fake import FakeRokuServer
+from roku_remote import RokuRemote
+from roku_sessions import DeviceSession, SessionPool
+
+
+def test_closed_pool_closes_late_check_ins():
+    with FakeRokuServer() as server:
+        pool = roku_http.HTTPPool(*server.address)
+        pool.close()
+        assert pool.request("POST", "/keypress/Home").status_code == 200
+        assert not pool._idle
+
+
+def test_evicted_session_closes_after_its_queue_drains():
+    done = []
+    drained = threading.Event()
+    dispatcher = CommandDispatcher(on_complete=lambda command, status, error: done.append((command.key, status)))
+    with FakeRokuServer(latency=0.2) as slow, FakeRokuServer() as other:
+        remotes = {}
+
+        def factory(name):
+            ip, _, port = name.rpartition(":")
+            remotes[name] = RokuRemote(ip, int(port))
+            return DeviceSession(name, remotes[name])
+
+        def evict(session):
+            def close():
+                session.close(timeout=0)
+                drained.set()
+            dispatcher.remove(session.name, on_drained=close)
+
+        sessions = SessionPool(factory, max_sessions=1, on_evict=evict)
+        first = "{}:{}".format(*slow.address)
+        remote = sessions.get(first).remote
+        for _ in range(3):
+            dispatcher.submit(first, "Up", remote.send_command, "Up")
+        sessions.get("{}:{}".format(*other.address))  # evicts the first while it is still sending
+        assert drained.wait(5)
+        assert done == [("Up", SENT)] * 3
+        assert list(slow.roku.keys) == ["Up"] * 3
+        assert not remote.pool._idle
+        sessions.close(timeout=1)
+        dispatcher.stop(timeout=1)
+
+
+def test_remove_without_a_worker_runs_on_drained_at_once():
+    called = []
+    CommandDispatcher().remove("nowhere", on_drained=lambda: called.append(True))
+    assert called == [True]
@@ -0,0 +1,35 @@
+import roku_state
+from roku_fake import FakeRokuServer
+from roku_remote import RokuRemote
+
+
+def test_poke_refreshes_only_what_a_command_can_change():
+    with FakeRokuServer() as server:
+        remote = RokuRemote(*server.address)
+        try:
+            cache = roku_state.StateCache(remote)
+            poller = roku_state.StatePoller(cache)
+            assert poller.poll_once() == ["device-info", "active-app"]
+            counts = server.roku.counts
+
+            queries = counts["query"]
+            poller.poke()
+            poller.poll_once()
+            assert counts["query"] - queries == 1
+            assert not cache.is_stale("device-info")
+
+            remote.power_off()
+            queries = counts["query"]
+            poller.poke(("active-app", "device-info"))
+            assert poller.poll_once() == ["device-info"]
+            assert counts["query"] - queries == 2
+            assert cache.power_mode() == "PowerOff"
+        finally:
+            remote.close()
+
+
+def test_unchanged_reply_is_not_parsed_again():
+    body = b'<?xml version="1.0"?><active-app><app id="12">Netflix</app></active-app>'
+    first, data = roku_state.read_if_changed([body[:20], body[20:]], None)
+    assert data == {"app": "Netflix", "app_id": "12"}
+    assert roku_state.read_if_changed([body[:7], body[7:]], first) == (body, None)